@@ -0,0 +1,425 @@
+"""
+Bulk ingestion helpers shared by the catalog download scripts.
+
+Pages are fetched concurrently over one pooled HTTP session, throttled by a
+shared rate limiter and retried with exponential backoff. Rows are appended
+to the catalog CSV as each page arrives, and the pages already written are
+recorded in a state file next to it, so an interrupted download resumes
+where it stopped instead of starting over.
+
+refresh() updates an existing catalog instead: pages are requested
+conditionally (ETag / Last-Modified, plus an "updated since" filter where
+the API has one), only new or changed items are merged in by id, and the
+result is published as a new catalog version with a delta file that
+running servers apply without reloading the whole catalog.
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import random
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Responses worth retrying: rate limiting and transient server errors.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Spaces out requests across threads to at most `rate` per second.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(pool_size=8):
+    """
+    Returns a requests.Session whose connection pool fits `pool_size`
+    concurrent requests, so connections are reused across pages.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _get(session, url, params, limiter=None, headers=None, retries=5, backoff=0.5, timeout=30):
+    """
+    GETs a URL, retrying connection errors, 429 and 5xx responses, and
+    returns the 200 or 304 response.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        delay = backoff * (2 ** attempt) * (0.5 + random.random())
+        try:
+            response = session.get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            print(f"Request failed ({e}), retrying in {delay:.1f}s")
+        else:
+            if response.status_code in (200, 304):
+                return response
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                raise Exception(f"Error fetching data: HTTP {response.status_code}: {response.text[:500]}")
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                delay = float(retry_after)
+            print(f"HTTP {response.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def _decode(response):
+    try:
+        return response.json()
+    except ValueError as e:
+        raise Exception(f"Error decoding JSON: {e}\nResponse Text was: {response.text[:500]}")
+
+
+def fetch_json(session, url, params, limiter=None, retries=5, backoff=0.5, timeout=30):
+    """
+    GETs a JSON document, retrying connection errors, 429 and 5xx responses.
+
+    Parameters:
+        session (requests.Session): Session to send the request with.
+        url (str): Endpoint URL.
+        params (dict): Query parameters.
+        limiter (RateLimiter): Applied before every attempt, retries included.
+        retries (int): Attempts after the first one before giving up.
+        backoff (float): Base delay in seconds, doubled on every retry
+                         (with jitter) unless the server sends Retry-After.
+        timeout (float): Per-request timeout in seconds.
+
+    Returns:
+        dict: The decoded JSON body.
+    """
+    return _decode(_get(session, url, params, limiter, retries=retries, backoff=backoff, timeout=timeout))
+
+
+def fetch_json_conditional(session, url, params, limiter=None, validators=None, **kwargs):
+    """
+    Like fetch_json, but sends the validators of an earlier response
+    (If-None-Match / If-Modified-Since) so unchanged pages cost a 304.
+
+    Validators only describe the response to one URL, so they are recorded
+    with a hash of the full request URL and only sent when the request is
+    the same. A query that changes between runs, like RAWG's "updated"
+    date range, is simply fetched in full.
+
+    Parameters:
+        validators (dict): {"request": ..., "etag": ..., "last_modified":
+                           ...} from an earlier call, or None.
+
+    Returns:
+        (dict, dict): The decoded JSON body, or None if the page has not
+        changed, and the validators to send next time.
+    """
+    request_url = requests.Request("GET", url, params=params).prepare().url
+    request_hash = hashlib.sha256(request_url.encode("utf-8")).hexdigest()
+    validators = validators or {}
+    headers = {}
+    if validators.get("request") == request_hash:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    response = _get(session, url, params, limiter, headers=headers, **kwargs)
+    if response.status_code == 304:
+        return None, validators
+    new_validators = {"request": request_hash, "etag": response.headers.get("ETag"),
+                      "last_modified": response.headers.get("Last-Modified")}
+    return _decode(response), new_validators
+
+
+class CatalogWriter:
+    """
+    Appends rows to a catalog CSV, skipping ids that are already in it.
+
+    Rows are flushed after every page, so whatever has been fetched is on
+    disk if the download is interrupted.
+    """
+
+    def __init__(self, csv_path, fieldnames, key="id", resume=True):
+        self.csv_path = csv_path
+        self.fieldnames = fieldnames
+        self.key = key
+        self.seen = set()
+        os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+        exists = resume and os.path.exists(csv_path) and os.path.getsize(csv_path) > 0
+        if exists:
+            with open(csv_path, "r", newline="", encoding="utf-8") as f:
+                self.seen = {row[key] for row in csv.DictReader(f)}
+        self._file = open(csv_path, "a" if exists else "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction="ignore")
+        if not exists:
+            self._writer.writeheader()
+
+    def write(self, rows):
+        """
+        Writes the rows with unseen ids and returns how many were written.
+        """
+        written = 0
+        for row in rows:
+            row_key = str(row[self.key])
+            if row_key in self.seen:
+                continue
+            self.seen.add(row_key)
+            self._writer.writerow(row)
+            written += 1
+        self._file.flush()
+        return written
+
+    def close(self):
+        self._file.close()
+
+
+# Written next to the catalogs: the current version of each catalog and the
+# deltas that lead to it. The recommendation engine reads the same file.
+MANIFEST_NAME = "catalog_manifest.json"
+DELTA_DIR = "deltas"
+KEEP_DELTAS = 20
+
+
+def _write_csv_atomic(csv_path, fieldnames, rows):
+    tmp_path = csv_path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+
+
+def load_manifest(data_dir):
+    manifest_path = os.path.join(data_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def publish_version(csv_path, fieldnames=None, delta_rows=None):
+    """
+    Publishes a new version of a catalog in the manifest.
+
+    With `delta_rows`, the changed rows are written to
+    deltas/<catalog>.v<version>.csv, so servers can apply them on top of the
+    version they have. Without, the delta chain is reset and servers reload
+    the whole catalog. The manifest is written last, so readers never see a
+    version whose files are incomplete.
+
+    Returns:
+        int: The new version.
+    """
+    data_dir = os.path.dirname(csv_path) or "."
+    name = os.path.basename(csv_path)
+    manifest = load_manifest(data_dir)
+    entry = manifest.get(name, {"version": 0, "deltas": []})
+    version = entry["version"] + 1
+    deltas = entry["deltas"] if delta_rows is not None else []
+    if delta_rows is not None:
+        os.makedirs(os.path.join(data_dir, DELTA_DIR), exist_ok=True)
+        _write_csv_atomic(delta_path_for(data_dir, name, version), fieldnames, delta_rows)
+        deltas = deltas + [version]
+    for old_version in deltas[:-KEEP_DELTAS] if len(deltas) > KEEP_DELTAS else []:
+        old_path = delta_path_for(data_dir, name, old_version)
+        if os.path.exists(old_path):
+            os.remove(old_path)
+    manifest[name] = {
+        "version": version,
+        "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "deltas": deltas[-KEEP_DELTAS:],
+    }
+    save_state(manifest, os.path.join(data_dir, MANIFEST_NAME))
+    return version
+
+
+def delta_path_for(data_dir, name, version):
+    stem = os.path.splitext(name)[0]
+    return os.path.join(data_dir, DELTA_DIR, f"{stem}.v{version}.csv")
+
+
+def state_path_for(csv_path):
+    return csv_path + ".state.json"
+
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return {"pages_done": [], "total_pages": None}
+    with open(state_path, "r") as f:
+        return json.load(f)
+
+
+def save_state(state, state_path):
+    """
+    Writes the download state atomically.
+    """
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def ingest(fetch_page, parse_page, csv_path, fieldnames, max_pages, workers=4, resume=True):
+    """
+    Downloads a paginated catalog into `csv_path`.
+
+    Parameters:
+        fetch_page (callable): fetch_page(page) -> decoded JSON of a 1-based page.
+        parse_page (callable): parse_page(page, data) -> (rows, total_pages),
+                               where total_pages may be None if unknown.
+        csv_path (str): Catalog CSV to append to.
+        fieldnames (list): CSV columns; rows must contain an "id" field.
+        max_pages (int): Upper bound on the number of pages to fetch.
+        workers (int): Pages fetched concurrently.
+        resume (bool): Skip pages recorded as done by an earlier run.
+
+    Returns:
+        int: Number of new rows written.
+    """
+    state_path = state_path_for(csv_path)
+    state = load_state(state_path) if resume else {"pages_done": [], "total_pages": None}
+    done = set(state["pages_done"])
+    writer = CatalogWriter(csv_path, fieldnames, resume=resume)
+    written = 0
+
+    def record(page, rows, total_pages):
+        nonlocal written
+        written += writer.write(rows)
+        done.add(page)
+        if total_pages is not None:
+            state["total_pages"] = total_pages
+        state["pages_done"] = sorted(done)
+        # The state is saved after the rows are flushed: a crash in between
+        # refetches the page and the id check drops the duplicates.
+        save_state(state, state_path)
+        print(f"Page {page}: {len(rows)} rows ({written} new in total)")
+
+    try:
+        # The first page tells us how many pages there are.
+        if state["total_pages"] is None:
+            rows, total_pages = parse_page(1, fetch_page(1))
+            record(1, rows, total_pages)
+        last_page = min(max_pages, state["total_pages"] or max_pages)
+        pending_pages = iter([page for page in range(1, last_page + 1) if page not in done])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            # Keep a bounded number of pages in flight so results are written
+            # as they arrive instead of piling up in memory.
+            for page in pending_pages:
+                in_flight[executor.submit(fetch_page, page)] = page
+                if len(in_flight) >= workers * 2:
+                    break
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    page = in_flight.pop(future)
+                    rows, total_pages = parse_page(page, future.result())
+                    record(page, rows, total_pages)
+                    next_page = next(pending_pages, None)
+                    if next_page is not None:
+                        in_flight[executor.submit(fetch_page, next_page)] = next_page
+    finally:
+        writer.close()
+    if written:
+        # Appended rows are not tracked as a delta; servers reload in full.
+        publish_version(csv_path)
+    return written
+
+
+def refresh(fetch_page, parse_page, csv_path, fieldnames, max_pages, workers=4, key="id"):
+    """
+    Merges new and changed items into an existing catalog.
+
+    Every page is requested with the validators recorded for it last time
+    and the time of the last refresh, so the API can answer 304 or only
+    return items updated since then. Items are merged by id; if anything
+    changed, the catalog is rewritten and published as a new version with
+    a delta of the changed rows.
+
+    Parameters:
+        fetch_page (callable): fetch_page(page, since=..., validators=...)
+                               -> (JSON or None if unchanged, validators).
+        parse_page (callable): parse_page(page, data) -> (rows, total_pages).
+        csv_path (str): Catalog CSV to update.
+        fieldnames (list): CSV columns.
+        max_pages (int): Upper bound on the number of pages to fetch.
+        workers (int): Pages fetched concurrently.
+        key (str): Column identifying an item.
+
+    Returns:
+        (int, int): Number of added and changed items.
+    """
+    state_path = csv_path + ".refresh.json"
+    state = {"last_fetched": None, "total_pages": None, "pages": {}}
+    if os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            state.update(json.load(f))
+    catalog = {}
+    if os.path.exists(csv_path):
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            catalog = {row[key]: row for row in csv.DictReader(f)}
+
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    since = state["last_fetched"]
+    changed = {}
+    added = 0
+
+    def merge(page, result):
+        nonlocal added
+        data, validators = result
+        state["pages"][str(page)] = validators
+        if data is None:
+            return
+        rows, total_pages = parse_page(page, data)
+        if total_pages is not None:
+            state["total_pages"] = total_pages
+        for row in rows:
+            row = {name: "" if row.get(name) is None else str(row.get(name)) for name in fieldnames}
+            old = catalog.get(row[key])
+            if old == row:
+                continue
+            if old is None:
+                added += 1
+            catalog[row[key]] = changed[row[key]] = row
+
+    def fetch(page):
+        # An empty dict (not None) still selects the conditional request.
+        return fetch_page(page, since=since, validators=state["pages"].get(str(page)) or {})
+
+    # Page 1 first: it tells us how many pages there are now.
+    merge(1, fetch(1))
+    last_page = min(max_pages, state["total_pages"] or max_pages)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for page, result in zip(range(2, last_page + 1), executor.map(fetch, range(2, last_page + 1))):
+            merge(page, result)
+
+    if changed:
+        rows = list(catalog.values())
+        _write_csv_atomic(csv_path, fieldnames, rows)
+        version = publish_version(csv_path, fieldnames, list(changed.values()))
+        print(f"Published {os.path.basename(csv_path)} v{version}: {added} added, {len(changed) - added} changed")
+    else:
+        print(f"{os.path.basename(csv_path)} is up to date")
+    state["last_fetched"] = started
+    save_state(state, state_path)
+    return added, len(changed) - added
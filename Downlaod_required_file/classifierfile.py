@@ -1,30 +1,13 @@
 import os
+import sys
 import json
 import numpy as np
-import librosa
 import tensorflow as tf
 
-def extract_mfcc(file_path, n_mfcc=13, sr=22050):
-    """
-    Loads an audio file and extracts MFCC features.
-    Averages the MFCCs over time to create a fixed-length feature vector.
-    
-    Parameters:
-        file_path (str): Path to the audio file.
-        n_mfcc (int): Number of MFCC coefficients to extract.
-        sr (int): Sample rate to use.
-    
-    Returns:
-        numpy.ndarray: A 1D array of averaged MFCC features.
-    """
-    try:
-        audio, sample_rate = librosa.load(file_path, sr=sr, mono=True)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sample_rate, n_mfcc=n_mfcc)
-        mfccs_mean = np.mean(mfccs, axis=1)
-        return mfccs_mean
-    except Exception as e:
-        print(f"Error extracting MFCC from {file_path}: {e}")
-        raise
+# Reuse the shared feature engine from the app so this script computes
+# exactly the same features as training and serving.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from ser.feature_engine import extract_mfcc
 
 def load_model_and_metadata():
     """
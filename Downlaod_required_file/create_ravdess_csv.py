@@ -1,17 +1,10 @@
 import os
-import csv
+import sys
+import argparse
 
-# Define the mapping from emotion code to emotion label.
-emotion_mapping = {
-    "01": "neutral",
-    "02": "calm",
-    "03": "happy",
-    "04": "sad",
-    "05": "angry",
-    "06": "fearful",
-    "07": "disgust",
-    "08": "surprised"
-}
+# The manifest builder lives in the app package.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from ser.manifest import MANIFEST_DIR, build_manifest, write_label_csv
 
 # Set the directory where your RAVDESS files are stored.
 # Adjust this path if your files are in a different location.
@@ -20,26 +13,14 @@ ravdess_dir = os.path.join("data", "Audio_data")
 # Define the output CSV file path.
 output_csv = os.path.join("data", "audio_data.csv")
 
-# Open the CSV file for writing.
-with open(output_csv, mode="w", newline="") as csv_file:
-    writer = csv.writer(csv_file)
-    # Write header row.
-    writer.writerow(["file", "label"])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write data/audio_data.csv from the RAVDESS manifest.")
+    parser.add_argument("--audio-dir", default=ravdess_dir, help="Directory holding the RAVDESS files.")
+    parser.add_argument("--output", default=output_csv, help="CSV file to write.")
+    parser.add_argument("--workers", type=int, default=8, help="Threads for directory scans and header reads.")
+    args = parser.parse_args()
 
-    # Walk through the RAVDESS directory (including subdirectories). 
-    for root, dirs, files in os.walk(ravdess_dir):
-        for file in files:
-            if file.lower().endswith(".wav"):
-                filepath = os.path.join(root, file)
-                # Split the filename by '-' to extract parts.
-                parts = file.split('-')
-                if len(parts) >= 3:
-                    # The third part is the emotion code.
-                    emotion_code = parts[2]
-                    emotion = emotion_mapping.get(emotion_code, "unknown")
-                    # Write the row: file path and corresponding emotion.
-                    writer.writerow([filepath, emotion])
-                else:
-                    print(f"Filename {file} does not follow the expected format.")
-
-print(f"CSV file created at: {os.path.abspath(output_csv)}")
+    # The manifest is updated incrementally: only new or changed files are read.
+    paths, records = build_manifest(args.audio_dir, MANIFEST_DIR, workers=args.workers)
+    write_label_csv(paths, records, args.output)
+    print(f"CSV file created at: {os.path.abspath(args.output)}")
@@ -1,46 +1,16 @@
-import requests
-import pandas as pd
 import os
+import math
+import argparse
+from datetime import datetime, timezone
+from functools import partial
+from catalog_ingest import RateLimiter, make_session, fetch_json, fetch_json_conditional, ingest, refresh
 
 # Replace with your actual API key from RAWG
-API_KEY = "268a990058a7499696662f045eb06d0f"
+API_KEY = os.environ.get("RAWG_API_KEY", "268a990058a7499696662f045eb06d0f")
 
 # Correct RAWG API endpoint for games
 url = "https://api.rawg.io/api/games"
 
-# Define parameters for the API request
-params = {
-    "key": API_KEY,
-    "page_size": 40  # Adjust the number of games per request as needed
-}
-
-# Make the API request
-response = requests.get(url, params=params)
-
-# Debug: Print status code, content type, and response text
-print("Status Code:", response.status_code)
-print("Content-Type:", response.headers.get("Content-Type"))
-print("Response Text:", response.text)
-
-# Check if the response was successful (HTTP 200)
-if response.status_code != 200:
-    raise Exception(f"Error fetching data: HTTP {response.status_code}")
-
-# Check if the response content is empty or only whitespace
-if not response.text.strip():
-    raise Exception("Error: Empty response")
-
-# Attempt to decode the JSON response
-try:
-    data = response.json()
-except Exception as e:
-    raise Exception(f"Error decoding JSON: {e}\nResponse Text was: {response.text}")
-
-print("JSON Data successfully retrieved.")
-
-# Prepare a list to store processed game data
-games_list = []
-
 # Define a sample mapping from genre to mood.
 # You can customize this mapping as needed.
 genre_to_mood = {
@@ -54,36 +24,81 @@ genre_to_mood = {
     # Extend or modify the mapping as required.
 }
 
-# Process each game entry from the API response
-for game in data.get("results", []):
-    game_id = game.get("id")
-    name = game.get("name")
-    
-    # Retrieve the first genre if available; otherwise use "Unknown"
-    if game.get("genres"):
-        genre = game["genres"][0].get("name", "Unknown")
+FIELDNAMES = ["id", "name", "genre", "mood"]
+
+
+def fetch_page(session, limiter, api_url, page_size, page, since=None, validators=None):
+    """
+    Fetches one page of the RAWG games list.
+
+    In refresh mode (`since` or `validators` given) only games updated since
+    the last refresh are listed and a (data or None, validators) pair is
+    returned. The "updated" filter is what makes a RAWG refresh incremental:
+    its date range moves with every run, so the validators of the previous
+    run belong to another URL and are not sent (see fetch_json_conditional).
+    """
+    params = {
+        "key": API_KEY,
+        "page_size": page_size,  # RAWG allows at most 40 games per page
+        "page": page
+    }
+    if validators is None and since is None:
+        return fetch_json(session, api_url, params, limiter)
+    if since:
+        # RAWG filters by an inclusive "from,to" date range.
+        params["updated"] = f"{since[:10]},{datetime.now(timezone.utc):%Y-%m-%d}"
+        params["ordering"] = "-updated"
+    return fetch_json_conditional(session, api_url, params, limiter, validators)
+
+
+def parse_page(page_size, page, data):
+    """
+    Converts a RAWG games page into catalog rows.
+    """
+    rows = []
+    for game in data.get("results", []):
+        # Retrieve the first genre if available; otherwise use "Unknown"
+        if game.get("genres"):
+            genre = game["genres"][0].get("name", "Unknown")
+        else:
+            genre = "Unknown"
+
+        # Map the genre to a mood using the dictionary; default to "neutral" if not found
+        mood = genre_to_mood.get(genre, "neutral")
+
+        rows.append({
+            "id": game.get("id"),
+            "name": game.get("name"),
+            "genre": genre,
+            "mood": mood
+        })
+    count = data.get("count")
+    return rows, math.ceil(count / page_size) if count else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the games catalog from the RAWG API.")
+    parser.add_argument("--pages", type=int, default=500, help="Largest number of pages to fetch.")
+    parser.add_argument("--page-size", type=int, default=40, help="Games per page.")
+    parser.add_argument("--workers", type=int, default=4, help="Pages fetched concurrently.")
+    parser.add_argument("--rate", type=float, default=5.0, help="Largest number of requests per second.")
+    parser.add_argument("--url", default=url, help="API endpoint.")
+    parser.add_argument("--output", default=os.path.join("app", "suggestions", "data", "games_data.csv"),
+                        help="Catalog CSV to write.")
+    parser.add_argument("--restart", action="store_true", help="Ignore earlier progress and start over.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Merge new and changed items into the existing catalog and publish a new version.")
+    args = parser.parse_args()
+
+    session = make_session(args.workers)
+    limiter = RateLimiter(args.rate)
+    if args.refresh:
+        refresh(partial(fetch_page, session, limiter, args.url, args.page_size),
+                partial(parse_page, args.page_size),
+                args.output, FIELDNAMES, max_pages=args.pages, workers=args.workers)
     else:
-        genre = "Unknown"
-    
-    # Map the genre to a mood using the dictionary; default to "neutral" if not found
-    mood = genre_to_mood.get(genre, "neutral")
-    
-    games_list.append({
-        "id": game_id,
-        "name": name,
-        "genre": genre,
-        "mood": mood
-    })
-
-# Convert the list of game dictionaries to a Pandas DataFrame
-df = pd.DataFrame(games_list)
-
-# Ensure the target directory exists before saving the CSV
-target_dir = "app/suggestions/data"
-os.makedirs(target_dir, exist_ok=True)
-
-# Define the path for the CSV file and save the DataFrame
-csv_path = os.path.join(target_dir, "games_data.csv")
-df.to_csv(csv_path, index=False)
-
-print(f"CSV saved as {csv_path}")
+        written = ingest(partial(fetch_page, session, limiter, args.url, args.page_size),
+                         partial(parse_page, args.page_size),
+                         args.output, FIELDNAMES, max_pages=args.pages, workers=args.workers,
+                         resume=not args.restart)
+        print(f"{written} new games saved to {args.output}")
@@ -1,52 +1,13 @@
-import requests
-import pandas as pd
 import os
+import hashlib
+import argparse
+from functools import partial
+from catalog_ingest import RateLimiter, make_session, fetch_json, fetch_json_conditional, ingest, refresh
 
 # Replace with your actual Last.fm API key
-API_KEY = "08aa399305b24426122732788fe19f5c"
+API_KEY = os.environ.get("LASTFM_API_KEY", "08aa399305b24426122732788fe19f5c")
 url = "http://ws.audioscrobbler.com/2.0/"
 
-# Define parameters for the API request to fetch top tracks
-params = {
-    "method": "chart.gettoptracks",
-    "api_key": API_KEY,
-    "format": "json",
-    "limit": 40  # Number of tracks to fetch; adjust as needed
-}
-
-# Make the API request
-response = requests.get(url, params=params)
-
-# Debug: Print status code, content type, and response text
-print("Status Code:", response.status_code)
-print("Content-Type:", response.headers.get("Content-Type"))
-print("Response Text:", response.text)
-
-# Check if the response was successful (HTTP 200)
-if response.status_code != 200:
-    raise Exception(f"Error fetching data: HTTP {response.status_code}")
-
-# Check if the response content is empty or only whitespace
-if not response.text.strip():
-    raise Exception("Error: Empty response")
-
-# Attempt to decode the JSON response
-try:
-    data = response.json()
-except Exception as e:
-    raise Exception(f"Error decoding JSON: {e}\nResponse Text was: {response.text}")
-
-print("JSON Data successfully retrieved.")
-
-# Extract the list of tracks from the response.
-# The JSON structure from chart.gettoptracks is typically: {"tracks": {"track": [ ... ] } }
-tracks = data.get("tracks", {}).get("track", [])
-if not tracks:
-    raise Exception("No track data found in JSON response.")
-
-# Prepare a list to store processed music data
-music_list = []
-
 # Define a list of sample genres to simulate genre information.
 genres = ["Pop", "Rock", "Electronic", "Indie", "Hip-Hop"]
 
@@ -60,35 +21,91 @@ genre_to_mood = {
     "Unknown": "neutral"
 }
 
-# Process each track entry from the API response
-for i, track in enumerate(tracks):
-    track_name = track.get("name")
-    artist_name = track.get("artist", {}).get("name")
-    # Use the track's MusicBrainz ID (mbid) if available; otherwise, use the index as an ID.
-    track_id = track.get("mbid") if track.get("mbid") else str(i)
-    
-    # For demonstration, assign a genre by cycling through the predefined genres list.
-    genre = genres[i % len(genres)]
-    # Map the genre to a mood using our dictionary.
-    mood = genre_to_mood.get(genre, "neutral")
-    
-    music_list.append({
-        "id": track_id,
-        "title": track_name,
-        "artist": artist_name,
-        "genre": genre,
-        "mood": mood
-    })
-
-# Convert the list of music dictionaries to a Pandas DataFrame
-df = pd.DataFrame(music_list)
-
-# Ensure the target directory exists before saving the CSV
-target_dir = "app/suggestions/data"
-os.makedirs(target_dir, exist_ok=True)
-
-# Define the path for the CSV file and save the DataFrame
-csv_path = os.path.join(target_dir, "music_data.csv")
-df.to_csv(csv_path, index=False)
-
-print(f"CSV saved as {csv_path}")
+FIELDNAMES = ["id", "title", "artist", "genre", "mood"]
+
+
+def track_id(track):
+    """
+    Returns a track's MusicBrainz ID (mbid), or for tracks without one an id
+    derived from its artist and title. Chart positions shift between
+    downloads, so they cannot identify a track: user feedback is kept per id.
+    """
+    if track.get("mbid"):
+        return track["mbid"]
+    name = f"{track.get('artist', {}).get('name') or ''}\n{track.get('name') or ''}".lower()
+    return "lastfm-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+
+
+def fetch_page(session, limiter, api_url, page_size, page, since=None, validators=None):
+    """
+    Fetches one page of Last.fm's top tracks chart.
+
+    With `validators` (refresh mode) the request is conditional and a
+    (data or None, validators) pair is returned. The chart has no "updated
+    since" filter, so `since` is not used.
+    """
+    params = {
+        "method": "chart.gettoptracks",
+        "api_key": API_KEY,
+        "format": "json",
+        "limit": page_size,
+        "page": page
+    }
+    if validators is not None or since is not None:
+        return fetch_json_conditional(session, api_url, params, limiter, validators)
+    return fetch_json(session, api_url, params, limiter)
+
+
+def parse_page(page_size, page, data):
+    """
+    Converts a chart.gettoptracks page into catalog rows.
+
+    The JSON structure is typically: {"tracks": {"track": [...], "@attr": {"totalPages": ...}}}
+    """
+    tracks = data.get("tracks", {}).get("track", [])
+    total_pages = data.get("tracks", {}).get("@attr", {}).get("totalPages")
+    rows = []
+    for offset, track in enumerate(tracks):
+        # Position in the whole chart, so ids and genres do not repeat across pages.
+        i = (page - 1) * page_size + offset
+        # For demonstration, assign a genre by cycling through the predefined genres list.
+        genre = genres[i % len(genres)]
+        # Map the genre to a mood using our dictionary.
+        mood = genre_to_mood.get(genre, "neutral")
+
+        rows.append({
+            "id": track_id(track),
+            "title": track.get("name"),
+            "artist": track.get("artist", {}).get("name"),
+            "genre": genre,
+            "mood": mood
+        })
+    return rows, int(total_pages) if total_pages else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the music catalog from the Last.fm top tracks chart.")
+    parser.add_argument("--pages", type=int, default=200, help="Largest number of pages to fetch.")
+    parser.add_argument("--page-size", type=int, default=50, help="Tracks per page.")
+    parser.add_argument("--workers", type=int, default=4, help="Pages fetched concurrently.")
+    parser.add_argument("--rate", type=float, default=5.0, help="Largest number of requests per second.")
+    parser.add_argument("--url", default=url, help="API endpoint.")
+    parser.add_argument("--output", default=os.path.join("app", "suggestions", "data", "music_data.csv"),
+                        help="Catalog CSV to write.")
+    parser.add_argument("--restart", action="store_true", help="Ignore earlier progress and start over.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Merge new and changed items into the existing catalog and publish a new version.")
+    args = parser.parse_args()
+
+    session = make_session(args.workers)
+    limiter = RateLimiter(args.rate)
+    if args.refresh:
+        refresh(partial(fetch_page, session, limiter, args.url, args.page_size),
+                partial(parse_page, args.page_size),
+                args.output, FIELDNAMES, max_pages=args.pages, workers=args.workers)
+    else:
+        written = ingest(partial(fetch_page, session, limiter, args.url, args.page_size),
+                         partial(parse_page, args.page_size),
+                         args.output, FIELDNAMES, max_pages=args.pages, workers=args.workers,
+                         resume=not args.restart)
+        print(f"{written} new tracks saved to {args.output}")
@@ -1,15 +1,296 @@
-from flask import Flask, request, jsonify, send_from_directory
+import time
+# Start of the process-level startup clock, reported on /metrics.
+_startup_started = time.perf_counter()
+
+from flask import Flask, Request, Response, request, jsonify, send_from_directory, stream_with_context
+from werkzeug.wsgi import get_input_stream
+import io
+import json
 import os
-from ser.emotion_classifier import predict_emotion
-from suggestions.recommendation_engine import RecommendationEngine
+import threading
+import numpy as np
+from ser.emotion_classifier import (CLASSIFIER, VAD, extract_mfcc_from_array, predict_emotion_segments,
+                                    predict_emotions_from_audio, predict_emotions_from_features)
+from ser.audio_io import MAX_AUDIO_SECONDS, RESAMPLER, audio_duration, decode_audio
+from ser.model_registry import get_registry
+from ser.response_cache import cache_from_env, make_key
+from ser.feature_pool import PoolSaturated, pool_from_env
+from ser.jobs import QueueFull, queue_from_env
+from ser.batching import MicroBatcher
+from ser.streaming import StreamingEmotionRecognizer, pcm_chunks_to_float
+from ser.vad import speech_features
+from suggestions.recommendation_engine import DATA_DIR, get_engine
+from suggestions.user_preferences import EVENT_SCORES, store_from_env
+from utils.metrics import REGISTRY, ERRORS_TOTAL, Counter, Gauge, Histogram, stage_timer
+
+IMPORT_SECONDS = time.perf_counter() - _startup_started
+
+class InMemoryRequest(Request):
+    """
+    Request class that keeps uploaded files in memory instead of letting
+    Werkzeug spool large uploads to a temporary file on disk.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 app = Flask(__name__, static_folder="app/ui", static_url_path="")
+app.request_class = InMemoryRequest
+# Uploads are held in memory, so cap their size (/predict/stream is exempt).
+app.config["MAX_CONTENT_LENGTH"] = int(float(os.environ.get("SER_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
+
+STARTUP_GAUGE = Gauge("ser_startup_seconds", "Time from importing the app to the given startup phase.", ["phase"])
+STARTUP_GAUGE.set(IMPORT_SECONDS, phase="imports")
+
+# The SER model is loaded once per process instead of on every request, and
+# its files are watched so new weights are picked up without a restart.
+model_registry = get_registry()
+
+def warm_up():
+    """
+    Loads the model and primes the feature engine (its lazy imports and
+    cached filterbanks) so the first request does not pay for them.
+    """
+    try:
+        if CLASSIFIER == "wav2vec2":
+            predict_emotions_from_audio([np.zeros(16000, dtype=np.float32)])
+        else:
+            model_registry.get()
+            extract_mfcc_from_array(np.zeros(22050, dtype=np.float32), sr=22050)
+    except Exception as e:
+        print(f"SER warm-up failed, will retry on first request: {e}")
+        return
+    ready_seconds = time.perf_counter() - _startup_started
+    STARTUP_GAUGE.set(ready_seconds, phase="ready")
+    print(f"SER ready {ready_seconds:.2f}s after startup")
+
+# Concurrent /predict requests are queued and run through the model together
+# as one batch, trading a few milliseconds of wait for far fewer predict calls.
+batcher = MicroBatcher(
+    predict_emotions_from_features,
+    max_batch_size=int(os.environ.get("SER_MAX_BATCH_SIZE", "32")),
+    max_wait_ms=float(os.environ.get("SER_MAX_BATCH_WAIT_MS", "5")),
+)
+
+# wav2vec2 uploads are queued the same way, as raw waveforms: the windows
+# of concurrent requests share length buckets and forward passes, and a
+# single thread runs the model, so parallel forwards do not oversubscribe
+# torch's threads.
+audio_batcher = MicroBatcher(
+    predict_emotions_from_audio,
+    max_batch_size=int(os.environ.get("SER_WAV2VEC2_MAX_CLIPS", "8")),
+    max_wait_ms=float(os.environ.get("SER_MAX_BATCH_WAIT_MS", "5")),
+    stack=False,
+) if CLASSIFIER == "wav2vec2" else None
+
+# Decode and MFCC can run in a bounded pool of worker processes instead of
+# the request threads (SER_FEATURE_WORKERS); when it is full, /predict
+# answers 503.
+feature_pool = pool_from_env()
+
+# How long an async job waits for room in a saturated feature pool before
+# it fails.
+JOB_POOL_WAIT_SECONDS = float(os.environ.get("SER_JOB_POOL_WAIT", "60"))
+
+def run_job(payload):
+    # A queued job waits for room in the feature pool instead of failing at
+    # once, backing off up to a second between tries.
+    data, user_id = payload
+    deadline = time.monotonic() + JOB_POOL_WAIT_SECONDS
+    delay = 0.05
+    while True:
+        try:
+            return predict_response(data, user_id)
+        except PoolSaturated:
+            if time.monotonic() + delay > deadline:
+                raise PoolSaturated(f"Feature pool still saturated after {JOB_POOL_WAIT_SECONDS:g}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+# Long uploads can be submitted as jobs (POST /predict?async=1) that run on a
+# few worker threads, shortest clips first, instead of holding a request
+# thread for the whole decode and inference.
+job_queue = queue_from_env(run_job)
+
+# Repeated uploads of the same clip (retries, double posts, health probes)
+# are answered from this cache instead of being decoded and scored again.
+response_cache = cache_from_env()
+
+def clear_response_cache(registry):
+    # Results of the previous model are stale once new weights are loaded.
+    if registry.version > 1:
+        response_cache.clear()
+
+if response_cache is not None:
+    model_registry.add_reload_listener(clear_response_cache)
+
+def response_cache_key(data):
+    """
+    Returns the cache key of an upload for the active classifier and model.
+    """
+    if CLASSIFIER == "wav2vec2":
+        from ser.wav2vec2_backend import MODEL_DIR
+        return make_key(data, "wav2vec2", model_dir=os.path.abspath(MODEL_DIR),
+                        quantize=os.environ.get("SER_WAV2VEC2_QUANTIZE", "0"), max_duration=MAX_AUDIO_SECONDS,
+                        resampler=RESAMPLER)
+    model_registry.get()
+    return make_key(data, model_registry.model_id, sr=22050, n_mfcc=13, max_duration=MAX_AUDIO_SECONDS,
+                    resampler=RESAMPLER, vad=VAD)
+
+# The suggestion catalogs are indexed once at startup and shared by all requests.
+recommendation_engine = get_engine()
+
+# Suggestion feedback per user (POST /feedback) personalizes the suggestions
+# of requests that name a user_id; SUGGESTIONS_USER_DB="" turns it off.
+user_store = store_from_env(DATA_DIR)
+
+def start_workers():
+    """
+    Starts the per-process background work: the feature pool, the batcher,
+    job and feedback writer threads and the model and catalog watchers. A
+    pre-forking server calls this in each worker after the fork (see
+    gunicorn.conf.py), since neither threads nor child processes carry over
+    into a forked process.
+    """
+    # The pool forks first, while this process has no other threads.
+    if feature_pool is not None:
+        feature_pool.start()
+    batcher.start()
+    if audio_batcher is not None:
+        audio_batcher.start()
+    job_queue.start()
+    if user_store is not None:
+        user_store.start()
+    model_registry.start_watcher(interval=float(os.environ.get("SER_MODEL_RELOAD_INTERVAL", "5")))
+    recommendation_engine.start_watcher(interval=float(os.environ.get("SUGGESTIONS_REFRESH_INTERVAL", "30")))
+
+# Under a pre-forking server (SER_PREFORK=1) this module is imported once in
+# the master, and an eager warm-up loads the model before the workers are
+# forked, so they all share its memory.
+if os.environ.get("SER_PREFORK") != "1":
+    start_workers()
+
+# SER_STARTUP_MODE controls when the heavy work happens:
+#   eager      - load and warm up before serving (default)
+#   background - start serving at once and warm up in a background thread
+#   lazy       - load nothing until the first request needs it
+startup_mode = os.environ.get("SER_STARTUP_MODE", "eager")
+if startup_mode == "eager":
+    warm_up()
+elif startup_mode == "background":
+    threading.Thread(target=warm_up, name="ser-warm-up", daemon=True).start()
+
+STARTUP_GAUGE.set(time.perf_counter() - _startup_started, phase="serving")
+print(f"Imports took {IMPORT_SECONDS:.2f}s; serving {time.perf_counter() - _startup_started:.2f}s "
+      f"after startup (mode: {startup_mode})")
+
+# Request-level metrics; per-stage timings are recorded by the SER and
+# suggestion modules themselves.
+REQUEST_SECONDS = Histogram("http_request_seconds", "End-to-end request latency.", ["route"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled.", ["route"])
+BATCH_QUEUE_DEPTH = Gauge("ser_batch_queue_depth", "Requests waiting for the batcher.",
+                          callback=lambda: batcher.stats()["queue_depth"])
+VAD_FRAMES_TOTAL = Counter("ser_vad_frames_total", "MFCC frames of uploads by voice activity (SER_VAD=1).",
+                           ["kind"])
 
 # Serve the index.html file when the root URL is requested.
 @app.route("/")
 def index():
     return send_from_directory("app/ui", "index.html")
 
+def predict_speech(data):
+    """
+    Scores the speech segments of an uploaded clip (SER_VAD=1); silence and
+    pauses are never run through the MFCC transform.
+    """
+    if feature_pool is not None:
+        with stage_timer("features"):
+            speech = feature_pool.extract(data, sr=22050, vad=True)
+    else:
+        audio = decode_audio(data, sr=22050, max_duration=MAX_AUDIO_SECONDS)
+        with stage_timer("mfcc"):
+            speech = speech_features(audio, sr=22050)
+    VAD_FRAMES_TOTAL.inc(speech["frames"] - speech["skipped_frames"], kind="speech")
+    VAD_FRAMES_TOTAL.inc(speech["skipped_frames"], kind="skipped")
+    # The segments of one clip already form a batch, so they skip the batcher.
+    with stage_timer("predict"):
+        result = predict_emotion_segments(speech)
+    result["vad"] = {"frames": speech["frames"], "skipped_frames": speech["skipped_frames"]}
+    return result
+
+def predict_upload(data):
+    """
+    Decodes an uploaded clip and returns its prediction: a dict with the
+    "emotion", plus the per-segment results when SER_VAD=1.
+    """
+    if CLASSIFIER == "wav2vec2":
+        # The wav2vec2 classifier works on raw 16 kHz audio.
+        audio = decode_audio(data, sr=16000, max_duration=MAX_AUDIO_SECONDS)
+        with stage_timer("predict"):
+            return {"emotion": audio_batcher.predict(audio)}
+    if VAD:
+        return predict_speech(data)
+    if feature_pool is not None:
+        with stage_timer("features"):
+            mfcc_features = feature_pool.extract(data, sr=22050)
+    else:
+        audio = decode_audio(data, sr=22050, max_duration=MAX_AUDIO_SECONDS)
+        # Extract features in the request thread, then let the batcher run
+        # them through the model together with other in-flight requests.
+        with stage_timer("mfcc"):
+            mfcc_features = extract_mfcc_from_array(audio, sr=22050)
+    with stage_timer("predict"):
+        return {"emotion": batcher.predict(mfcc_features)}
+
+def predict_response(data, user_id=None):
+    """
+    Returns the /predict response for an uploaded clip: its prediction, from
+    the response cache when possible, and matching suggestions, personalized
+    for `user_id` if given.
+    """
+    cache_key = response_cache_key(data) if response_cache is not None else None
+    prediction = response_cache.get(cache_key) if cache_key else None
+    if prediction is None:
+        prediction = predict_upload(data)
+        if cache_key:
+            response_cache.put(cache_key, prediction)
+    profile = None
+    if user_id and user_store is not None:
+        with stage_timer("user_profile"):
+            profile = user_store.profile(user_id)
+    # Use the shared recommendation engine to get suggestions
+    suggestions = recommendation_engine.suggest(prediction["emotion"], profile=profile)
+    response = dict(prediction, suggestions=[label for _, label in suggestions])
+    if user_id:
+        # Ids the client sends back to /feedback.
+        response["suggestion_ids"] = [key for key, _ in suggestions]
+    return response
+
+def request_user_id():
+    """
+    Returns the user_id form field or query argument of the request, or None.
+
+    Raises:
+        ValueError: If it is too long.
+    """
+    user_id = request.form.get("user_id") or request.args.get("user_id")
+    if user_id and len(user_id) > 128:
+        raise ValueError("user_id must be at most 128 characters.")
+    return user_id or None
+
+def submit_job(data, user_id):
+    """
+    Queues an upload as an async job and returns the 202 response.
+    """
+    callback = request.form.get("callback") or request.args.get("callback")
+    try:
+        record = job_queue.submit((data, user_id), duration=audio_duration(data), callback=callback, size=len(data))
+    except QueueFull:
+        return jsonify({'error': 'Job queue full, please retry.'}), 503, {"Retry-After": "5"}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    status_url = f"/jobs/{record['job_id']}"
+    return jsonify(dict(record, status_url=status_url)), 202, {"Location": status_url}
+
 # Endpoint for predicting emotion from an uploaded audio file.
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -17,30 +298,122 @@ def predict():
         return jsonify({'error': 'No audio file provided.'}), 400
 
     audio_file = request.files['audio']
-    
-    # Save the uploaded file temporarily
-    temp_path = os.path.join("data", "temp_audio.wav")
-    audio_file.save(temp_path)
-    
+    # The upload is decoded straight from memory; nothing is written
+    # to disk, so concurrent requests cannot clobber each other.
+    data = audio_file.stream.getvalue()
     try:
-        # Use your SER module to predict emotion
-        emotion = predict_emotion(temp_path)
-        # Use your recommendation engine to get suggestions
-        engine = RecommendationEngine()
-        suggestions = engine.get_suggestions(emotion)
-        
-        response = {
-            "emotion": emotion,
-            "suggestions": suggestions
-        }
-    except Exception as e:
-        response = {"error": str(e)}
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        user_id = request_user_id()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get("async") == "1":
+        return submit_job(data, user_id)
+
+    start = time.perf_counter()
+    with IN_FLIGHT.track_inprogress(route="predict"):
+        try:
+            response = predict_response(data, user_id)
+        except PoolSaturated:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route="predict")
+            return jsonify({'error': 'Server busy, please retry.'}), 503, {"Retry-After": "1"}
+        except Exception as e:
+            ERRORS_TOTAL.inc(stage="request", type=type(e).__name__)
+            app.logger.exception("Prediction failed")
+            response = {"error": str(e)}
+    REQUEST_SECONDS.observe(time.perf_counter() - start, route="predict")
     
     return jsonify(response)
 
+# Feedback on suggestions: one event or a list of events, each
+# {"user_id": ..., "item_id": <one of suggestion_ids>, "event": "like"}.
+# Events are written to the preference store in batches.
+@app.route('/feedback', methods=['POST'])
+def feedback():
+    if user_store is None:
+        return jsonify({'error': 'Personalization is disabled.'}), 404
+    body = request.get_json(silent=True)
+    events = body if isinstance(body, list) else [body]
+    if not 0 < len(events) <= 100:
+        return jsonify({'error': 'Send between 1 and 100 events.'}), 400
+    accepted = []
+    for event in events:
+        if not isinstance(event, dict) or not all(isinstance(event.get(key), str)
+                                                  for key in ("user_id", "item_id", "event")):
+            return jsonify({'error': 'Each event needs user_id, item_id and event strings.'}), 400
+        if not 0 < len(event["user_id"]) <= 128:
+            return jsonify({'error': 'user_id must be 1 to 128 characters.'}), 400
+        if event["event"] not in EVENT_SCORES:
+            return jsonify({'error': f'event must be one of {sorted(EVENT_SCORES)}.'}), 400
+        mood = recommendation_engine.find_mood(event["item_id"])
+        if mood is None:
+            return jsonify({'error': f'Unknown item {event["item_id"]}.'}), 400
+        accepted.append((event["user_id"], event["item_id"], mood, event["event"]))
+    # Nothing is recorded unless every event is valid.
+    for user_id, item_id, mood, event in accepted:
+        user_store.record(user_id, item_id, mood, event)
+    return jsonify({'accepted': len(accepted)}), 202
+
+# Status of an async job; "result" holds the /predict response once it is
+# done. Finished jobs are kept for SER_JOB_TTL seconds.
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    record = job_queue.store.get(job_id)
+    if record is None:
+        return jsonify({'error': 'Unknown or expired job.'}), 404
+    return jsonify(record)
+
+# Endpoint for live or long recordings sent as a chunked upload of raw mono
+# samples (int16 by default). A rolling prediction is streamed back as one
+# JSON line every `every` seconds of audio, without buffering the recording.
+@app.route('/predict/stream', methods=['POST'])
+def predict_stream():
+    sample_format = request.args.get("format", "pcm16")
+    if sample_format not in ("pcm16", "f32"):
+        return jsonify({'error': 'format must be pcm16 or f32.'}), 400
+    try:
+        input_sr = int(request.args.get("sr", "22050"))
+        emit_every = float(request.args.get("every", "2"))
+        context_seconds = float(request.args.get("context", "4"))
+    except ValueError:
+        return jsonify({'error': 'sr, every and context must be numbers.'}), 400
+    if input_sr <= 0 or emit_every <= 0 or context_seconds <= 0:
+        return jsonify({'error': 'sr, every and context must be positive.'}), 400
+
+    recognizer = StreamingEmotionRecognizer(batcher.predict, input_sr=input_sr, sr=22050,
+                                            emit_every=emit_every, context_seconds=context_seconds)
+
+    # The body is read a chunk at a time and never held in memory, so it is
+    # read past the upload cap: a live session may run for hours.
+    stream = get_input_stream(request.environ, max_content_length=None)
+
+    def read_chunks(chunk_size=16384):
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def generate():
+        try:
+            for samples in pcm_chunks_to_float(read_chunks(), sample_format):
+                for prediction in recognizer.push(samples):
+                    yield json.dumps(prediction) + "\n"
+            for prediction in recognizer.push(np.zeros(0, dtype=np.float32), final=True):
+                yield json.dumps(dict(prediction, final=True)) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# Batch-fill and queue-wait statistics for tuning the batcher settings.
+@app.route('/stats/batching', methods=['GET'])
+def batching_stats():
+    return jsonify(batcher.stats())
+
+# Prometheus-style metrics: stage latency histograms, error counters,
+# in-flight gauges and model load time.
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,216 @@
+import io
+import os
+import struct
+from functools import lru_cache
+import numpy as np
+import soundfile as sf
+import soxr
+from utils.metrics import stage_timer
+
+# Resampler used when a clip's rate differs from the model's: "soxr_hq" is
+# what librosa.load uses and what the models were trained with; "soxr_mq"
+# and "soxr_lq" trade accuracy for speed, and "poly" is a polyphase FIR
+# filter with its taps designed once per rate pair.
+RESAMPLER = os.environ.get("SER_RESAMPLER", "soxr_hq")
+RESAMPLERS = ("soxr_hq", "soxr_mq", "soxr_lq", "poly")
+_SOXR_QUALITY = {"soxr_hq": "HQ", "soxr_mq": "MQ", "soxr_lq": "LQ"}
+
+# Longest audio decoded from an upload; anything after it is ignored, so a
+# huge upload cannot blow up latency or memory (0 = no limit).
+MAX_AUDIO_SECONDS = float(os.environ.get("SER_MAX_AUDIO_SECONDS", "0")) or None
+
+# WAVE format tags of the sample formats the fast path reads itself
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _parse_wav(buffer):
+    """
+    Reads the header of a RIFF/WAVE file.
+
+    Returns:
+        (numpy.dtype, float, int, int, int): Sample dtype, the scale that maps
+        samples to [-1, 1), channel count, sample rate and the byte range of
+        the sample data; or None if this is not a PCM/float WAV the fast path
+        handles (e.g. 8/24-bit or compressed), so the caller falls back.
+    """
+    if len(buffer) < 12 or buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+        return None
+    position = 12
+    fmt = None
+    while position + 8 <= len(buffer):
+        chunk_id = bytes(buffer[position:position + 4])
+        chunk_size = struct.unpack_from("<I", buffer, position + 4)[0]
+        body = position + 8
+        if chunk_id == b"fmt " and chunk_size >= 16:
+            fmt = struct.unpack_from("<HHIIHH", buffer, body)
+            if fmt[0] == _WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # The real format tag is the first two bytes of the sub-format GUID.
+                fmt = (struct.unpack_from("<H", buffer, body + 24)[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            format_tag, channels, sample_rate, _, block_align, bits = fmt
+            kinds = {(_WAVE_FORMAT_PCM, 16): ("<i2", 1 / 32768.0), (_WAVE_FORMAT_PCM, 32): ("<i4", 1 / 2147483648.0),
+                     (_WAVE_FORMAT_IEEE_FLOAT, 32): ("<f4", None), (_WAVE_FORMAT_IEEE_FLOAT, 64): ("<f8", None)}
+            kind = kinds.get((format_tag, bits))
+            if kind is None or channels < 1 or block_align != channels * bits // 8:
+                return None
+            # Streamed WAVs may carry a bogus data size; clamp it to the file.
+            end = min(body + chunk_size, len(buffer))
+            return np.dtype(kind[0]), kind[1], channels, sample_rate, body, end
+        # Chunks are padded to an even size.
+        position = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def audio_duration(data):
+    """
+    Returns the duration in seconds of encoded audio from its header alone,
+    or None if it cannot be determined without decoding.
+    """
+    buffer = memoryview(data).cast("B")
+    header = _parse_wav(buffer)
+    if header is not None:
+        dtype, _, channels, sample_rate, start, end = header
+        return (end - start) // (dtype.itemsize * channels) / sample_rate if sample_rate else None
+    try:
+        info = sf.info(io.BytesIO(buffer))
+    except Exception:
+        return None
+    return info.frames / info.samplerate if info.samplerate and info.frames > 0 else None
+
+
+def _read_wav(buffer, max_frames=None):
+    """
+    Decodes a PCM/float WAV held in memory without copying the samples
+    before conversion: they are viewed in place with np.frombuffer.
+
+    Returns:
+        (numpy.ndarray, int): Mono float32 samples and their rate, or None if
+        the fast path does not handle this file.
+    """
+    header = _parse_wav(buffer)
+    if header is None:
+        return None
+    dtype, scale, channels, sample_rate, start, end = header
+    frames = (end - start) // (dtype.itemsize * channels)
+    if max_frames is not None:
+        frames = min(frames, max_frames)
+    samples = np.frombuffer(buffer, dtype=dtype, count=frames * channels, offset=start).reshape(frames, channels)
+    if channels > 1:
+        # Down-mix to mono the same way librosa.load does.
+        audio = samples.mean(axis=1, dtype=np.float32)
+    else:
+        audio = samples[:, 0].astype(np.float32)
+    if scale is not None:
+        audio *= np.float32(scale)
+    return audio, sample_rate
+
+
+def _read_soundfile(source, max_frames=None):
+    """
+    Decodes any format libsndfile supports (FLAC, OGG, MP3, 24-bit WAV, ...).
+    """
+    audio, sample_rate = sf.read(source, frames=-1 if max_frames is None else max_frames, dtype="float32",
+                                 always_2d=True)
+    audio = audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+    return audio, sample_rate
+
+
+@lru_cache(maxsize=32)
+def _polyphase_filter(src_sr, dst_sr):
+    """
+    Returns (up, down, taps) of the anti-aliasing FIR filter that resamples
+    `src_sr` to `dst_sr`, designed like scipy.signal.resample_poly's default
+    (Kaiser window, beta 5). Designing it is the expensive part, so it is
+    done once per rate pair.
+    """
+    import math
+    from scipy.signal import firwin
+
+    divisor = math.gcd(src_sr, dst_sr)
+    up, down = dst_sr // divisor, src_sr // divisor
+    max_rate = max(up, down)
+    half_length = 10 * max_rate
+    # resample_poly scales custom taps by `up` itself; float32 taps keep the
+    # filtering in single precision.
+    taps = firwin(2 * half_length + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    return up, down, taps.astype(np.float32)
+
+
+def resample(audio, src_sr, dst_sr, resampler=None):
+    """
+    Resamples a mono float32 waveform.
+
+    Parameters:
+        audio (numpy.ndarray): 1D waveform at `src_sr`.
+        src_sr (int): Its sample rate.
+        dst_sr (int): Target sample rate.
+        resampler (str): One of RESAMPLERS (default: SER_RESAMPLER).
+
+    Returns:
+        numpy.ndarray: The waveform at `dst_sr`.
+    """
+    resampler = resampler or RESAMPLER
+    if src_sr == dst_sr:
+        return audio
+    if resampler == "poly":
+        from scipy.signal import resample_poly
+
+        up, down, taps = _polyphase_filter(int(src_sr), int(dst_sr))
+        return resample_poly(audio, up, down, window=taps)
+    if resampler not in _SOXR_QUALITY:
+        raise ValueError(f"Unknown resampler {resampler!r}, expected one of {RESAMPLERS}")
+    return soxr.resample(audio, src_sr, dst_sr, quality=_SOXR_QUALITY[resampler])
+
+
+def decode_audio(source, sr=22050, max_duration=None, resampler=None):
+    """
+    Decodes audio into a mono float32 waveform.
+
+    PCM and float WAVs are parsed directly from memory; other formats go
+    through libsndfile. Decoding and resampling are timed as separate
+    stages.
+
+    Parameters:
+        source (bytes, file-like or str): Encoded audio (WAV, FLAC, OGG,
+                                          MP3, ...) as raw bytes, a readable
+                                          binary stream such as an uploaded
+                                          file's stream, or a file path.
+        sr (int): Sample rate to resample the audio to.
+        max_duration (float): Only the first `max_duration` seconds are
+                              decoded (default: all of it).
+        resampler (str): One of RESAMPLERS (default: SER_RESAMPLER).
+
+    Returns:
+        numpy.ndarray: A 1D float32 array of samples at `sr`.
+    """
+    with stage_timer("decode"):
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                source = f.read()
+        elif hasattr(source, "getbuffer"):
+            source = source.getbuffer()
+        elif not isinstance(source, (bytes, bytearray, memoryview)):
+            source = source.read()
+        buffer = memoryview(source).cast("B")
+        decoded = None
+        if max_duration is None:
+            decoded = _read_wav(buffer)
+        else:
+            header = _parse_wav(buffer)
+            if header is not None:
+                decoded = _read_wav(buffer, max_frames=int(max_duration * header[3]))
+        if decoded is None:
+            stream = io.BytesIO(buffer)
+            max_frames = None
+            if max_duration is not None:
+                max_frames = int(max_duration * sf.info(stream).samplerate)
+                stream.seek(0)
+            decoded = _read_soundfile(stream, max_frames)
+        audio, native_sr = decoded
+    with stage_timer("resample"):
+        audio = resample(audio, native_sr, sr, resampler)
+    return np.ascontiguousarray(audio, dtype=np.float32)
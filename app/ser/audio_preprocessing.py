@@ -1,50 +1,251 @@
 import os
-import librosa
+import csv
+import json
+import time
+import hashlib
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import soundfile as sf
+from ser.feature_engine import load_audio
+from ser.vad import trim
 
 # Define the source directory containing raw audio
-raw_audio_dir = os.path.join("data", "Audio_data")
-print("Raw audio directory:", os.path.abspath(raw_audio_dir))
+RAW_AUDIO_DIR = os.path.join("data", "Audio_data")
 
 # Define the target directory to save processed audio
-processed_audio_dir = os.path.join("data", "processed_audio")
-print("Processed audio directory:", os.path.abspath(processed_audio_dir))
-os.makedirs(processed_audio_dir, exist_ok=True)
+PROCESSED_AUDIO_DIR = os.path.join("data", "processed_audio")
 
 # Target sample rate for processing (e.g., 22050 Hz)
 TARGET_SR = 22050
 
-files_processed = 0
-
-# Walk through all files in the raw audio directory
-for root, dirs, files in os.walk(raw_audio_dir):
-    for file in files:
-        # Process only audio files (e.g., .wav, .mp3, .flac)
-        if file.lower().endswith((".wav", ".mp3", ".flac")):
-            file_path = os.path.join(root, file)
-            print("Processing file:", os.path.abspath(file_path))
-            try:
-                # Load the audio file with the target sample rate
-                audio, sr = librosa.load(file_path, sr=TARGET_SR, mono=True)
-                # Trim silence from the beginning and end of the clip
-                audio_trimmed, _ = librosa.effects.trim(audio)
-                
-                # Preserve subfolder structure by calculating the relative path
-                relative_path = os.path.relpath(root, raw_audio_dir)
-                save_dir = os.path.join(processed_audio_dir, relative_path)
-                os.makedirs(save_dir, exist_ok=True)
-                
-                # Define the new file path in the processed directory
-                new_file_path = os.path.join(save_dir, file)
-                
-                # Save the processed audio file using soundfile
-                sf.write(new_file_path, audio_trimmed, TARGET_SR)
-                print(f"Processed and saved: {os.path.abspath(new_file_path)}")
-                files_processed += 1
-            except Exception as e:
-                print(f"Failed to process {os.path.abspath(file_path)}: {e}")
-
-if files_processed == 0:
-    print("No audio files were processed. Please check the raw audio folder and file extensions.")
-else:
-    print(f"Audio preprocessing completed. {files_processed} file(s) processed.")
+# Only these audio files are processed
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac")
+
+# Bookkeeping files written next to the processed audio
+MANIFEST_NAME = "preprocess_manifest.json"
+ERROR_REPORT_NAME = "preprocess_errors.csv"
+
+# How often (in completed files) the manifest is flushed to disk, so an
+# interrupted run keeps most of its progress.
+MANIFEST_FLUSH_EVERY = 200
+
+
+def find_audio_files(raw_audio_dir):
+    """
+    Walks the raw audio directory and yields the path of every audio file.
+    """
+    for root, dirs, files in os.walk(raw_audio_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(AUDIO_EXTENSIONS):
+                yield os.path.join(root, file)
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the preprocessing manifest, or returns an empty one.
+
+    The manifest maps each source file (relative to the raw audio directory)
+    to its size, mtime, content hash, target sample rate and output path.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Atomically writes the manifest so a crash never leaves it half-written.
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def preprocess_file(file_path, output_path, target_sr=TARGET_SR):
+    """
+    Resamples one audio file, trims leading/trailing silence and saves it.
+
+    Parameters:
+        file_path (str): Source audio file.
+        output_path (str): Where the processed audio is written.
+        target_sr (int): Sample rate of the processed audio.
+    """
+    # Load the audio file with the target sample rate
+    audio = load_audio(file_path, sr=target_sr)
+    # Trim silence from the beginning and end of the clip
+    audio_trimmed = trim(audio)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Save the processed audio file using soundfile
+    sf.write(output_path, audio_trimmed, target_sr)
+
+
+def _process_task(file_path, output_path, target_sr, previous_hash):
+    """
+    Worker entry point: hashes the source, skips it if the content is
+    unchanged since the last run, otherwise preprocesses it.
+
+    Returns:
+        dict: Outcome with status ("processed", "unchanged" or "failed").
+    """
+    result = {"file": file_path, "output": output_path}
+    try:
+        content_hash = file_sha256(file_path)
+        result["sha256"] = content_hash
+        if content_hash == previous_hash and os.path.exists(output_path):
+            result["status"] = "unchanged"
+            return result
+        preprocess_file(file_path, output_path, target_sr)
+        result["status"] = "processed"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error_type"] = type(e).__name__
+        result["error"] = str(e) or repr(e)
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def write_error_report(failures, report_path):
+    """
+    Writes one row per failed file to a CSV error report.
+    """
+    with open(report_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "error_type", "error", "traceback"])
+        for failure in failures:
+            writer.writerow([failure["file"], failure["error_type"], failure["error"], failure["traceback"]])
+
+
+def preprocess_directory(raw_audio_dir=RAW_AUDIO_DIR, processed_audio_dir=PROCESSED_AUDIO_DIR,
+                         target_sr=TARGET_SR, workers=None, force=False):
+    """
+    Preprocesses every audio file under `raw_audio_dir` using a process pool.
+
+    Files whose size and mtime match the manifest are skipped without being
+    opened; files whose metadata changed are re-hashed and only reprocessed
+    if their content actually changed. Failures are collected into
+    `preprocess_errors.csv` in the processed audio directory.
+
+    Parameters:
+        raw_audio_dir (str): Directory containing raw audio.
+        processed_audio_dir (str): Directory to save processed audio to.
+        target_sr (int): Target sample rate.
+        workers (int): Number of worker processes (default: CPU count;
+                       1 runs in-process).
+        force (bool): Reprocess every file regardless of the manifest.
+
+    Returns:
+        dict: Counts of processed, skipped and failed files.
+    """
+    os.makedirs(processed_audio_dir, exist_ok=True)
+    manifest_path = os.path.join(processed_audio_dir, MANIFEST_NAME)
+    report_path = os.path.join(processed_audio_dir, ERROR_REPORT_NAME)
+    manifest = {} if force else load_manifest(manifest_path)
+    workers = workers or os.cpu_count() or 1
+
+    # Decide which files need work using only a stat() call per file.
+    tasks = []
+    stats = {}
+    skipped = 0
+    failures = []
+    for file_path in find_audio_files(raw_audio_dir):
+        relative_path = os.path.relpath(file_path, raw_audio_dir)
+        output_path = os.path.join(processed_audio_dir, relative_path)
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            # E.g. deleted or made unreadable since the directory walk.
+            failures.append({"file": file_path, "output": output_path, "status": "failed",
+                             "error_type": type(e).__name__, "error": str(e) or repr(e),
+                             "traceback": traceback.format_exc()})
+            print(f"Failed to process {os.path.abspath(file_path)}: {e}")
+            continue
+        stats[file_path] = (relative_path, stat.st_size, stat.st_mtime_ns)
+        entry = manifest.get(relative_path)
+        if (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["target_sr"] == target_sr and os.path.exists(output_path)):
+            skipped += 1
+            continue
+        previous_hash = entry["sha256"] if entry and entry["target_sr"] == target_sr else None
+        tasks.append((file_path, output_path, target_sr, previous_hash))
+
+    print(f"{len(tasks)} file(s) to check, {skipped} unchanged file(s) skipped.")
+
+    processed = 0
+    completed = 0
+    start = time.perf_counter()
+
+    def record(result):
+        nonlocal processed, skipped, completed
+        completed += 1
+        if result["status"] == "failed":
+            failures.append(result)
+            print(f"Failed to process {os.path.abspath(result['file'])}: {result['error']}")
+            return
+        relative_path, size, mtime_ns = stats[result["file"]]
+        manifest[relative_path] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": result["sha256"],
+            "target_sr": target_sr,
+            "output": result["output"],
+        }
+        if result["status"] == "processed":
+            processed += 1
+        else:
+            skipped += 1
+        if completed % MANIFEST_FLUSH_EVERY == 0:
+            save_manifest(manifest, manifest_path)
+            print(f"{completed}/{len(tasks)} file(s) done")
+
+    if workers == 1:
+        for task in tasks:
+            record(_process_task(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_process_task, *task) for task in tasks]
+            for future in as_completed(futures):
+                record(future.result())
+
+    save_manifest(manifest, manifest_path)
+    write_error_report(failures, report_path)
+    elapsed = time.perf_counter() - start
+    print(f"Processed {processed} file(s) in {elapsed:.1f}s with {workers} worker(s); "
+          f"{skipped} unchanged, {len(failures)} failed.")
+    if failures:
+        print(f"Error report written to: {os.path.abspath(report_path)}")
+    return {"processed": processed, "skipped": skipped, "failed": len(failures)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resample and trim raw audio files.")
+    parser.add_argument("--raw-dir", default=RAW_AUDIO_DIR, help="Directory containing raw audio.")
+    parser.add_argument("--out-dir", default=PROCESSED_AUDIO_DIR, help="Directory to save processed audio to.")
+    parser.add_argument("--sr", type=int, default=TARGET_SR, help="Target sample rate.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count, 1 = no pool).")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and reprocess everything.")
+    args = parser.parse_args()
+
+    print("Raw audio directory:", os.path.abspath(args.raw_dir))
+    print("Processed audio directory:", os.path.abspath(args.out_dir))
+    counts = preprocess_directory(args.raw_dir, args.out_dir, target_sr=args.sr,
+                                  workers=args.workers, force=args.force)
+    if counts["processed"] + counts["skipped"] + counts["failed"] == 0:
+        print("No audio files were processed. Please check the raw audio folder and file extensions.")
+    else:
+        print("Audio preprocessing completed.")
@@ -0,0 +1,163 @@
+import os
+import csv
+import time
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from ser.emotion_classifier import load_model_and_metadata, VAD
+from ser.feature_extraction import _extract_cached
+from ser.feature_store import ColumnStore
+
+# Default locations of the archive to score and of the results
+AUDIO_DIR = os.path.join("data", "Audio_data")
+SCORES_DIR = os.path.join("data", "scores")
+ERRORS_NAME = "errors.csv"
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg")
+
+
+def iter_audio_files(audio_dir, extensions=AUDIO_EXTENSIONS):
+    """
+    Yields audio file paths under `audio_dir` as the directory walk finds
+    them, so scoring starts before a large archive has been listed.
+    """
+    for root, dirs, files in os.walk(audio_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(extensions):
+                yield os.path.join(root, file)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_directory(audio_dir=AUDIO_DIR, out_dir=SCORES_DIR, workers=None, batch_size=1024, chunk_size=8,
+                    n_mfcc=13, sr=22050, cache_dir=None, vad=None):
+    """
+    Scores every audio file under `audio_dir` and appends the results to a
+    ColumnStore in `out_dir`: one column file of probabilities per class and
+    one index row of (file path, predicted label) per file.
+
+    Files are decoded and turned into MFCCs on a pool of worker processes,
+    `chunk_size` files per task; features are collected into batches of
+    `batch_size` for one predict call each. Every batch is committed to the
+    store before the next one starts, and files already in the store are
+    skipped, so an interrupted run resumes where it stopped. Files that fail
+    to decode are listed in errors.csv, which is rewritten on every run:
+    they are retried next time, and only the failures of the latest run are
+    listed.
+
+    Features are computed the way the served model expects them: with
+    SER_VAD=1 only the speech frames of each clip are averaged (see
+    ser.vad). Score whole-clip and speech-only models into separate
+    `out_dir`s.
+
+    Parameters:
+        audio_dir (str): Directory to score, searched recursively.
+        out_dir (str): Result store directory.
+        workers (int): Decode worker processes (default: CPU count).
+        batch_size (int): Files per model predict call.
+        chunk_size (int): Files per worker task.
+        n_mfcc (int): Number of MFCC coefficients (should match training).
+        sr (int): Sample rate for audio loading.
+        cache_dir (str): Feature cache directory, or None to disable caching.
+        vad (bool): Average the MFCCs of the speech frames only (default:
+                    SER_VAD).
+
+    Returns:
+        (int, int): Number of files scored and failed in this run.
+    """
+    vad = VAD if vad is None else vad
+    store = ColumnStore(out_dir)
+    if store.exists() and store.meta().get("layout") != "columns":
+        raise ValueError(f"{out_dir} is not a column store; score into a new directory")
+    done = set(store.index()[0]) if store.exists() else set()
+    if done:
+        print(f"Resuming: {len(done)} file(s) already scored in {os.path.abspath(out_dir)}")
+
+    # Spawned (not forked) workers: the parent holds the model, and TensorFlow
+    # does not survive a fork.
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    model, metadata = load_model_and_metadata()
+    classes = [metadata[str(i)] for i in range(len(metadata))]
+    if not store.exists():
+        store.create(classes)
+    elif store.meta().get("columns", classes) != classes:
+        raise ValueError(f"{out_dir} holds scores for classes {store.meta()['columns']}, the model has {classes}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    errors_file = open(os.path.join(out_dir, ERRORS_NAME), "w", newline="", encoding="utf-8")
+    errors = csv.writer(errors_file)
+    batch_paths, batch_features = [], []
+    scored = failed = 0
+    start = time.perf_counter()
+
+    def flush():
+        nonlocal scored
+        probabilities = np.asarray(model.predict_on_batch(np.stack(batch_features).astype(np.float32)))
+        labels = [classes[i] for i in probabilities.argmax(axis=1)]
+        # The append is the checkpoint: once it returns, these files are done.
+        store.append(probabilities, batch_paths, labels)
+        scored += len(batch_paths)
+        elapsed = time.perf_counter() - start
+        print(f"Scored {scored} file(s) in {elapsed:.1f}s ({scored / elapsed:.1f} files/s)")
+        batch_paths.clear()
+        batch_features.clear()
+
+    def collect(results):
+        nonlocal failed
+        for file_path, features, _, error in results:
+            if error is not None:
+                errors.writerow([file_path, error])
+                failed += 1
+                continue
+            batch_paths.append(file_path)
+            batch_features.append(features)
+        if len(batch_paths) >= batch_size:
+            errors_file.flush()
+            flush()
+
+    try:
+        chunks = _chunks((path for path in iter_audio_files(audio_dir) if path not in done), chunk_size)
+        in_flight = set()
+        # Keep a bounded number of chunks queued so paths are streamed and
+        # finished features do not pile up in memory.
+        for chunk in itertools.islice(chunks, workers * 4):
+            in_flight.add(executor.submit(_extract_cached, chunk, n_mfcc, sr, cache_dir, vad))
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                collect(future.result())
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    in_flight.add(executor.submit(_extract_cached, chunk, n_mfcc, sr, cache_dir, vad))
+        if batch_paths:
+            flush()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        errors_file.close()
+    return scored, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a directory of audio files with the SER model.")
+    parser.add_argument("--audio-dir", default=AUDIO_DIR, help="Directory to score, searched recursively.")
+    parser.add_argument("--out-dir", default=SCORES_DIR, help="Result store directory.")
+    parser.add_argument("--workers", type=int, default=None, help="Decode worker processes (default: CPU count).")
+    parser.add_argument("--batch-size", type=int, default=1024, help="Files per model predict call.")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Files per worker task.")
+    parser.add_argument("--cache-dir", default=None, help="Reuse and fill this feature cache directory.")
+    args = parser.parse_args()
+
+    scored, failed = score_directory(args.audio_dir, args.out_dir, workers=args.workers, batch_size=args.batch_size,
+                                     chunk_size=args.chunk_size, cache_dir=args.cache_dir)
+    print(f"Scored {scored} file(s), {failed} failed; results in {os.path.abspath(args.out_dir)}")
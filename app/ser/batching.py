@@ -0,0 +1,221 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+from utils.metrics import Histogram
+
+BATCH_SIZE = Histogram("ser_batch_size", "Number of requests per model batch.",
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+QUEUE_WAIT_SECONDS = Histogram("ser_queue_wait_seconds", "Time requests wait in the batching queue.")
+
+
+class _PendingRequest:
+    """
+    One queued feature vector waiting to be part of a batch.
+    """
+    __slots__ = ("features", "future", "enqueued_at")
+
+    def __init__(self, features):
+        self.features = features
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-clip predictions into one batched forward pass.
+
+    Request threads call `predict()` with one feature vector each. A single
+    background thread collects queued vectors until either `max_batch_size`
+    of them are waiting or the oldest one has waited `max_wait_ms`, stacks
+    them into an (N, n_features) array, calls `predict_fn` once and hands
+    each caller its own row of the result. With `stack=False` the inputs are
+    passed as a list instead, for inputs of different lengths such as raw
+    waveforms. Either way only the batching thread calls `predict_fn`.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0,
+                 max_queue_size=0, stats_window=2048, stack=True):
+        """
+        Parameters:
+            predict_fn (callable): Takes an (N, n_features) float32 array and
+                                   returns a sequence of N results.
+            max_batch_size (int): Largest batch sent to `predict_fn`.
+            max_wait_ms (float): Longest time the first request of a batch
+                                 waits for others to join it.
+            max_queue_size (int): Bound on queued requests (0 = unbounded).
+            stats_window (int): Number of recent queue-wait samples kept for
+                                percentile reporting.
+            stack (bool): Stack the inputs into one array; False passes
+                          `predict_fn` a list of the N inputs.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stack = stack
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._stopping = False
+        self._start_lock = threading.Lock()
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._requests = 0
+        self._batch_sizes = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=stats_window)
+
+    def start(self):
+        """
+        Starts the batching thread (idempotent).
+        """
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="ser-micro-batcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the batching thread after the requests already queued are served.
+        """
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._stopping = True
+            # The marker only wakes the thread up early; with a full queue it
+            # sees the flag once the queue is drained. A blocking put here
+            # could wait forever for room in the queue.
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, features):
+        """
+        Queues one feature vector for prediction.
+
+        Parameters:
+            features (numpy.ndarray): A 1D feature vector.
+
+        Returns:
+            concurrent.futures.Future: Resolves to this vector's result.
+        """
+        if self._thread is None:
+            self.start()
+        request = _PendingRequest(np.asarray(features, dtype=np.float32))
+        self._queue.put_nowait(request)
+        return request.future
+
+    def predict(self, features, timeout=None):
+        """
+        Queues one feature vector and blocks until its result is ready.
+        """
+        return self.submit(features).result(timeout=timeout)
+
+    def _collect_batch(self, first):
+        """
+        Pulls more requests off the queue until the batch is full or the
+        first request's wait budget is spent.
+        """
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop marker: the main loop exits once the queue is empty.
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stopping:
+                    return
+                continue
+            if first is None:
+                continue
+            batch = self._collect_batch(first)
+            started = time.perf_counter()
+            self._record(batch, started)
+
+            try:
+                inputs = [request.features for request in batch]
+                if self.stack:
+                    inputs = np.stack(inputs)
+                results = self.predict_fn(inputs)
+                # A short result must not leave the callers it skipped waiting forever.
+                if len(results) != len(batch):
+                    raise ValueError(f"predict_fn returned {len(results)} result(s) for a batch of {len(batch)}")
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+
+    def _record(self, batch, started):
+        BATCH_SIZE.observe(len(batch))
+        for request in batch:
+            QUEUE_WAIT_SECONDS.observe(started - request.enqueued_at)
+        with self._stats_lock:
+            self._batches += 1
+            self._requests += len(batch)
+            size = len(batch)
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            for request in batch:
+                wait = started - request.enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._recent_waits.append(wait)
+
+    def stats(self):
+        """
+        Returns batch-fill and queue-wait statistics.
+
+        Returns:
+            dict: Counts, mean batch size and fill ratio, a histogram of batch
+                  sizes and queue-wait times in milliseconds.
+        """
+        with self._stats_lock:
+            batches = self._batches
+            requests = self._requests
+            sizes = dict(sorted(self._batch_sizes.items()))
+            wait_total = self._wait_total
+            wait_max = self._wait_max
+            recent = np.array(self._recent_waits, dtype=np.float64)
+
+        mean_batch = requests / batches if batches else 0.0
+        stats = {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batches": batches,
+            "requests": requests,
+            "mean_batch_size": mean_batch,
+            "mean_batch_fill": mean_batch / self.max_batch_size,
+            "batch_size_histogram": sizes,
+            "queue_wait_ms": {
+                "mean": (wait_total / requests * 1000.0) if requests else 0.0,
+                "max": wait_max * 1000.0,
+            },
+        }
+        if recent.size:
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) * 1000.0
+            stats["queue_wait_ms"].update({"p50": p50, "p95": p95, "p99": p99})
+        return stats
@@ -1,47 +1,107 @@
 import os
-import json
 import numpy as np
-import librosa
-import tensorflow as tf
+from ser.model_registry import get_registry
+from utils.metrics import stage_timer
+# MFCC extraction lives in the shared feature engine so serving computes
+# exactly the same features as training.
+from ser.feature_engine import extract_mfcc, extract_mfcc_from_array
 
-def extract_mfcc(file_path, n_mfcc=13, sr=22050):
+# Which classifier predict_emotion uses: "mfcc" for the MFCC model served by
+# the ModelRegistry, or "wav2vec2" for the fine-tuned wav2vec2 checkpoint.
+CLASSIFIER = os.environ.get("SER_CLASSIFIER", "mfcc")
+
+# With SER_VAD=1 the MFCC classifier only looks at detected speech: each
+# speech segment is scored and the segments are combined (see ser.vad).
+# The model should then be trained on features extracted with --vad.
+VAD = os.environ.get("SER_VAD", "0") == "1"
+
+def load_model_and_metadata():
     """
-    Loads an audio file and extracts MFCC features.
-    Averages the MFCCs over time to create a fixed-length feature vector.
-    
+    Returns the trained model and metadata (label mapping).
+
+    The model is loaded once per process by the shared ModelRegistry and
+    reused on every later call; the registry also hot-reloads it when the
+    files on disk change.
+
+    Returns:
+        model: The loaded Keras model.
+        metadata (dict): Mapping of class indices (as strings) to emotion labels.
+    """
+    return get_registry().get()
+
+def predict_probabilities(mfcc_batch):
+    """
+    Runs a batch of feature vectors through the model in one forward pass.
+
     Parameters:
-        file_path (str): Path to the audio file.
-        n_mfcc (int): Number of MFCC coefficients to extract.
-        sr (int): Sample rate to use.
-    
+        mfcc_batch (numpy.ndarray): Array of shape (N, n_mfcc).
+
     Returns:
-        numpy.ndarray: A 1D array of averaged MFCC features.
+        (numpy.ndarray, list): (N, n_classes) class probabilities and the
+        emotion label of each class index.
     """
-    try:
-        audio, sample_rate = librosa.load(file_path, sr=sr, mono=True)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sample_rate, n_mfcc=n_mfcc)
-        mfccs_mean = np.mean(mfccs, axis=1)
-        return mfccs_mean
-    except Exception as e:
-        print(f"Error extracting MFCC from {file_path}: {e}")
-        raise
+    model, metadata = load_model_and_metadata()
+    with stage_timer("model_predict"):
+        probabilities = np.asarray(model.predict_on_batch(np.asarray(mfcc_batch, dtype=np.float32)))
+    return probabilities, [metadata.get(str(index), "Unknown") for index in range(probabilities.shape[1])]
 
-def load_model_and_metadata():
+def predict_emotions_from_features(mfcc_batch):
     """
-    Loads the trained model and metadata (label mapping).
-    
+    Predicts emotions for a batch of feature vectors in one forward pass.
+
+    Parameters:
+        mfcc_batch (numpy.ndarray): Array of shape (N, n_mfcc).
+
     Returns:
-        model: The loaded Keras model.
-        metadata (dict): Mapping of class indices (as strings) to emotion labels.
+        list: N predicted emotion labels.
     """
-    model_path = os.path.join("app", "ser", "models", "model.h5")
-    metadata_path = os.path.join("app", "ser", "models", "model_metadata.json")
-    
-    model = tf.keras.models.load_model(model_path)
-    with open(metadata_path, "r") as f:
-        metadata = json.load(f)
-    
-    return model, metadata
+    probabilities, labels = predict_probabilities(mfcc_batch)
+    return [labels[index] for index in np.argmax(probabilities, axis=1)]
+
+def predict_emotion_segments(speech):
+    """
+    Scores the speech segments of a clip in one forward pass and combines
+    them into one prediction for the clip.
+
+    Each segment's probabilities count in proportion to its duration times
+    its confidence (top probability), so long, clear-cut segments outweigh
+    short or ambiguous ones.
+
+    Parameters:
+        speech (dict): Output of ser.vad.speech_features.
+
+    Returns:
+        dict: "emotion" and "confidence" of the clip, and "segments", a list
+        of {"start", "end", "emotion", "confidence"} (times in seconds).
+    """
+    probabilities, labels = predict_probabilities(speech["segment_features"])
+    confidences = probabilities.max(axis=1)
+    durations = speech["segments"][:, 1] - speech["segments"][:, 0]
+    weights = durations * confidences
+    if weights.sum() <= 0:
+        weights = np.ones(len(weights))
+    combined = weights @ probabilities / weights.sum()
+    best = int(np.argmax(combined))
+    return {
+        "emotion": labels[best],
+        "confidence": float(combined[best]),
+        "segments": [
+            {"start": round(float(start), 3), "end": round(float(end), 3),
+             "emotion": labels[int(np.argmax(row))], "confidence": float(row.max())}
+            for (start, end), row in zip(speech["segments"], probabilities)
+        ],
+    }
+
+def predict_emotions_from_audio(waveforms):
+    """
+    Predicts emotions for a list of 16 kHz mono waveforms with the wav2vec2
+    classifier, which batches and windows them itself.
+
+    Returns:
+        list: One predicted emotion label per waveform.
+    """
+    from ser.wav2vec2_backend import get_classifier
+    return get_classifier().predict(waveforms)
 
 def predict_emotion(audio_file_path, n_mfcc=13, sr=22050):
     """
@@ -55,13 +115,20 @@ def predict_emotion(audio_file_path, n_mfcc=13, sr=22050):
     Returns:
         str: Predicted emotion label.
     """
-    model, metadata = load_model_and_metadata()
+    if CLASSIFIER == "wav2vec2":
+        from ser.audio_io import decode_audio
+        from ser.wav2vec2_backend import SAMPLE_RATE
+        with open(audio_file_path, "rb") as f:
+            audio = decode_audio(f, sr=SAMPLE_RATE)
+        return predict_emotions_from_audio([audio])[0]
+    if VAD:
+        from ser.feature_engine import load_audio
+        from ser.vad import speech_features
+        audio = load_audio(audio_file_path, sr=sr)
+        return predict_emotion_segments(speech_features(audio, sr=sr, n_mfcc=n_mfcc))["emotion"]
     mfcc_features = extract_mfcc(audio_file_path, n_mfcc=n_mfcc, sr=sr)
     mfcc_features = np.expand_dims(mfcc_features, axis=0)  # Add batch dimension
-    predictions = model.predict(mfcc_features)
-    predicted_index = int(np.argmax(predictions, axis=1)[0])
-    predicted_emotion = metadata.get(str(predicted_index), "Unknown")
-    return predicted_emotion
+    return predict_emotions_from_features(mfcc_features)[0]
 
 if __name__ == "__main__":
     # Set the directory that holds your audio files.
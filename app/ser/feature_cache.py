@@ -0,0 +1,189 @@
+import os
+import time
+import hashlib
+import argparse
+import numpy as np
+
+# Default location and size cap of the on-disk MFCC cache
+CACHE_DIR = os.path.join("data", "feature_cache")
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+def content_hash(file_path, chunk_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_hash(data):
+    """
+    Returns the content_hash digest of audio already read into memory.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(audio_hash, n_mfcc, sr, feature_version):
+    """
+    Builds the cache key for one clip's features.
+
+    Parameters:
+        audio_hash (str): Content hash of the audio file.
+        n_mfcc (int): Number of MFCC coefficients.
+        sr (int): Sample rate the audio is loaded at.
+        feature_version (int or str): Version of the extraction code and
+                                      the settings that change its output,
+                                      so stale entries miss.
+
+    Returns:
+        str: A hex key.
+    """
+    raw = f"{audio_hash}:{n_mfcc}:{sr}:{feature_version}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of extracted feature vectors.
+
+    Each entry is a small `.npy` file named after its key and sharded into
+    sub-directories by the key's first two characters. Entries are written
+    atomically, so several processes can share the cache. An entry's mtime
+    is bumped on every hit and eviction removes the least recently used
+    entries first.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npy")
+
+    def get(self, key):
+        """
+        Returns the cached array for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            features = np.load(path)
+        except (OSError, ValueError):
+            return None
+        try:
+            # Mark the entry as recently used for LRU eviction.
+            os.utime(path, None)
+        except OSError:
+            pass
+        return features
+
+    def put(self, key, features):
+        """
+        Stores `features` under `key`.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(features))
+        os.replace(tmp_path, path)
+
+    def entries(self):
+        """
+        Yields (path, size_bytes, mtime) for every cache entry.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        with os.scandir(self.cache_dir) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.name.endswith(".npy"):
+                            stat = entry.stat()
+                            yield entry.path, stat.st_size, stat.st_mtime
+
+    def stats(self):
+        """
+        Returns the number of entries, their total size and the age range.
+        """
+        count = 0
+        total = 0
+        oldest = None
+        newest = None
+        for _, size, mtime in self.entries():
+            count += 1
+            total += size
+            oldest = mtime if oldest is None else min(oldest, mtime)
+            newest = mtime if newest is None else max(newest, mtime)
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes,
+                "oldest": oldest, "newest": newest}
+
+    def prune(self, max_bytes=None, max_age_days=None):
+        """
+        Evicts least recently used entries until the cache fits `max_bytes`,
+        and drops entries not used for `max_age_days`.
+
+        Returns:
+            (int, int): Number of entries removed and bytes freed.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+
+        removed = 0
+        freed = 0
+        for path, size, mtime in entries:
+            expired = cutoff is not None and mtime < cutoff
+            if total <= max_bytes and not expired:
+                # Entries are oldest first, so nothing later is expired either.
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        return self.prune(max_bytes=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and prune the MFCC feature cache.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Cache directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show the number and size of cached entries.")
+    prune_parser = subparsers.add_parser("prune", help="Evict least recently used entries.")
+    prune_parser.add_argument("--max-mb", type=float, default=MAX_CACHE_BYTES / (1024 * 1024),
+                              help="Size cap in megabytes.")
+    prune_parser.add_argument("--max-age-days", type=float, default=None,
+                              help="Also drop entries unused for this many days.")
+    subparsers.add_parser("clear", help="Remove every cached entry.")
+    args = parser.parse_args()
+
+    cache = FeatureCache(args.cache_dir)
+    if args.command == "stats":
+        stats = cache.stats()
+        print(f"Cache directory: {os.path.abspath(args.cache_dir)}")
+        print(f"Entries: {stats['entries']}")
+        print(f"Size: {stats['bytes'] / (1024 * 1024):.2f} MB")
+        if stats["entries"]:
+            print(f"Least recently used: {time.ctime(stats['oldest'])}")
+            print(f"Most recently used: {time.ctime(stats['newest'])}")
+    elif args.command == "prune":
+        removed, freed = cache.prune(max_bytes=int(args.max_mb * 1024 * 1024), max_age_days=args.max_age_days)
+        print(f"Removed {removed} entries ({freed / (1024 * 1024):.2f} MB).")
+    else:
+        removed, freed = cache.clear()
+        print(f"Removed {removed} entries ({freed / (1024 * 1024):.2f} MB).")
@@ -0,0 +1,340 @@
+from functools import lru_cache
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# MFCC parameters shared by training and serving. They reproduce
+# librosa.feature.mfcc's defaults, which the existing models were trained on.
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+# Most padded samples one vectorized pass takes (about 3 s at 22.05 kHz).
+# Beyond this a padded batch is no faster than one clip at a time, and a
+# single long clip would multiply the work of the short ones it is padded
+# with.
+MAX_BATCH_SAMPLES = 1 << 16
+
+
+# librosa and scipy are imported inside the functions that use them, so a
+# serving process only pays for them on its first extraction.
+
+
+@lru_cache(maxsize=8)
+def _window(n_fft):
+    # Periodic Hann window, same as scipy.signal.get_window("hann", n_fft).
+    return (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+@lru_cache(maxsize=16)
+def _mel_basis_t(sr, n_fft, n_mels):
+    """
+    Returns the transposed (n_fft // 2 + 1, n_mels) Slaney mel filterbank.
+    """
+    import librosa
+
+    basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    return np.ascontiguousarray(basis.T, dtype=np.float32)
+
+
+@lru_cache(maxsize=16)
+def _dct_matrix_t(n_mels, n_mfcc):
+    """
+    Returns the transposed (n_mels, n_mfcc) orthonormal DCT-II matrix.
+    """
+    import scipy.fft
+
+    basis = scipy.fft.dct(np.eye(n_mels), type=2, norm="ortho", axis=0)[:n_mfcc]
+    return np.ascontiguousarray(basis.T, dtype=np.float32)
+
+
+def check_audio(audio):
+    """
+    Raises ValueError for a waveform without samples: it has no frames to
+    compute features from, and no prediction should be made for it.
+    """
+    if len(audio) == 0:
+        raise ValueError("The audio is empty: no samples were decoded.")
+
+
+def load_audio(file_path, sr=22050, max_duration=None, data=None):
+    """
+    Loads an audio file as a mono float32 waveform at `sr`.
+
+    Files are decoded by ser.audio_io (a direct path for PCM WAV, libsndfile
+    otherwise); librosa's audioread fallback is only used for formats
+    libsndfile cannot read. Pass the file's bytes as `data` if they were
+    already read, so the file is not read again.
+    """
+    from ser.audio_io import decode_audio
+    import soundfile as sf
+
+    try:
+        return decode_audio(file_path if data is None else data, sr=sr, max_duration=max_duration)
+    except sf.LibsndfileError:
+        import librosa
+
+        audio, _ = librosa.load(file_path, sr=sr, mono=True, duration=max_duration)
+        return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def pad_batch(waveforms):
+    """
+    Zero-pads a list of 1D waveforms to a common length.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): A (B, max_len) float32 array and the
+        original length of each waveform.
+    """
+    lengths = np.array([len(audio) for audio in waveforms], dtype=np.int64)
+    batch = np.zeros((len(waveforms), int(lengths.max()) if len(waveforms) else 0), dtype=np.float32)
+    for row, audio in zip(batch, waveforms):
+        row[:len(audio)] = audio
+    return batch, lengths
+
+
+def length_groups(lengths, max_samples=MAX_BATCH_SAMPLES):
+    """
+    Groups waveforms of similar length so that no group pads to more than
+    `max_samples` samples in total. Clips longer than half of it end up in
+    groups of their own.
+
+    Parameters:
+        lengths (list): Length of each waveform in samples.
+        max_samples (int): Cap on group size times longest length.
+
+    Returns:
+        list: Groups, each a list of waveform indices sorted by length.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    groups, group = [], []
+    for index in np.argsort(lengths, kind="stable").tolist():
+        if group and (len(group) + 1) * int(lengths[index]) > max_samples:
+            groups.append(group)
+            group = []
+        group.append(index)
+    if group:
+        groups.append(group)
+    return groups
+
+
+def frame_counts(lengths, center=True, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Returns the number of STFT frames each unpadded waveform produces.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    if center:
+        return 1 + lengths // hop_length
+    return np.maximum(0, 1 + (lengths - n_fft) // hop_length)
+
+
+def mfcc_batch(waveforms, sr=22050, n_mfcc=13, lengths=None, center=True):
+    """
+    Computes MFCC frames for a batch of equal-length (padded) waveforms in a
+    single vectorized STFT, mel and DCT pass.
+
+    Each clip's frames are identical to what librosa.feature.mfcc produces
+    for that clip alone: padding is zeros, which is what centred framing pads
+    with anyway, and the dB floor is taken per clip over its own frames.
+
+    Parameters:
+        waveforms (numpy.ndarray): Array of shape (B, n_samples).
+        sr (int): Sample rate of the waveforms.
+        n_mfcc (int): Number of MFCC coefficients.
+        lengths (array-like): Unpadded length of each waveform (default: all
+                              are full length).
+        center (bool): Pad n_fft // 2 zeros on both sides like librosa.
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): MFCCs of shape (B, n_mfcc, T) and the
+        number of valid frames per clip; frames past that count are padding.
+    """
+    waveforms = np.atleast_2d(np.asarray(waveforms, dtype=np.float32))
+    batch_size, n_samples = waveforms.shape
+    if lengths is None:
+        lengths = np.full(batch_size, n_samples, dtype=np.int64)
+    counts = frame_counts(lengths, center=center)
+
+    if center:
+        waveforms = np.pad(waveforms, ((0, 0), (N_FFT // 2, N_FFT // 2)))
+    if waveforms.shape[1] < N_FFT:
+        return np.zeros((batch_size, n_mfcc, 0), dtype=np.float32), counts
+
+    # (B, T, n_fft) strided view of the frames; windowing makes one contiguous copy.
+    frames = sliding_window_view(waveforms, N_FFT, axis=1)[:, ::HOP_LENGTH]
+    mfccs = _frames_to_mfcc(frames, sr, n_mfcc, counts)
+    return np.ascontiguousarray(mfccs.transpose(0, 2, 1), dtype=np.float32), counts
+
+
+def _log_mel(frames, sr):
+    """
+    Turns (..., n_fft) raw frames into (..., n_mels) log-mel power in dB,
+    before any dB floor is applied.
+    """
+    import scipy.fft
+
+    spectrum = scipy.fft.rfft(frames * _window(N_FFT), axis=-1, workers=-1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    mel = power @ _mel_basis_t(sr, N_FFT, N_MELS)
+    return 10.0 * np.log10(np.maximum(mel, AMIN))
+
+
+def _frames_to_mfcc(frames, sr, n_mfcc, counts):
+    """
+    Turns (B, T, n_fft) raw frames into (B, T, n_mfcc) MFCCs. The dB floor
+    of each clip is taken over its first `counts` frames.
+    """
+    log_mel = _log_mel(frames, sr)
+    # Clip to TOP_DB below each clip's own peak, ignoring padding frames.
+    valid = np.arange(log_mel.shape[1])[None, :] < np.asarray(counts)[:, None]
+    peaks = np.where(valid[:, :, None], log_mel, -np.inf).max(axis=(1, 2))
+    log_mel = np.maximum(log_mel, (peaks - TOP_DB)[:, None, None])
+
+    return log_mel @ _dct_matrix_t(N_MELS, n_mfcc)
+
+
+def mfcc_at_frames(audio, frame_indices, sr=22050, n_mfcc=13):
+    """
+    Computes the MFCCs of selected (centred) frames of a waveform only, e.g.
+    the speech frames found by ser.vad; the other frames are never
+    transformed. The dB floor is taken over the selected frames.
+
+    Returns:
+        numpy.ndarray: Array of shape (len(frame_indices), n_mfcc).
+    """
+    frame_indices = np.asarray(frame_indices, dtype=np.int64)
+    if frame_indices.size == 0:
+        return np.zeros((0, n_mfcc), dtype=np.float32)
+    padded = np.pad(np.asarray(audio, dtype=np.float32), N_FFT // 2)
+    frames = sliding_window_view(padded, N_FFT)[::HOP_LENGTH][frame_indices]
+    mfccs = _frames_to_mfcc(frames[None], sr, n_mfcc, [frame_indices.size])[0]
+    return np.ascontiguousarray(mfccs, dtype=np.float32)
+
+
+def mean_mfcc_batch(waveforms, sr=22050, n_mfcc=13, lengths=None):
+    """
+    Returns the time-averaged MFCC vector of each waveform in a padded batch.
+
+    Returns:
+        numpy.ndarray: Array of shape (B, n_mfcc).
+    """
+    mfccs, counts = mfcc_batch(waveforms, sr=sr, n_mfcc=n_mfcc, lengths=lengths)
+    valid = np.arange(mfccs.shape[2])[None, :] < counts[:, None]
+    totals = np.einsum("bct,bt->bc", mfccs, valid.astype(np.float32))
+    return totals / np.maximum(counts, 1)[:, None]
+
+
+def mfcc_frames(audio, sr=22050, n_mfcc=13, center=True):
+    """
+    Returns the (n_mfcc, T) MFCC frames of a single waveform.
+    """
+    mfccs, counts = mfcc_batch(audio[None, :], sr=sr, n_mfcc=n_mfcc, center=center)
+    return mfccs[0, :, :counts[0]]
+
+
+def mean_mfcc_list(waveforms, sr=22050, n_mfcc=13, max_samples=MAX_BATCH_SAMPLES):
+    """
+    Returns the time-averaged MFCC vector of each of a list of waveforms of
+    any lengths, batching only clips of similar length (see length_groups).
+
+    Returns:
+        numpy.ndarray: Array of shape (len(waveforms), n_mfcc), in input order.
+    """
+    features = np.zeros((len(waveforms), n_mfcc), dtype=np.float32)
+    for group in length_groups([len(audio) for audio in waveforms], max_samples):
+        batch, lengths = pad_batch([waveforms[index] for index in group])
+        features[group] = mean_mfcc_batch(batch, sr=sr, n_mfcc=n_mfcc, lengths=lengths)
+    return features
+
+
+def mfcc_frames_list(waveforms, sr=22050, n_mfcc=13, max_samples=MAX_BATCH_SAMPLES):
+    """
+    Returns the (n_mfcc, T) MFCC frames of each of a list of waveforms of
+    any lengths, batching only clips of similar length (see length_groups).
+
+    Returns:
+        list: One array per waveform, in input order.
+    """
+    frames = [None] * len(waveforms)
+    for group in length_groups([len(audio) for audio in waveforms], max_samples):
+        batch, lengths = pad_batch([waveforms[index] for index in group])
+        mfccs, counts = mfcc_batch(batch, sr=sr, n_mfcc=n_mfcc, lengths=lengths)
+        for index, mfcc, count in zip(group, mfccs, counts):
+            frames[index] = mfcc[:, :count]
+    return frames
+
+
+def mfcc_frames_running(audio, sr=22050, n_mfcc=13, peak=-np.inf):
+    """
+    Returns the uncentred MFCC frames of one chunk of a stream, with the dB
+    floor of each frame taken TOP_DB below the loudest frame of the stream
+    so far (that frame included) rather than of the chunk. The frames are
+    the same however the stream is cut into chunks.
+
+    Parameters:
+        audio (numpy.ndarray): Samples of whole frames (at least N_FFT).
+        sr (int): Sample rate of `audio`.
+        n_mfcc (int): Number of MFCC coefficients.
+        peak (float): Loudest log-mel value of the earlier chunks.
+
+    Returns:
+        (numpy.ndarray, float): MFCCs of shape (n_mfcc, T) and the peak to
+        pass with the next chunk.
+    """
+    frames = sliding_window_view(np.asarray(audio, dtype=np.float32), N_FFT)[::HOP_LENGTH]
+    log_mel = _log_mel(frames, sr)
+    peaks = np.maximum.accumulate(np.maximum(log_mel.max(axis=1), peak))
+    log_mel = np.maximum(log_mel, (peaks - TOP_DB)[:, None])
+    mfccs = log_mel @ _dct_matrix_t(N_MELS, n_mfcc)
+    return np.ascontiguousarray(mfccs.T, dtype=np.float32), float(peaks[-1])
+
+
+def extract_mfcc_from_array(audio, sr=22050, n_mfcc=13):
+    """
+    Extracts MFCC features from an already decoded waveform.
+    Averages the MFCCs over time to create a fixed-length feature vector.
+
+    Parameters:
+        audio (numpy.ndarray): 1D float32 waveform.
+        sr (int): Sample rate of `audio`.
+        n_mfcc (int): Number of MFCC coefficients to extract.
+
+    Returns:
+        numpy.ndarray: A 1D array of averaged MFCC features.
+
+    Raises:
+        ValueError: If `audio` is empty.
+    """
+    check_audio(audio)
+    return mean_mfcc_batch(np.asarray(audio, dtype=np.float32)[None, :], sr=sr, n_mfcc=n_mfcc)[0]
+
+
+def extract_mfcc(file_path, n_mfcc=13, sr=22050):
+    """
+    Loads an audio file and extracts MFCC features.
+    Averages the MFCCs over time to create a fixed-length feature vector.
+
+    Parameters:
+        file_path (str): Path to the audio file.
+        n_mfcc (int): Number of MFCC coefficients to extract.
+        sr (int): Sample rate to use.
+
+    Returns:
+        numpy.ndarray: A 1D array of averaged MFCC features.
+    """
+    try:
+        return extract_mfcc_from_array(load_audio(file_path, sr=sr), sr=sr, n_mfcc=n_mfcc)
+    except Exception as e:
+        print(f"Error extracting MFCC from {file_path}: {e}")
+        raise
+
+
+def extract_mfcc_batch(file_paths, n_mfcc=13, sr=22050):
+    """
+    Loads several audio files and extracts their averaged MFCC features in
+    vectorized passes over clips of similar length.
+
+    Returns:
+        numpy.ndarray: Array of shape (len(file_paths), n_mfcc).
+    """
+    return mean_mfcc_list([load_audio(file_path, sr=sr) for file_path in file_paths], sr=sr, n_mfcc=n_mfcc)
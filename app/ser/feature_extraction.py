@@ -1,40 +1,104 @@
 import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import librosa
 import pandas as pd
+# extract_mfcc is re-exported for callers that import it from this module.
+from ser.feature_engine import extract_mfcc, load_audio, mean_mfcc_list
+from ser.feature_cache import FeatureCache, CACHE_DIR, MAX_CACHE_BYTES, bytes_hash, make_key
+from ser.feature_store import FeatureStore, STORE_DIR
+from ser.vad import speech_features
+from ser.audio_io import RESAMPLER
 
-def extract_mfcc(file_path, n_mfcc=13, sr=22050):
+# Version of the feature extraction code. Bump it whenever extract_mfcc
+# changes so cached features from the old code are not reused.
+FEATURE_VERSION = 2
+
+# Number of files each worker task loads. Within a task, clips of similar
+# length share vectorized MFCC passes (see feature_engine.length_groups).
+BATCH_SIZE = 16
+
+def find_audio_files(audio_dir):
     """
-    Load an audio file and extract its MFCC features.
+    Walks the audio directory and returns the path of every audio file.
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(audio_dir):
+        dirs.sort()
+        for file in sorted(files):
+            # Only process audio files with common audio extensions
+            if file.lower().endswith((".wav", ".mp3", ".flac")):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
 
-    Parameters:
-        file_path (str): Path to the audio file.
-        n_mfcc (int): Number of MFCC coefficients to extract.
-        sr (int): Sample rate for loading the audio.
+def _extract_cached(file_paths, n_mfcc, sr, cache_dir, vad=False):
+    """
+    Worker entry point: returns the features for a chunk of files. Files whose
+    audio content was already processed are read from the cache; the rest
+    are loaded and run through the feature engine, clips of similar length
+    in shared vectorized passes. With `vad`, only the speech frames of each clip
+    are transformed and averaged (see ser.vad), one clip at a time.
 
     Returns:
-        numpy.ndarray: A fixed-length vector (mean of MFCCs over time).
+        list: One (file path, features or None, cache hit, error message or
+              None) tuple per file, in input order.
     """
-    try:
-        # Load the audio file
-        audio, sample_rate = librosa.load(file_path, sr=sr)
-        # Extract MFCC features
-        mfccs = librosa.feature.mfcc(y=audio, sr=sample_rate, n_mfcc=n_mfcc)
-        # Compute the mean of the MFCCs across the time axis for a fixed-length feature vector
-        mfccs_mean = np.mean(mfccs, axis=1)
-        return mfccs_mean
-    except Exception as e:
-        print(f"Error extracting MFCC from {file_path}: {e}")
-        raise
-
-def process_all_audio(audio_dir, n_mfcc=13, sr=22050):
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    # The resampler (SER_RESAMPLER) changes the decoded audio, and VAD
+    # features differ from whole-clip ones, so both are part of the key.
+    feature_version = f"{FEATURE_VERSION}-{RESAMPLER}" + ("-vad" if vad else "")
+    results = {}
+    keys = {}
+    misses = []
+    waveforms = []
+    for file_path in file_paths:
+        try:
+            data = None
+            if cache is not None:
+                # Read once: the same bytes are hashed and, on a miss, decoded.
+                with open(file_path, "rb") as f:
+                    data = f.read()
+                keys[file_path] = make_key(bytes_hash(data), n_mfcc, sr, feature_version)
+                features = cache.get(keys[file_path])
+                if features is not None:
+                    results[file_path] = (file_path, features, True, None)
+                    continue
+            waveforms.append(load_audio(file_path, sr=sr, data=data))
+            misses.append(file_path)
+        except Exception as e:
+            results[file_path] = (file_path, None, False, str(e) or repr(e))
+
+    if misses:
+        if vad:
+            computed = [speech_features(audio, sr=sr, n_mfcc=n_mfcc)["features"] for audio in waveforms]
+        else:
+            computed = mean_mfcc_list(waveforms, sr=sr, n_mfcc=n_mfcc)
+        for file_path, features in zip(misses, computed):
+            if cache is not None:
+                cache.put(keys[file_path], features)
+            results[file_path] = (file_path, features, False, None)
+    return [results[file_path] for file_path in file_paths]
+
+def process_all_audio(audio_dir, n_mfcc=13, sr=22050, workers=None,
+                      cache_dir=CACHE_DIR, max_cache_bytes=MAX_CACHE_BYTES, vad=False):
     """
     Process all audio files in the specified directory and extract MFCC features.
 
+    Files are processed on a pool of worker processes. Features are stored in
+    a content-addressed cache keyed by (audio hash, n_mfcc, sr, feature
+    version), so re-running after adding new clips only computes the new ones.
+
     Parameters:
         audio_dir (str): Directory containing processed audio files.
         n_mfcc (int): Number of MFCC coefficients to extract.
         sr (int): Sample rate for loading the audio.
+        workers (int): Number of worker processes (default: CPU count;
+                       1 runs in-process).
+        cache_dir (str): Feature cache directory, or None to disable caching.
+        max_cache_bytes (int): Size cap the cache is pruned to afterwards.
+        vad (bool): Average the MFCCs of the speech frames only, skipping
+                    pauses and silence (needs a model trained the same way).
 
     Returns:
         (list, list): A tuple with two lists:
@@ -43,41 +107,97 @@ def process_all_audio(audio_dir, n_mfcc=13, sr=22050):
     """
     features = []
     file_paths = []
-    # Walk through all files in the audio directory
-    for root, dirs, files in os.walk(audio_dir):
-        for file in files:
-            # Only process audio files with common audio extensions
-            if file.lower().endswith((".wav", ".mp3", ".flac")):
-                file_path = os.path.join(root, file)
-                try:
-                    mfcc_feat = extract_mfcc(file_path, n_mfcc=n_mfcc, sr=sr)
-                    features.append(mfcc_feat)
-                    file_paths.append(file_path)
-                    print(f"Extracted features from: {os.path.abspath(file_path)}")
-                except Exception as e:
-                    print(f"Failed to process {os.path.abspath(file_path)}: {e}")
+    all_files = find_audio_files(audio_dir)
+    workers = workers or os.cpu_count() or 1
+    hits = 0
+    start = time.perf_counter()
+
+    # Chunks of files of similar size pad less; the results are put back in
+    # walk order below.
+    by_size = sorted(all_files, key=os.path.getsize)
+    chunks = [by_size[i:i + BATCH_SIZE] for i in range(0, len(by_size), BATCH_SIZE)]
+    tasks = [(chunk, n_mfcc, sr, cache_dir, vad) for chunk in chunks]
+    if workers == 1:
+        results = (_extract_cached(*task) for task in tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_extract_cached, *zip(*tasks)) if tasks else []
+
+    try:
+        by_path = {item[0]: item for chunk in results for item in chunk}
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Output in walk order, so it is deterministic.
+    for file_path, mfcc_feat, cache_hit, error in (by_path[file_path] for file_path in all_files):
+        if error is not None:
+            print(f"Failed to process {os.path.abspath(file_path)}: {error}")
+            continue
+        features.append(mfcc_feat)
+        file_paths.append(file_path)
+        hits += cache_hit
+
+    elapsed = time.perf_counter() - start
+    print(f"Extracted features from {len(features)} file(s) in {elapsed:.1f}s with {workers} worker(s); "
+          f"{hits} cache hit(s), {len(features) - hits} computed.")
+    if cache_dir:
+        removed, freed = FeatureCache(cache_dir, max_cache_bytes).prune()
+        if removed:
+            print(f"Evicted {removed} cache entries ({freed / (1024 * 1024):.2f} MB).")
     return file_paths, features
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract MFCC features from processed audio.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count, 1 = no pool).")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Feature cache directory.")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute every file without the cache.")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="Binary feature store directory.")
+    parser.add_argument("--csv", action="store_true", help="Also write the legacy data/features.csv file.")
+    parser.add_argument("--vad", action="store_true",
+                        help="Average MFCCs over detected speech only (serve the model with SER_VAD=1; "
+                             "use a separate --store-dir from whole-clip features).")
+    args = parser.parse_args()
+
     # Define the directory containing preprocessed audio files.
     # Make sure that your processed audio files are stored in this directory.
     processed_audio_dir = os.path.join("data", "processed_audio")
     print("Processing audio files in:", os.path.abspath(processed_audio_dir))
     
     # Extract features from all processed audio files
-    file_paths, features = process_all_audio(processed_audio_dir)
+    file_paths, features = process_all_audio(processed_audio_dir, workers=args.workers,
+                                             cache_dir=None if args.no_cache else args.cache_dir, vad=args.vad)
     
-    # If features were extracted, save them to a CSV file for later use.
+    # If features were extracted, append the new ones to the binary feature
+    # store and rewrite the rows of files whose audio changed since.
     if features:
-        # Create a DataFrame from the features list.
-        # Each row corresponds to a file, and each column corresponds to one MFCC coefficient.
-        features_df = pd.DataFrame(features)
-        # Add the file path as a column for reference.
-        features_df["file"] = file_paths
-
-        # Define the output CSV path (e.g., data/features.csv)
-        output_csv_path = os.path.join("data", "features.csv")
-        features_df.to_csv(output_csv_path, index=False)
-        print(f"Features successfully saved to: {os.path.abspath(output_csv_path)}")
+        store = FeatureStore(args.store_dir)
+        known_rows = {file_path: row for row, file_path in enumerate(store.index()[0])} if store.exists() else {}
+        new_rows = [i for i, file_path in enumerate(file_paths) if file_path not in known_rows]
+        matrix = store.matrix() if known_rows else None
+        changed_rows = [i for i, file_path in enumerate(file_paths) if file_path in known_rows
+                        and not np.allclose(matrix[known_rows[file_path]], features[i], rtol=1e-6, atol=1e-6)]
+        del matrix
+        if changed_rows:
+            store.update([known_rows[file_paths[i]] for i in changed_rows],
+                         np.stack([features[i] for i in changed_rows]))
+        if new_rows:
+            store.append(np.stack([features[i] for i in new_rows]), [file_paths[i] for i in new_rows])
+        print(f"Appended {len(new_rows)} new row(s) and updated {len(changed_rows)} changed row(s) in the feature "
+              f"store at {os.path.abspath(args.store_dir)} ({len(store)} rows total).")
+
+        if args.csv:
+            # Create a DataFrame from the features list.
+            # Each row corresponds to a file, and each column corresponds to one MFCC coefficient.
+            features_df = pd.DataFrame(features)
+            # Add the file path as a column for reference.
+            features_df["file"] = file_paths
+
+            # Define the output CSV path (e.g., data/features.csv)
+            output_csv_path = os.path.join("data", "features.csv")
+            features_df.to_csv(output_csv_path, index=False)
+            print(f"Features successfully saved to: {os.path.abspath(output_csv_path)}")
     else:
         print("No features extracted. Please check your processed audio directory.")
@@ -0,0 +1,135 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ser.audio_io import MAX_AUDIO_SECONDS, decode_audio
+from ser.feature_engine import extract_mfcc_from_array
+from ser.vad import speech_features
+from utils.metrics import Counter, Gauge
+
+POOL_REJECTED_TOTAL = Counter("ser_feature_pool_rejected_total",
+                              "Uploads turned away because the feature pool was saturated.")
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when the feature pool already holds its maximum of pending uploads.
+    """
+
+
+def extract_upload_features(data, sr=22050, n_mfcc=13, vad=False):
+    """
+    Decodes an upload (up to SER_MAX_AUDIO_SECONDS) and returns its mean
+    MFCC vector, or with `vad` its ser.vad.speech_features. Runs in the
+    pool's worker processes.
+    """
+    audio = decode_audio(data, sr=sr, max_duration=MAX_AUDIO_SECONDS)
+    if vad:
+        return speech_features(audio, sr=sr, n_mfcc=n_mfcc)
+    return extract_mfcc_from_array(audio, sr=sr, n_mfcc=n_mfcc)
+
+
+class FeaturePool:
+    """
+    Bounded pool of worker processes for the CPU-bound decode and MFCC work
+    of /predict, so it runs in parallel instead of behind the GIL of the
+    request threads.
+
+    At most `max_pending` uploads are queued or running at once; past that,
+    extract() raises PoolSaturated right away so the server can answer 503
+    instead of letting latency grow without bound.
+
+    Workers are forked all at once by start(), which should run while the
+    process has no other threads yet (at startup, or in a pre-forking
+    server's post_fork hook): a fork only copies the calling thread.
+    """
+
+    def __init__(self, workers, max_pending=None):
+        """
+        Parameters:
+            workers (int): Number of worker processes.
+            max_pending (int): Largest number of uploads in the pool at once
+                               (default: 4 per worker).
+        """
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Forks the worker processes (idempotent).
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+                # With fork, the executor launches every worker on its first job.
+                self._executor.submit(int).result()
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def pending(self):
+        return self._pending
+
+    def extract(self, data, sr=22050, n_mfcc=13, vad=False):
+        """
+        Returns the mean MFCC vector (or with `vad` the speech features) of
+        an encoded upload, computed in a worker process.
+
+        Raises:
+            PoolSaturated: If `max_pending` uploads are already in the pool,
+                           or the pool was stopped (e.g. restarting after a
+                           worker died) before the upload was submitted.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                POOL_REJECTED_TOTAL.inc()
+                raise PoolSaturated(f"{self._pending} uploads already pending")
+            self._pending += 1
+        try:
+            self.start()
+            # stop() may run between start() and here; submit to the
+            # executor seen under the lock, which shutdown() then waits for.
+            with self._lock:
+                if self._executor is None:
+                    POOL_REJECTED_TOTAL.inc()
+                    raise PoolSaturated("Feature pool is restarting")
+                future = self._executor.submit(extract_upload_features, data, sr, n_mfcc, vad)
+            return future.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); fork a fresh pool for
+            # the next request rather than failing all of them.
+            print("Feature pool worker died, restarting the pool")
+            self.stop()
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_default_pool = None
+
+
+def pool_from_env():
+    """
+    Returns the feature pool configured by SER_FEATURE_WORKERS (0 disables
+    it and features are computed in the request thread) and
+    SER_FEATURE_QUEUE, or None. The pool is not started.
+    """
+    global _default_pool
+    workers = int(os.environ.get("SER_FEATURE_WORKERS", "0"))
+    if workers <= 0:
+        return None
+    max_pending = int(os.environ.get("SER_FEATURE_QUEUE", "0")) or None
+    _default_pool = FeaturePool(workers, max_pending)
+    return _default_pool
+
+
+POOL_PENDING = Gauge("ser_feature_pool_pending", "Uploads queued or running in the feature pool.",
+                     callback=lambda: _default_pool.pending() if _default_pool is not None else None)
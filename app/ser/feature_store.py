@@ -0,0 +1,521 @@
+import io
+import os
+import csv
+import json
+import shutil
+import argparse
+import numpy as np
+
+# Default locations of the binary feature stores
+STORE_DIR = os.path.join("data", "feature_store")
+SEQUENCE_STORE_DIR = os.path.join("data", "sequence_store")
+
+DATA_NAME = "features.f32"
+INDEX_NAME = "index.csv"
+META_NAME = "meta.json"
+
+# RAVDESS filenames encode the emotion as their third field.
+EMOTION_MAPPING = {
+    "01": "neutral",
+    "02": "calm",
+    "03": "happy",
+    "04": "sad",
+    "05": "angry",
+    "06": "fearful",
+    "07": "disgust",
+    "08": "surprised"
+}
+
+
+def ravdess_emotion(file_path):
+    """
+    Returns the emotion label encoded in a RAVDESS-style filename, or "".
+    """
+    name = os.path.basename(file_path.replace("\\", "/"))
+    parts = name.split("-")
+    if len(parts) >= 3:
+        return EMOTION_MAPPING.get(parts[2], "")
+    return ""
+
+
+def _csv_bytes(rows):
+    """
+    Encodes rows as UTF-8 CSV, so index offsets can be tracked in bytes.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+class _StoreFiles:
+    """
+    The paths, metadata and (file, label) index shared by the stores.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.data_path = os.path.join(store_dir, DATA_NAME)
+        self.index_path = os.path.join(store_dir, INDEX_NAME)
+        self.meta_path = os.path.join(store_dir, META_NAME)
+
+    def exists(self):
+        return os.path.exists(self.meta_path)
+
+    def meta(self):
+        """
+        Returns the store metadata (n_features, rows, index_bytes).
+        """
+        with open(self.meta_path, "r") as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def __len__(self):
+        return self.meta()["rows"] if self.exists() else 0
+
+    def index(self):
+        """
+        Returns the file paths and labels of the committed rows.
+
+        Returns:
+            (list, list): File paths and labels, in row order.
+        """
+        rows = self.meta()["rows"]
+        files = []
+        labels = []
+        with open(self.index_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if len(files) == rows:
+                    break
+                files.append(row[0])
+                labels.append(row[1])
+        return files, labels
+
+
+class FeatureStore(_StoreFiles):
+    """
+    Append-only, memory-mapped store of fixed-length feature vectors.
+
+    The store is a directory holding:
+        - features.f32: a row-major little-endian float32 matrix with no header,
+          so new rows are appended to the end of the file in place;
+        - index.csv: one (file, label) row per feature row;
+        - meta.json: the number of columns and of committed rows.
+
+    meta.json is only rewritten after the data and index were appended, so a
+    crash mid-append leaves the previously committed rows readable; the
+    uncommitted tail is cut off on the next append.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        super().__init__(store_dir)
+
+    def create(self, n_features, columns=None):
+        """
+        Creates an empty store with `n_features` columns, optionally named.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        open(self.data_path, "wb").close()
+        with open(self.index_path, "wb") as f:
+            index_bytes = f.write(_csv_bytes([["file", "label"]]))
+        meta = {"n_features": int(n_features), "dtype": "<f4", "rows": 0, "index_bytes": index_bytes}
+        if columns is not None:
+            meta["columns"] = list(columns)
+        self._write_meta(meta)
+
+    def append(self, features, files, labels=None):
+        """
+        Appends rows to the store without rewriting what is already there.
+
+        Parameters:
+            features (array-like): Array of shape (N, n_features).
+            files (list): N source file paths.
+            labels (list): N labels; derived from RAVDESS filenames if omitted.
+        """
+        features = np.ascontiguousarray(features, dtype="<f4")
+        if features.ndim != 2 or features.shape[0] != len(files):
+            raise ValueError("features must be a 2D array with one row per file")
+        if not self.exists():
+            self.create(features.shape[1])
+        meta = self.meta()
+        if features.shape[1] != meta["n_features"]:
+            raise ValueError(f"Expected {meta['n_features']} features per row, got {features.shape[1]}")
+        if labels is None:
+            labels = [ravdess_emotion(file_path) for file_path in files]
+
+        row_bytes = meta["n_features"] * 4
+        with open(self.data_path, "r+b") as f:
+            # Drop any rows left over from an interrupted append.
+            f.truncate(meta["rows"] * row_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(features.tobytes())
+        with open(self.index_path, "r+b") as f:
+            f.truncate(meta["index_bytes"])
+            f.seek(0, os.SEEK_END)
+            f.write(_csv_bytes(zip(files, labels)))
+            index_bytes = f.tell()
+
+        meta["rows"] += features.shape[0]
+        meta["index_bytes"] = index_bytes
+        self._write_meta(meta)
+
+    def update(self, rows, features):
+        """
+        Overwrites committed rows in place, e.g. when a file's audio changed
+        after its features were stored. The index is left as it is.
+
+        Parameters:
+            rows (list): Row numbers to overwrite.
+            features (array-like): Array of shape (len(rows), n_features).
+        """
+        features = np.ascontiguousarray(features, dtype="<f4")
+        meta = self.meta()
+        if features.shape != (len(rows), meta["n_features"]):
+            raise ValueError(f"Expected {len(rows)} rows of {meta['n_features']} features, got {features.shape}")
+        for row in rows:
+            if not 0 <= row < meta["rows"]:
+                raise IndexError(f"Row {row} is not in the store ({meta['rows']} rows)")
+        row_bytes = meta["n_features"] * 4
+        with open(self.data_path, "r+b") as f:
+            for row, values in zip(rows, features):
+                f.seek(row * row_bytes)
+                f.write(values.tobytes())
+
+    def matrix(self):
+        """
+        Returns the feature matrix as a read-only memory map.
+
+        No data is read or copied up front; pages are loaded by the OS on
+        access.
+
+        Returns:
+            numpy.memmap: Array of shape (rows, n_features).
+        """
+        meta = self.meta()
+        if meta["rows"] == 0:
+            return np.empty((0, meta["n_features"]), dtype="<f4")
+        return np.memmap(self.data_path, dtype="<f4", mode="r", shape=(meta["rows"], meta["n_features"]))
+
+
+class SequenceStore(_StoreFiles):
+    """
+    Append-only, memory-mapped store of variable-length feature sequences,
+    e.g. the per-frame MFCCs of each clip.
+
+    features.f32 holds the frames of all sequences back to back and
+    index.csv gives each sequence's (file, label, offset, length, source)
+    in frames, where source identifies the version of the file the frames
+    were extracted from. Appends have the same crash safety as FeatureStore.
+    Since sequences may change length, they are never overwritten in place:
+    remove() rewrites the store without them instead.
+    """
+
+    def __init__(self, store_dir=SEQUENCE_STORE_DIR):
+        super().__init__(store_dir)
+
+    def create(self, n_features):
+        """
+        Creates an empty store for sequences of `n_features`-wide frames.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        open(self.data_path, "wb").close()
+        with open(self.index_path, "wb") as f:
+            index_bytes = f.write(_csv_bytes([["file", "label", "offset", "length", "source"]]))
+        self._write_meta({"n_features": int(n_features), "dtype": "<f4", "rows": 0, "frames": 0,
+                          "index_bytes": index_bytes})
+
+    def append(self, sequences, files, labels=None, sources=None):
+        """
+        Appends sequences to the store without rewriting what is already there.
+
+        Parameters:
+            sequences (list): N arrays of shape (T_i, n_features).
+            files (list): N source file paths.
+            labels (list): N labels; derived from RAVDESS filenames if omitted.
+            sources (list): N source versions, e.g. from source_version().
+        """
+        if len(sequences) != len(files):
+            raise ValueError("Expected one sequence per file")
+        if not sequences:
+            return
+        sequences = [np.ascontiguousarray(sequence, dtype="<f4") for sequence in sequences]
+        if not self.exists():
+            self.create(sequences[0].shape[1])
+        meta = self.meta()
+        if any(sequence.ndim != 2 or sequence.shape[1] != meta["n_features"] for sequence in sequences):
+            raise ValueError(f"Expected sequences of shape (T, {meta['n_features']})")
+        if labels is None:
+            labels = [ravdess_emotion(file_path) for file_path in files]
+        if sources is None:
+            sources = [""] * len(files)
+
+        lengths = [len(sequence) for sequence in sequences]
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]) + meta["frames"]
+        row_bytes = meta["n_features"] * 4
+        with open(self.data_path, "r+b") as f:
+            # Drop any frames left over from an interrupted append.
+            f.truncate(meta["frames"] * row_bytes)
+            f.seek(0, os.SEEK_END)
+            for sequence in sequences:
+                f.write(sequence.tobytes())
+        with open(self.index_path, "r+b") as f:
+            f.truncate(meta["index_bytes"])
+            f.seek(0, os.SEEK_END)
+            f.write(_csv_bytes(zip(files, labels, offsets.tolist(), lengths, sources)))
+            index_bytes = f.tell()
+
+        meta["rows"] += len(sequences)
+        meta["frames"] += int(sum(lengths))
+        meta["index_bytes"] = index_bytes
+        self._write_meta(meta)
+
+    def matrix(self):
+        """
+        Returns the frames of all sequences as a read-only memory map.
+
+        Returns:
+            numpy.memmap: Array of shape (total frames, n_features).
+        """
+        meta = self.meta()
+        if meta["frames"] == 0:
+            return np.empty((0, meta["n_features"]), dtype="<f4")
+        return np.memmap(self.data_path, dtype="<f4", mode="r", shape=(meta["frames"], meta["n_features"]))
+
+    def index(self):
+        """
+        Returns the file paths, labels, frame offsets and lengths of the
+        committed sequences.
+
+        Returns:
+            (list, list, numpy.ndarray, numpy.ndarray): In row order.
+        """
+        rows = self.meta()["rows"]
+        files, labels, offsets, lengths = [], [], [], []
+        with open(self.index_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if len(files) == rows:
+                    break
+                files.append(row[0])
+                labels.append(row[1])
+                offsets.append(int(row[2]))
+                lengths.append(int(row[3]))
+        return files, labels, np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+    def sources(self):
+        """
+        Returns the source version of each committed sequence, in row order;
+        "" where none was recorded.
+        """
+        rows = self.meta()["rows"]
+        sources = []
+        with open(self.index_path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for row in reader:
+                if len(sources) == rows:
+                    break
+                sources.append(row[4] if len(row) > 4 else "")
+        return sources
+
+    def remove(self, rows, chunk_rows=1024):
+        """
+        Removes sequences by rewriting the store without them.
+
+        The kept sequences are copied to a sibling directory, which then
+        replaces the store; the rows after a removed one are renumbered. If
+        the swap is interrupted, the previous store is left in
+        `<store_dir>.old`.
+
+        Parameters:
+            rows (list): Row numbers to remove.
+            chunk_rows (int): Sequences copied per append.
+        """
+        meta = self.meta()
+        remove = set(int(row) for row in rows)
+        for row in remove:
+            if not 0 <= row < meta["rows"]:
+                raise IndexError(f"Row {row} is not in the store ({meta['rows']} rows)")
+        if not remove:
+            return
+        files, labels, offsets, lengths = self.index()
+        sources = self.sources()
+        keep = [row for row in range(meta["rows"]) if row not in remove]
+
+        store_dir = os.path.normpath(self.store_dir)
+        compacted = SequenceStore(store_dir + ".compact")
+        shutil.rmtree(compacted.store_dir, ignore_errors=True)
+        compacted.create(meta["n_features"])
+        frames = self.matrix()
+        for start in range(0, len(keep), chunk_rows):
+            chunk = keep[start:start + chunk_rows]
+            compacted.append([frames[offsets[row]:offsets[row] + lengths[row]] for row in chunk],
+                             [files[row] for row in chunk], [labels[row] for row in chunk],
+                             [sources[row] for row in chunk])
+        # Release the memory map before the directory is moved.
+        del frames
+
+        old_dir = store_dir + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(store_dir, old_dir)
+        os.replace(compacted.store_dir, store_dir)
+        shutil.rmtree(old_dir)
+
+
+class ColumnStore(_StoreFiles):
+    """
+    Append-only store of named float32 columns, e.g. one per class
+    probability of a scoring run.
+
+    The store is a directory holding:
+        - <column>.f32: the values of one column with no header, so reading
+          one column only touches its own file;
+        - index.csv: one (file, label) row per row;
+        - meta.json: the column names and the number of committed rows.
+
+    Appends have the same crash safety as FeatureStore: meta.json is only
+    rewritten once every column and the index were appended.
+    """
+
+    def __init__(self, store_dir):
+        super().__init__(store_dir)
+
+    def column_path(self, name):
+        return os.path.join(self.store_dir, f"{name}.f32")
+
+    def create(self, columns):
+        """
+        Creates an empty store with the given column names.
+        """
+        columns = [str(name) for name in columns]
+        for name in columns:
+            if not name or os.path.basename(name) != name or name.startswith("."):
+                raise ValueError(f"Column name {name!r} cannot be used as a file name")
+        os.makedirs(self.store_dir, exist_ok=True)
+        for name in columns:
+            open(self.column_path(name), "wb").close()
+        with open(self.index_path, "wb") as f:
+            index_bytes = f.write(_csv_bytes([["file", "label"]]))
+        self._write_meta({"layout": "columns", "n_features": len(columns), "columns": columns, "dtype": "<f4",
+                          "rows": 0, "index_bytes": index_bytes})
+
+    def append(self, values, files, labels):
+        """
+        Appends rows to the store without rewriting what is already there.
+
+        Parameters:
+            values (array-like): Array of shape (N, number of columns), in
+                                 column order.
+            files (list): N source file paths.
+            labels (list): N labels.
+        """
+        values = np.asarray(values, dtype="<f4")
+        meta = self.meta()
+        if values.shape != (len(files), len(meta["columns"])):
+            raise ValueError(f"Expected {len(files)} rows of {len(meta['columns'])} columns, got {values.shape}")
+        for name, column in zip(meta["columns"], values.T):
+            with open(self.column_path(name), "r+b") as f:
+                # Drop any values left over from an interrupted append.
+                f.truncate(meta["rows"] * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(column).tobytes())
+        with open(self.index_path, "r+b") as f:
+            f.truncate(meta["index_bytes"])
+            f.seek(0, os.SEEK_END)
+            f.write(_csv_bytes(zip(files, labels)))
+            index_bytes = f.tell()
+
+        meta["rows"] += len(files)
+        meta["index_bytes"] = index_bytes
+        self._write_meta(meta)
+
+    def column(self, name):
+        """
+        Returns the committed values of one column as a read-only memory map.
+        """
+        rows = self.meta()["rows"]
+        if rows == 0:
+            return np.empty(0, dtype="<f4")
+        return np.memmap(self.column_path(name), dtype="<f4", mode="r", shape=(rows,))
+
+    def matrix(self):
+        """
+        Returns all columns as an array of shape (rows, number of columns).
+        """
+        return np.stack([self.column(name) for name in self.meta()["columns"]], axis=1)
+
+
+def source_version(file_path):
+    """
+    Returns a string identifying the current version of a file: its size
+    and modification time.
+    """
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_training_data(store_dir=STORE_DIR):
+    """
+    Loads the feature matrix and labels for training.
+
+    Returns:
+        (numpy.memmap, numpy.ndarray): Memory-mapped (N, n_features) features
+        and an array of N label strings.
+    """
+    store = FeatureStore(store_dir)
+    _, labels = store.index()
+    return store.matrix(), np.array(labels)
+
+
+def convert_csv(csv_path, store_dir=STORE_DIR, chunk_size=100000):
+    """
+    One-time conversion of a features.csv file into a feature store.
+
+    The CSV is read in chunks, so files larger than memory can be converted.
+    Windows path separators in the file column are normalized to "/".
+
+    Returns:
+        int: Number of rows converted.
+    """
+    import pandas as pd
+
+    store = FeatureStore(store_dir)
+    if store.exists() and len(store):
+        raise FileExistsError(f"Feature store at {os.path.abspath(store_dir)} is not empty")
+    rows = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        files = chunk.pop("file").astype(str).str.replace("\\", "/", regex=False).tolist()
+        labels = chunk.pop("label").fillna("").astype(str).tolist() if "label" in chunk else None
+        store.append(chunk.to_numpy(dtype=np.float32), files, labels)
+        rows += len(files)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the binary MFCC feature store.")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="Feature store directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="Convert a features.csv file into the store.")
+    convert_parser.add_argument("csv_path", nargs="?", default=os.path.join("data", "features.csv"))
+    subparsers.add_parser("info", help="Show the size of the store.")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        rows = convert_csv(args.csv_path, args.store_dir)
+        print(f"Converted {rows} rows from {os.path.abspath(args.csv_path)} into {os.path.abspath(args.store_dir)}")
+    else:
+        store = FeatureStore(args.store_dir)
+        meta = store.meta()
+        print(f"Feature store: {os.path.abspath(args.store_dir)}")
+        print(f"Rows: {meta['rows']}, features per row: {meta['n_features']}")
+        if "frames" in meta:
+            print(f"Frames: {meta['frames']}")
+        if "columns" in meta:
+            print(f"Columns: {', '.join(meta['columns'])}")
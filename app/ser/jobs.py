@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import itertools
+import threading
+from urllib.parse import urlsplit
+from utils.metrics import Counter, Gauge, Histogram
+
+JOBS_TOTAL = Counter("ser_jobs_total", "Finished async prediction jobs.", ["status"])
+JOB_QUEUE_SECONDS = Histogram("ser_job_queue_seconds", "Time async jobs wait before a worker picks them up.")
+JOB_CALLBACK_FAILURES_TOTAL = Counter("ser_job_callback_failures_total",
+                                      "Job result callbacks that could not be delivered.")
+
+
+class QueueFull(Exception):
+    """
+    Raised when the job queue already holds its maximum of waiting jobs.
+    """
+
+
+class JobStore:
+    """
+    In-process record of job statuses and results. Finished jobs are kept
+    for `ttl_seconds`, then forgotten.
+    """
+
+    def __init__(self, ttl_seconds=600.0):
+        self.ttl_seconds = ttl_seconds
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def put(self, job_id, record):
+        now = time.time()
+        with self._lock:
+            self._records[job_id] = (record, now + self.ttl_seconds)
+            if len(self._records) % 100 == 0:
+                # Drop expired jobs in bulk now and then rather than on every write.
+                self._records = {key: value for key, value in self._records.items() if value[1] > now}
+
+    def get(self, job_id):
+        with self._lock:
+            entry = self._records.get(job_id)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+
+class SQLiteJobStore:
+    """
+    Job statuses and results in a local SQLite file, so any worker process
+    on the host can answer GET /jobs/<id> for a job another one ran.
+    """
+
+    def __init__(self, db_path, ttl_seconds=600.0):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, record TEXT NOT NULL, "
+                               "expires REAL NOT NULL)")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads or processes;
+        # the store is created in the gunicorn master, before the fork.
+        cached = getattr(self._local, "connection", None)
+        if cached is None or cached[0] != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            cached = self._local.connection = (os.getpid(), connection)
+        return cached[1]
+
+    def put(self, job_id, record):
+        now = time.time()
+        connection = self._connect()
+        connection.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?)",
+                           (job_id, json.dumps(record), now + self.ttl_seconds))
+        self._puts += 1
+        if self._puts % 100 == 0:
+            connection.execute("DELETE FROM jobs WHERE expires <= ?", (now,))
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT record FROM jobs WHERE id = ? AND expires > ?",
+                                      (job_id, time.time())).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+
+class JobQueue:
+    """
+    Runs prediction jobs on a small pool of worker threads, shortest clips
+    first, so long uploads never hold a request thread.
+
+    Jobs are ordered by their submission time plus the duration of their
+    audio: a short clip overtakes the long ones submitted shortly before it,
+    while a long clip still gets its turn once it has waited about as long
+    as it plays, so it is never starved. At most `max_queued` jobs, holding
+    at most `max_queued_bytes` of payload, wait at once; past that, submit()
+    raises QueueFull.
+
+    A job can name a callback URL that receives its final record as a JSON
+    POST; only hosts in `callback_hosts` are accepted.
+    """
+
+    def __init__(self, handler, store, workers=2, max_queued=100, max_queued_bytes=None, callback_hosts=(),
+                 unknown_duration=30.0):
+        """
+        Parameters:
+            handler (callable): Maps a job's payload to its JSON-serializable
+                                result; exceptions mark the job failed.
+            store (JobStore or SQLiteJobStore): Where job records are kept.
+            workers (int): Worker threads.
+            max_queued (int): Largest number of jobs waiting to start.
+            max_queued_bytes (int): Largest total payload size of the waiting
+                                    jobs, as given to submit() (default: no
+                                    limit). A job is always accepted into an
+                                    empty queue.
+            callback_hosts (iterable): Host names callbacks may be sent to.
+            unknown_duration (float): Duration assumed for audio whose
+                                      length could not be read.
+        """
+        self.handler = handler
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_bytes = max_queued_bytes
+        self.callback_hosts = frozenset(host.lower() for host in callback_hosts)
+        self.unknown_duration = unknown_duration
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+        # Jobs waiting to start and their payload bytes; the queue also holds
+        # stop()'s sentinels, so qsize() cannot be used as the bound.
+        self._queued = 0
+        self._queued_bytes = 0
+
+    def start(self):
+        """
+        Starts the worker threads (idempotent, also after a fork).
+        """
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"ser-job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """
+        Stops the worker threads after the jobs already queued are done.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                self._queue.put((float("inf"), next(self._sequence), None))
+        for thread in threads:
+            thread.join()
+
+    def queued(self):
+        return self._queued
+
+    def queued_bytes(self):
+        return self._queued_bytes
+
+    def check_callback(self, url):
+        """
+        Raises ValueError unless `url` is an http(s) URL on an allowed host.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("callback must be an http(s) URL")
+        if parts.hostname.lower() not in self.callback_hosts:
+            raise ValueError(f"callback host {parts.hostname} is not allowed")
+
+    def submit(self, payload, duration=None, callback=None, size=0):
+        """
+        Queues a job.
+
+        Parameters:
+            payload: Passed to the handler.
+            duration (float): Audio duration in seconds, used for ordering.
+            callback (str): Optional URL to POST the finished record to.
+            size (int): Bytes the payload holds in memory while it waits.
+
+        Returns:
+            dict: The job's initial record, including its "job_id".
+
+        Raises:
+            QueueFull: If `max_queued` jobs or `max_queued_bytes` are
+                       already waiting.
+            ValueError: If the callback URL is not allowed.
+        """
+        if callback:
+            self.check_callback(callback)
+        self.start()
+        submitted = time.time()
+        record = {"job_id": uuid.uuid4().hex, "status": "queued", "submitted": submitted, "duration": duration}
+        priority = submitted + (duration if duration is not None else self.unknown_duration)
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self.max_queued} jobs already queued")
+            if (self.max_queued_bytes is not None and self._queued
+                    and self._queued_bytes + size > self.max_queued_bytes):
+                raise QueueFull(f"{self._queued_bytes} bytes of jobs already queued")
+            self._queued += 1
+            self._queued_bytes += size
+            self.store.put(record["job_id"], record)
+            self._queue.put((priority, next(self._sequence), (record, payload, callback, size)))
+        return record
+
+    def _run(self):
+        while True:
+            _, _, job = self._queue.get()
+            if job is None:
+                return
+            record, payload, callback, size = job
+            with self._lock:
+                self._queued -= 1
+                self._queued_bytes -= size
+            record = dict(record, status="running", started=time.time())
+            JOB_QUEUE_SECONDS.observe(record["started"] - record["submitted"])
+            self.store.put(record["job_id"], record)
+            try:
+                record["result"] = self.handler(payload)
+                record["status"] = "done"
+            except Exception as e:
+                record["error"] = str(e) or repr(e)
+                record["status"] = "failed"
+            record["finished"] = time.time()
+            self.store.put(record["job_id"], record)
+            JOBS_TOTAL.inc(status=record["status"])
+            if callback:
+                self._notify(callback, record)
+
+    def _notify(self, url, record, attempts=3):
+        """
+        POSTs a finished job record to its callback URL, with a few retries.
+        """
+        import requests
+
+        for attempt in range(attempts):
+            try:
+                response = requests.post(url, json=record, timeout=5)
+                if response.status_code < 500:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5 * 2 ** attempt)
+        JOB_CALLBACK_FAILURES_TOTAL.inc()
+        print(f"Could not deliver the result of job {record['job_id']} to {url}")
+
+
+_default_queue = None
+
+
+def queue_from_env(handler):
+    """
+    Returns the job queue configured by SER_JOB_WORKERS, SER_JOB_QUEUE,
+    SER_JOB_QUEUE_MB, SER_JOB_TTL, SER_JOB_DB (a SQLite file shared by all
+    workers) and SER_JOB_CALLBACK_HOSTS. The worker threads are not started.
+    """
+    global _default_queue
+    ttl_seconds = float(os.environ.get("SER_JOB_TTL", "600"))
+    db_path = os.environ.get("SER_JOB_DB")
+    store = SQLiteJobStore(db_path, ttl_seconds) if db_path else JobStore(ttl_seconds)
+    hosts = [host.strip() for host in os.environ.get("SER_JOB_CALLBACK_HOSTS", "").split(",") if host.strip()]
+    max_queued_bytes = int(float(os.environ.get("SER_JOB_QUEUE_MB", "200")) * 1024 * 1024)
+    _default_queue = JobQueue(handler, store, workers=int(os.environ.get("SER_JOB_WORKERS", "2")),
+                              max_queued=int(os.environ.get("SER_JOB_QUEUE", "100")),
+                              max_queued_bytes=max_queued_bytes, callback_hosts=hosts)
+    return _default_queue
+
+
+JOBS_QUEUED = Gauge("ser_jobs_queued", "Async jobs waiting for a worker.",
+                    callback=lambda: _default_queue.queued() if _default_queue is not None else None)
+JOBS_QUEUED_BYTES = Gauge("ser_jobs_queued_bytes", "Upload bytes held by the async jobs waiting for a worker.",
+                          callback=lambda: _default_queue.queued_bytes() if _default_queue is not None else None)
@@ -0,0 +1,260 @@
+import os
+import csv
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from ser.feature_store import EMOTION_MAPPING
+
+# Default locations of the corpus and of its manifest
+AUDIO_DIR = os.path.join("data", "Audio_data")
+MANIFEST_DIR = os.path.join("data", "manifest")
+RECORDS_NAME = "manifest.npy"
+PATHS_NAME = "paths.txt"
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+# The seven two-digit fields of a RAVDESS filename, e.g. 03-01-06-01-02-01-12.wav
+RAVDESS_FIELDS = ("modality", "channel", "emotion", "intensity", "statement", "repetition", "actor")
+
+# One fixed-width record per file; the path is kept in paths.txt at the same row.
+MANIFEST_DTYPE = np.dtype([(field, "u1") for field in RAVDESS_FIELDS] + [
+    ("sample_rate", "<u4"),
+    ("frames", "<i8"),
+    ("duration", "<f4"),
+    ("mtime_ns", "<i8"),
+    ("size", "<i8"),
+])
+
+
+def parse_ravdess_name(file_name):
+    """
+    Returns the seven RAVDESS fields of a filename as integers, or None if
+    the name does not follow the convention.
+    """
+    parts = os.path.splitext(os.path.basename(file_name))[0].split("-")
+    if len(parts) != len(RAVDESS_FIELDS) or not all(len(part) == 2 and part.isdigit() for part in parts):
+        return None
+    return tuple(int(part) for part in parts)
+
+
+def _scan_dir(path, extensions):
+    """
+    Lists one directory: (path, mtime_ns, size) of its audio files and the
+    paths of its subdirectories.
+    """
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    stat = entry.stat()
+                    files.append((entry.path, stat.st_mtime_ns, stat.st_size))
+    except OSError as e:
+        print(f"Skipping unreadable directory {os.path.abspath(path)}: {e}")
+    return files, subdirs
+
+
+def scan_tree(root, executor, extensions=AUDIO_EXTENSIONS):
+    """
+    Lists every audio file under `root`, scanning the directories of each
+    tree level in parallel.
+
+    Returns:
+        list: (path, mtime_ns, size) tuples sorted by path.
+    """
+    files = []
+    level = [root]
+    while level:
+        next_level = []
+        for level_files, subdirs in executor.map(_scan_dir, level, [extensions] * len(level)):
+            files.extend(level_files)
+            next_level.extend(subdirs)
+        level = next_level
+    files.sort()
+    return files
+
+
+def _read_record(item):
+    """
+    Builds the manifest record of one file. Only the file header is read;
+    the audio itself is not decoded.
+    """
+    path, mtime_ns, size = item
+    record = np.zeros((), dtype=MANIFEST_DTYPE)
+    fields = parse_ravdess_name(path)
+    if fields is not None:
+        for name, value in zip(RAVDESS_FIELDS, fields):
+            record[name] = value
+    try:
+        info = sf.info(path)
+        record["sample_rate"] = info.samplerate
+        record["frames"] = info.frames
+        record["duration"] = info.frames / info.samplerate if info.samplerate else np.nan
+    except Exception as e:
+        print(f"Could not read the header of {os.path.abspath(path)}: {e}")
+        record["frames"] = -1
+        record["duration"] = np.nan
+    record["mtime_ns"] = mtime_ns
+    record["size"] = size
+    return record
+
+
+def load_manifest(manifest_dir=MANIFEST_DIR):
+    """
+    Loads a manifest written by build_manifest.
+
+    Returns:
+        (list, numpy.ndarray): File paths and their MANIFEST_DTYPE records, in
+        the same order. Both are empty if there is no (consistent) manifest.
+    """
+    records_path = os.path.join(manifest_dir, RECORDS_NAME)
+    paths_path = os.path.join(manifest_dir, PATHS_NAME)
+    if not (os.path.exists(records_path) and os.path.exists(paths_path)):
+        return [], np.zeros(0, dtype=MANIFEST_DTYPE)
+    records = np.load(records_path)
+    with open(paths_path, "r", encoding="utf-8") as f:
+        paths = f.read().splitlines()
+    if records.dtype != MANIFEST_DTYPE or len(records) != len(paths):
+        # Written by another version or interrupted between the two files.
+        print(f"Ignoring inconsistent manifest in {os.path.abspath(manifest_dir)}")
+        return [], np.zeros(0, dtype=MANIFEST_DTYPE)
+    return paths, records
+
+
+def save_manifest(paths, records, manifest_dir=MANIFEST_DIR):
+    """
+    Writes the manifest files atomically.
+    """
+    os.makedirs(manifest_dir, exist_ok=True)
+    records_path = os.path.join(manifest_dir, RECORDS_NAME)
+    paths_path = os.path.join(manifest_dir, PATHS_NAME)
+    with open(records_path + ".tmp", "wb") as f:
+        np.save(f, records)
+    with open(paths_path + ".tmp", "w", encoding="utf-8", newline="\n") as f:
+        f.write("".join(path + "\n" for path in paths))
+    os.replace(paths_path + ".tmp", paths_path)
+    os.replace(records_path + ".tmp", records_path)
+
+
+def build_manifest(audio_dir=AUDIO_DIR, manifest_dir=MANIFEST_DIR, workers=8, force=False):
+    """
+    Builds or incrementally updates the manifest of a corpus.
+
+    Files whose size and modification time match the existing manifest keep
+    their record; only new or changed files have their header read, and
+    files that disappeared are dropped.
+
+    Parameters:
+        audio_dir (str): Corpus root, searched recursively.
+        manifest_dir (str): Directory holding the manifest files.
+        workers (int): Threads used for directory scans and header reads.
+        force (bool): Re-read every header.
+
+    Returns:
+        (list, numpy.ndarray): File paths and their records, sorted by path.
+    """
+    start = time.perf_counter()
+    old_paths, old_records = ([], None) if force else load_manifest(manifest_dir)
+    old_rows = {path: row for row, path in enumerate(old_paths)}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files = scan_tree(audio_dir, executor)
+        records = np.zeros(len(files), dtype=MANIFEST_DTYPE)
+        changed = []
+        for row, (path, mtime_ns, size) in enumerate(files):
+            old_row = old_rows.get(path)
+            if (old_row is not None and old_records[old_row]["mtime_ns"] == mtime_ns
+                    and old_records[old_row]["size"] == size):
+                records[row] = old_records[old_row]
+            else:
+                changed.append(row)
+        for row, record in zip(changed, executor.map(_read_record, [files[row] for row in changed])):
+            records[row] = record
+
+    paths = [path for path, _, _ in files]
+    save_manifest(paths, records, manifest_dir)
+    removed = len(set(old_rows) - set(paths))
+    print(f"Manifest of {len(paths)} file(s) in {time.perf_counter() - start:.2f}s: "
+          f"{len(changed)} read, {len(paths) - len(changed)} unchanged, {removed} removed.")
+    return paths, records
+
+
+def emotion_labels(records):
+    """
+    Returns the emotion label of every record ("unknown" for other names).
+    """
+    # One slot per code up to the largest known one, plus a trailing
+    # "unknown" slot that every larger code is clamped to.
+    last = max(int(code) for code in EMOTION_MAPPING) + 1
+    labels = np.array(["unknown"] * (last + 1), dtype=object)
+    for code, label in EMOTION_MAPPING.items():
+        labels[int(code)] = label
+    return labels[np.minimum(records["emotion"], last)]
+
+
+def actor_split(records, test_actors):
+    """
+    Returns a boolean mask of the records spoken by `test_actors`, so train
+    and test sets never share a speaker.
+    """
+    return np.isin(records["actor"], np.asarray(test_actors, dtype=np.uint8))
+
+
+def duration_buckets(records, edges):
+    """
+    Returns the bucket index of every record for the duration `edges` in
+    seconds (bucket i holds edges[i-1] <= duration < edges[i]).
+    """
+    return np.digitize(records["duration"], edges)
+
+
+def write_label_csv(paths, records, csv_path):
+    """
+    Writes the manifest as a CSV with file and label first, as the training
+    notebooks expect, followed by the parsed fields and header info.
+
+    Like the original audio_data.csv, only .wav files with a RAVDESS-style
+    name are listed; files whose header could not be read are left out too.
+
+    Returns:
+        int: Number of rows written.
+    """
+    labels = emotion_labels(records)
+    tmp_path = csv_path + ".tmp"
+    written = 0
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "label", "actor", "intensity", "statement", "repetition", "duration",
+                         "sample_rate"])
+        for path, label, record in zip(paths, labels, records):
+            if not path.lower().endswith(".wav") or parse_ravdess_name(path) is None or record["frames"] < 0:
+                continue
+            writer.writerow([path, label, record["actor"], record["intensity"], record["statement"],
+                             record["repetition"], f"{record['duration']:.4f}", record["sample_rate"]])
+            written += 1
+    os.replace(tmp_path, csv_path)
+    if written < len(paths):
+        print(f"Left {len(paths) - written} file(s) out of {os.path.abspath(csv_path)}: "
+              f"not a RAVDESS-style .wav name, or the header could not be read.")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the manifest of a RAVDESS-style audio corpus.")
+    parser.add_argument("--audio-dir", default=AUDIO_DIR, help="Corpus root, searched recursively.")
+    parser.add_argument("--manifest-dir", default=MANIFEST_DIR, help="Directory holding the manifest files.")
+    parser.add_argument("--workers", type=int, default=8, help="Threads for directory scans and header reads.")
+    parser.add_argument("--force", action="store_true", help="Re-read every file header.")
+    parser.add_argument("--csv", default=None, help="Also write the manifest as a CSV (e.g. data/audio_data.csv).")
+    args = parser.parse_args()
+
+    paths, records = build_manifest(args.audio_dir, args.manifest_dir, workers=args.workers, force=args.force)
+    if args.csv:
+        write_label_csv(paths, records, args.csv)
+        print(f"CSV file created at: {os.path.abspath(args.csv)}")
+    if len(records):
+        print(f"Actors: {len(np.unique(records['actor'][records['actor'] > 0]))}, "
+              f"total duration: {np.nansum(records['duration']) / 3600:.2f} h")
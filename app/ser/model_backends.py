@@ -0,0 +1,223 @@
+import os
+import json
+import struct
+import zipfile
+import threading
+import numpy as np
+
+# Serving backend: "auto" picks it from the model file extension, any other
+# value selects the matching export next to SER_MODEL_PATH (see
+# resolve_model_path). The suffixes match the file names model_export writes.
+BACKEND = os.environ.get("SER_BACKEND", "auto")
+BACKEND_SUFFIXES = {"keras": ".h5", "tflite": ".tflite", "tflite-int8": "_int8.tflite",
+                    "tflite-int8-full": "_int8_full.tflite", "numpy": ".npz"}
+
+
+def _tflite_interpreter_class():
+    """
+    Returns the lightest available TFLite interpreter implementation.
+
+    The standalone LiteRT / tflite-runtime packages import in a fraction of
+    the time and memory of full TensorFlow, which is only used as a fallback.
+    """
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    """
+    Wraps a TFLite classifier behind the subset of the Keras model API the
+    serving code uses (predict, predict_on_batch and input_shape).
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Parameters:
+            model_path (str): Path to the .tflite file.
+            num_threads (int): Interpreter threads (default: library default).
+        """
+        Interpreter = _tflite_interpreter_class()
+        self._interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        # The interpreter holds per-invocation state, so calls are serialized.
+        self._lock = threading.Lock()
+        self.input_shape = (None, int(self._input["shape"][-1]))
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            if x.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input["index"], list(x.shape), strict=False)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_size = x.shape[0]
+            self._interpreter.set_tensor(self._input["index"], self._quantize(x))
+            self._interpreter.invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output["index"]))
+
+    def _quantize(self, x):
+        """
+        Converts float features to the input type of fully-integer models.
+        """
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return x
+        scale, zero_point = self._input["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, y):
+        """
+        Converts integer model outputs back to float probabilities.
+        """
+        if self._output["dtype"] == np.float32:
+            return y.copy()
+        scale, zero_point = self._output["quantization"]
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict(self, x, verbose=0):
+        return self.predict_on_batch(x)
+
+
+def _softmax(x):
+    x = x - x.max(axis=-1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=-1, keepdims=True)
+    return x
+
+
+def _relu(x):
+    return np.maximum(x, 0.0, out=x)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": _relu,
+    "tanh": np.tanh,
+    "sigmoid": _sigmoid,
+    "softmax": _softmax,
+}
+
+
+def _npz_memmap(model_path, name):
+    """
+    Memory-maps one array of an uncompressed .npz file (as np.savez writes
+    them) straight from the archive, or returns None if it is compressed.
+
+    Mapped weights live in the page cache, so every process serving the same
+    file shares one copy of them, including after a hot reload.
+    """
+    with zipfile.ZipFile(model_path) as archive:
+        info = archive.getinfo(name + ".npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(model_path, "rb") as f:
+        # The local file header is 30 bytes plus its own name and extra field.
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack("<HH", f.read(4))
+        f.seek(name_length + extra_length, os.SEEK_CUR)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject:
+        return None
+    return np.memmap(model_path, dtype=dtype, mode="r", shape=shape, offset=offset,
+                     order="F" if fortran_order else "C")
+
+
+class NumpyMLP:
+    """
+    Evaluates an exported dense classifier with plain NumPy matmuls.
+
+    The .npz file written by ser.model_export holds one kernel/bias pair per
+    layer plus a JSON spec with each layer's activation; batch normalisation
+    is already folded into the kernels. Predictions need no framework, no
+    per-call graph dispatch and no lock, so they are cheap for the small
+    MLP over 13 MFCCs.
+
+    With `mmap` the weights are mapped read-only from the file instead of
+    copied into each process (see _npz_memmap).
+    """
+
+    def __init__(self, model_path, mmap=True):
+        """
+        Parameters:
+            model_path (str): Path to the .npz export.
+            mmap (bool): Memory-map the weights when the file is uncompressed.
+        """
+        with np.load(model_path, allow_pickle=False) as data:
+            spec = json.loads(str(data["spec"]))
+            self.layers = []
+            for i, layer in enumerate(spec["layers"]):
+                if layer["activation"] not in ACTIVATIONS:
+                    raise ValueError(f"Unsupported activation in {model_path}: {layer['activation']}")
+                arrays = []
+                for name in (f"kernel_{i}", f"bias_{i}"):
+                    array = _npz_memmap(model_path, name) if mmap else None
+                    if array is None or array.dtype != np.float32 or not array.flags.c_contiguous:
+                        array = np.ascontiguousarray(data[name], dtype=np.float32)
+                    # A plain ndarray view, so results are not memmap instances.
+                    arrays.append(array.view(np.ndarray))
+                self.layers.append((arrays[0], arrays[1], ACTIVATIONS[layer["activation"]]))
+        self.input_shape = (None, self.layers[0][0].shape[0])
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = activation(x @ kernel + bias)
+        return x
+
+    def predict(self, x, verbose=0):
+        return self.predict_on_batch(x)
+
+
+def resolve_model_path(model_path, backend=BACKEND):
+    """
+    Returns the model file to serve for a backend. With "auto" the path is
+    used as given; otherwise its extension is swapped for the backend's
+    suffix, so SER_BACKEND=numpy serves model.npz and SER_BACKEND=tflite-int8
+    serves model_int8.tflite next to the configured model.h5.
+    """
+    if backend == "auto":
+        return model_path
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(f"Unknown SER_BACKEND {backend!r}, expected auto or one of {sorted(BACKEND_SUFFIXES)}")
+    return os.path.splitext(model_path)[0] + BACKEND_SUFFIXES[backend]
+
+
+def load_model_file(model_path):
+    """
+    Loads a classifier, choosing the backend from the file extension:
+    .tflite files use a TFLite interpreter, .npz exports are evaluated with
+    NumPy and anything else is loaded with tf.keras. TensorFlow is only
+    imported when it is actually needed.
+    """
+    extension = os.path.splitext(model_path)[1].lower()
+    if extension == ".tflite":
+        threads = os.environ.get("SER_TFLITE_THREADS")
+        return TFLiteModel(model_path, num_threads=int(threads) if threads else None)
+    if extension == ".npz":
+        return NumpyMLP(model_path, mmap=os.environ.get("SER_NUMPY_MMAP", "1") == "1")
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path)
@@ -0,0 +1,244 @@
+import os
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from ser.model_registry import MODEL_PATH, METADATA_PATH
+from ser.feature_store import ravdess_emotion
+
+# Default locations of the lightweight serving artifacts
+TFLITE_PATH = os.path.join("app", "ser", "models", "model.tflite")
+TFLITE_INT8_PATH = os.path.join("app", "ser", "models", "model_int8.tflite")
+TFLITE_INT8_FULL_PATH = os.path.join("app", "ser", "models", "model_int8_full.tflite")
+NUMPY_PATH = os.path.join("app", "ser", "models", "model.npz")
+FEATURES_CSV = "features.csv"
+
+# Layers that do nothing at inference time on (batch, features) inputs
+_PASSTHROUGH_LAYERS = {"InputLayer", "Dropout", "GaussianNoise", "GaussianDropout", "AlphaDropout", "Flatten"}
+
+
+def _atomic_write(output_path, write):
+    """
+    Writes a file through a temporary name and swaps it in, so a running
+    server's hot reload never sees a partial file.
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def load_features_csv(csv_path=FEATURES_CSV):
+    """
+    Reads a features CSV written by feature_extraction.
+
+    Returns:
+        (numpy.ndarray, list): (N, n_features) float32 features and the N
+        emotion labels parsed from the file names ("" when unknown).
+    """
+    with open(csv_path, "r", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        file_col = header.index("file") if "file" in header else None
+        features, labels = [], []
+        for row in reader:
+            if file_col is not None:
+                labels.append(ravdess_emotion(row.pop(file_col)))
+            else:
+                labels.append("")
+            features.append(row)
+    return np.array(features, dtype=np.float32), labels
+
+
+def _dense_layers(model):
+    """
+    Flattens a Keras MLP into [kernel, bias, activation] steps, folding
+    batch normalisation into the neighbouring dense kernels.
+    """
+    layers = []
+    pending = None  # (scale, shift) of a batch norm waiting for the next dense layer
+    for layer in model.layers:
+        kind = type(layer).__name__
+        weights = layer.get_weights()
+        if kind in _PASSTHROUGH_LAYERS:
+            continue
+        if kind == "Dense":
+            kernel = weights[0].astype(np.float64)
+            bias = weights[1].astype(np.float64) if len(weights) > 1 else np.zeros(kernel.shape[1])
+            if pending is not None:
+                scale, shift = pending
+                bias = shift @ kernel + bias
+                kernel = scale[:, None] * kernel
+                pending = None
+            layers.append([kernel, bias, layer.activation.__name__])
+        elif kind == "Activation":
+            if not layers or layers[-1][2] != "linear" or pending is not None:
+                raise ValueError(f"Cannot export activation layer {layer.name} after a non-linear step")
+            layers[-1][2] = layer.activation.__name__
+        elif kind == "BatchNormalization":
+            config = layer.get_config()
+            weights = list(weights)
+            gamma = weights.pop(0) if config.get("scale", True) else 1.0
+            beta = weights.pop(0) if config.get("center", True) else 0.0
+            mean, variance = weights
+            scale = gamma / np.sqrt(variance.astype(np.float64) + config["epsilon"])
+            shift = beta - mean * scale
+            if layers and layers[-1][2] == "linear" and pending is None:
+                layers[-1][0] = layers[-1][0] * scale
+                layers[-1][1] = layers[-1][1] * scale + shift
+            elif pending is None:
+                pending = (scale, shift)
+            else:
+                pending = (pending[0] * scale, pending[1] * scale + shift)
+        else:
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind} to NumPy")
+    if pending is not None:
+        scale, shift = pending
+        layers.append([np.diag(scale), shift, "linear"])
+    return layers
+
+
+def export_numpy(model_path=MODEL_PATH, output_path=NUMPY_PATH):
+    """
+    Exports the Keras MLP as NumPy arrays for the NumpyMLP backend.
+
+    Parameters:
+        model_path (str): Path to the Keras model (.h5).
+        output_path (str): Where the .npz file is written.
+
+    Returns:
+        str: The output path.
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    layers = _dense_layers(model)
+    arrays = {"spec": np.array(json.dumps({"layers": [{"activation": act} for _, _, act in layers]}))}
+    for i, (kernel, bias, _) in enumerate(layers):
+        arrays[f"kernel_{i}"] = kernel.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+    return _atomic_write(output_path, lambda f: np.savez(f, **arrays))
+
+
+def export_tflite(model_path=MODEL_PATH, output_path=TFLITE_PATH, quantize=None, features_csv=FEATURES_CSV,
+                  calibration_rows=500):
+    """
+    Converts the Keras model into a TFLite flatbuffer for serving.
+
+    The exported model is served with a TFLite interpreter, so a serving
+    process never has to import full TensorFlow.
+
+    Parameters:
+        model_path (str): Path to the Keras model (.h5).
+        output_path (str): Where the .tflite file is written.
+        quantize (str): None for a float model, "dynamic" for int8 weights
+                        with float activations, or "full" to also quantize
+                        activations, calibrated on rows of `features_csv`.
+                        Inputs and outputs stay float32 either way, so the
+                        serving code is unchanged.
+        features_csv (str): Calibration data for "full" quantization.
+        calibration_rows (int): Number of calibration rows to use.
+
+    Returns:
+        str: The output path.
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize not in (None, "dynamic", "full"):
+        raise ValueError(f"Unknown quantization {quantize!r}, expected None, 'dynamic' or 'full'")
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "full":
+        features, _ = load_features_csv(features_csv)
+        rows = np.random.default_rng(0).permutation(len(features))[:calibration_rows]
+
+        def representative_dataset():
+            for row in rows:
+                yield [features[row:row + 1]]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    tflite_model = converter.convert()
+    return _atomic_write(output_path, lambda f: f.write(tflite_model))
+
+
+def check_parity(reference_path, candidate_path, features_csv=FEATURES_CSV, metadata_path=METADATA_PATH,
+                 batch_size=256):
+    """
+    Compares an exported model against the original on a features CSV.
+
+    Parameters:
+        reference_path (str): The original model (usually model.h5).
+        candidate_path (str): The exported model (.npz or .tflite).
+        features_csv (str): Features to evaluate on.
+        metadata_path (str): Label mapping, used to score accuracy against
+                             the emotions in the RAVDESS file names.
+        batch_size (int): Rows per predict call.
+
+    Returns:
+        dict: Agreement of the predicted classes, the largest probability
+        difference, accuracy of both models and time per row.
+    """
+    from ser.model_backends import load_model_file
+
+    features, labels = load_features_csv(features_csv)
+    with open(metadata_path, "r") as f:
+        metadata = json.load(f)
+    label_index = {label: int(index) for index, label in metadata.items()}
+    truth = np.array([label_index.get(label, -1) for label in labels])
+    known = truth >= 0
+
+    report = {"rows": int(len(features))}
+    predictions = {}
+    for name, path in (("reference", reference_path), ("candidate", candidate_path)):
+        model = load_model_file(path)
+        model.predict_on_batch(features[:1])
+        start = time.perf_counter()
+        probabilities = np.concatenate([model.predict_on_batch(features[i:i + batch_size])
+                                        for i in range(0, len(features), batch_size)])
+        report[f"{name}_us_per_row"] = (time.perf_counter() - start) / max(len(features), 1) * 1e6
+        predictions[name] = np.asarray(probabilities, dtype=np.float64)
+        if known.any():
+            report[f"{name}_accuracy"] = float((predictions[name].argmax(axis=1)[known] == truth[known]).mean())
+
+    reference, candidate = predictions["reference"], predictions["candidate"]
+    report["agreement"] = float((reference.argmax(axis=1) == candidate.argmax(axis=1)).mean())
+    report["max_abs_diff"] = float(np.abs(reference - candidate).max())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the SER model to a lightweight serving format.")
+    parser.add_argument("--format", choices=["tflite", "tflite-int8", "tflite-int8-full", "numpy"],
+                        default="tflite", help="Export format.")
+    parser.add_argument("--model", default=MODEL_PATH, help="Path to the Keras model.")
+    parser.add_argument("--output", default=None, help="Path of the exported file (default depends on --format).")
+    parser.add_argument("--features", default=FEATURES_CSV,
+                        help="Features CSV used for int8 calibration and the parity check.")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the export with the original model on --features.")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="Fail the parity check below this fraction of matching predictions.")
+    args = parser.parse_args()
+
+    default_outputs = {"tflite": TFLITE_PATH, "tflite-int8": TFLITE_INT8_PATH,
+                       "tflite-int8-full": TFLITE_INT8_FULL_PATH, "numpy": NUMPY_PATH}
+    quantization = {"tflite": None, "tflite-int8": "dynamic", "tflite-int8-full": "full"}
+    output_path = args.output or default_outputs[args.format]
+    if args.format == "numpy":
+        export_numpy(args.model, output_path)
+    else:
+        export_tflite(args.model, output_path, quantize=quantization[args.format], features_csv=args.features)
+    print(f"Model exported to: {os.path.abspath(output_path)} ({os.path.getsize(output_path)} bytes)")
+
+    if args.check:
+        report = check_parity(args.model, output_path, args.features)
+        for key, value in report.items():
+            print(f"{key}: {value:.6g}" if isinstance(value, float) else f"{key}: {value}")
+        if report["agreement"] < args.min_agreement:
+            raise SystemExit(f"Parity check failed: agreement {report['agreement']:.4f} < {args.min_agreement}")
@@ -0,0 +1,192 @@
+import os
+import json
+import hashlib
+import threading
+import time
+import numpy as np
+from ser.model_backends import load_model_file, resolve_model_path
+from utils.metrics import Counter, Gauge
+
+# Default locations of the trained model and its label mapping; override them
+# with SER_MODEL_PATH / SER_METADATA_PATH.
+MODEL_PATH = os.environ.get("SER_MODEL_PATH", os.path.join("app", "ser", "models", "model.h5"))
+METADATA_PATH = os.environ.get("SER_METADATA_PATH", os.path.join("app", "ser", "models", "model_metadata.json"))
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the SER model and its label metadata.
+
+    The model is loaded once, warmed up with a dummy MFCC vector and then
+    shared by every request thread. Readers always get a consistent
+    (model, metadata) snapshot; a reload builds the new model off to the side
+    and swaps the reference in a single step, so in-flight predictions keep
+    using the old model until they finish.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, metadata_path=METADATA_PATH, n_mfcc=13):
+        """
+        Parameters:
+            model_path (str): Path to the model file (.h5 Keras model, .tflite
+                              or .npz export). With SER_BACKEND set, the
+                              export for that backend next to it is used.
+            metadata_path (str): Path to the JSON label mapping.
+            n_mfcc (int): Feature size used for the warm-up call when the
+                          model does not declare its input shape.
+        """
+        self.model_path = resolve_model_path(model_path)
+        self.metadata_path = metadata_path
+        self.n_mfcc = n_mfcc
+        self.version = 0
+        self.model_id = None
+        self.load_seconds = None
+        self._snapshot = None
+        self._signature = None
+        self._lock = threading.RLock()
+        self._watcher = None
+        self._stop_event = threading.Event()
+        self._listeners = []
+
+    def add_reload_listener(self, callback):
+        """
+        Registers callback(registry) to run after every successful (re)load,
+        e.g. to drop results computed with the previous model.
+        """
+        self._listeners.append(callback)
+
+    def _file_signature(self):
+        """
+        Returns the (mtime, size) of the model and metadata files, used to
+        detect that new weights were rolled out on disk.
+        """
+        signature = []
+        for path in (self.model_path, self.metadata_path):
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _warm_up(self, model):
+        """
+        Runs one prediction on a zero vector so the first real request does
+        not pay for graph tracing and kernel initialisation.
+        """
+        input_shape = getattr(model, "input_shape", None)
+        n_features = input_shape[-1] if input_shape and input_shape[-1] else self.n_mfcc
+        dummy = np.zeros((1, n_features), dtype=np.float32)
+        model.predict(dummy, verbose=0)
+
+    def load(self):
+        """
+        Loads (or reloads) the model and metadata from disk and publishes them.
+
+        Returns:
+            (model, metadata): The freshly loaded snapshot.
+        """
+        with self._lock:
+            signature = self._file_signature()
+            start = time.perf_counter()
+            model = load_model_file(self.model_path)
+            with open(self.metadata_path, "r") as f:
+                metadata = json.load(f)
+            self._warm_up(model)
+            self.load_seconds = time.perf_counter() - start
+
+            self._snapshot = (model, metadata)
+            self._signature = signature
+            self.version += 1
+            # Same in every process serving the same files, unlike `version`.
+            self.model_id = hashlib.blake2b(repr((os.path.abspath(self.model_path), signature)).encode(),
+                                            digest_size=8).hexdigest()
+            MODEL_LOADS_TOTAL.inc()
+            print(f"Loaded SER model v{self.version} from {os.path.abspath(self.model_path)} "
+                  f"in {self.load_seconds:.2f}s")
+            for callback in self._listeners:
+                callback(self)
+            return self._snapshot
+
+    def get(self):
+        """
+        Returns the current (model, metadata) snapshot, loading it on first use.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    return self.load()
+                snapshot = self._snapshot
+        return snapshot
+
+    def reload_if_changed(self):
+        """
+        Reloads the model if its files changed on disk since the last load.
+
+        Returns:
+            bool: True if a reload happened.
+        """
+        if self._snapshot is None:
+            # Nothing loaded yet; the first get() will pick up the files.
+            return False
+        try:
+            signature = self._file_signature()
+        except OSError as e:
+            # The file may be mid-copy during a rollout; try again next tick.
+            print(f"Skipping model reload check: {e}")
+            return False
+        if signature == self._signature:
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            # Keep serving the previous model if the new one is broken.
+            MODEL_LOAD_FAILURES_TOTAL.inc()
+            print(f"Failed to reload SER model, keeping v{self.version}: {e}")
+            return False
+        return True
+
+    def start_watcher(self, interval=5.0):
+        """
+        Starts a daemon thread that polls the model files every `interval`
+        seconds and hot-reloads them when they change.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def watch():
+            while not self._stop_event.wait(interval):
+                self.reload_if_changed()
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=watch, name="ser-model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """
+        Stops the background reload thread, if running.
+        """
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+MODEL_LOADS_TOTAL = Counter("ser_model_loads_total", "Successful SER model (re)loads.")
+MODEL_LOAD_FAILURES_TOTAL = Counter("ser_model_load_failures_total", "Failed SER model hot reloads.")
+MODEL_LOAD_SECONDS = Gauge("ser_model_load_seconds", "Duration of the last SER model load, including warm-up.",
+                           callback=lambda: _default_registry.load_seconds if _default_registry else None)
+MODEL_VERSION = Gauge("ser_model_version", "Number of times the SER model was loaded in this process.",
+                      callback=lambda: _default_registry.version if _default_registry else None)
+
+
+def get_registry():
+    """
+    Returns the process-wide ModelRegistry, creating it on first use.
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry()
+    return _default_registry
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.metrics import Counter, Gauge
+
+CACHE_HITS_TOTAL = Counter("ser_response_cache_hits_total", "Predictions answered from the response cache.")
+CACHE_MISSES_TOTAL = Counter("ser_response_cache_misses_total", "Predictions not found in the response cache.")
+
+
+def make_key(data, model_id, **params):
+    """
+    Returns the cache key of an upload: a BLAKE2b digest of its bytes, the
+    identity of the model that scores it and the feature parameters.
+    """
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(repr((model_id, sorted(params.items()))).encode())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of prediction results with a time-to-live.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300.0):
+        """
+        Parameters:
+            max_entries (int): Entries kept before the least recently used
+                               one is evicted.
+            ttl_seconds (float): Age after which an entry is ignored.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached value for `key`, or None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                CACHE_HITS_TOTAL.inc()
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+        CACHE_MISSES_TOTAL.inc()
+        return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResponseCache:
+    """
+    Response cache in a local SQLite file, shared by every worker process on
+    the host, so a clip scored by one worker is a hit in all of them.
+
+    Values are stored as JSON. Entries expire after `ttl_seconds`; every
+    100 writes, expired entries are deleted and the table is cut back to the
+    `max_entries` most recently used ones.
+    """
+
+    def __init__(self, db_path, max_entries=10000, ttl_seconds=300.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                               "expires REAL NOT NULL, accessed REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        connection = self._connect()
+        row = connection.execute("SELECT value FROM responses WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        if row is None:
+            CACHE_MISSES_TOTAL.inc()
+            return None
+        connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        CACHE_HITS_TOTAL.inc()
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        connection = self._connect()
+        connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                           (key, json.dumps(value), now + self.ttl_seconds, now))
+        self._puts += 1
+        if self._puts % 100 == 0:
+            # Prune in bulk now and then rather than on every write.
+            connection.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                               "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM responses")
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def cache_from_env():
+    """
+    Returns the response cache configured by SER_RESPONSE_CACHE_SIZE (0
+    disables it), SER_RESPONSE_CACHE_TTL and SER_RESPONSE_CACHE_DB (a SQLite
+    file shared by all workers), or None.
+    """
+    global _default_cache
+    max_entries = int(os.environ.get("SER_RESPONSE_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    ttl_seconds = float(os.environ.get("SER_RESPONSE_CACHE_TTL", "300"))
+    db_path = os.environ.get("SER_RESPONSE_CACHE_DB")
+    if db_path:
+        _default_cache = SQLiteResponseCache(db_path, max_entries, ttl_seconds)
+    else:
+        _default_cache = ResponseCache(max_entries, ttl_seconds)
+    return _default_cache
+
+
+_default_cache = None
+
+CACHE_ENTRIES = Gauge("ser_response_cache_entries", "Entries in the response cache.",
+                      callback=lambda: len(_default_cache) if _default_cache is not None else None)
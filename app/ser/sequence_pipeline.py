@@ -0,0 +1,257 @@
+"""
+Per-frame MFCC sequences for training sequence models.
+
+`build` extracts the MFCC frames of every clip into a SequenceStore on disk.
+sequence_dataset() streams them back as a tf.data pipeline: rows are read
+from the memory-mapped store in parallel map calls, batched by length
+bucket so each batch is only padded to its own longest clip, and
+prefetched while the model trains. Nothing has to fit in RAM.
+
+Usage (from the project root):
+    PYTHONPATH=app python -m ser.sequence_pipeline build --audio-dir data/processed_audio
+    PYTHONPATH=app python -m ser.sequence_pipeline train --epochs 20
+"""
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ser.feature_engine import load_audio, mfcc_frames_list
+from ser.feature_extraction import find_audio_files, BATCH_SIZE
+from ser.feature_store import SequenceStore, source_version, EMOTION_MAPPING, SEQUENCE_STORE_DIR
+
+# Class order of the example model, matching model_metadata.json.
+LABELS = sorted(set(EMOTION_MAPPING.values()))
+SEQUENCE_MODEL_PATH = os.path.join("app", "ser", "models", "sequence_model.keras")
+
+
+def _extract_frames(file_paths, n_mfcc, sr):
+    """
+    Worker entry point: returns the (T, n_mfcc) MFCC frames of a chunk of
+    files, clips of similar length computed in shared vectorized passes.
+
+    Returns:
+        list: One (file path, frames or None, error message or None) tuple
+              per file, in input order.
+    """
+    results = {}
+    loaded, waveforms = [], []
+    for file_path in file_paths:
+        try:
+            waveforms.append(load_audio(file_path, sr=sr))
+            loaded.append(file_path)
+        except Exception as e:
+            results[file_path] = (file_path, None, str(e) or repr(e))
+    if loaded:
+        for file_path, mfcc in zip(loaded, mfcc_frames_list(waveforms, sr=sr, n_mfcc=n_mfcc)):
+            results[file_path] = (file_path, np.ascontiguousarray(mfcc.T), None)
+    return [results[file_path] for file_path in file_paths]
+
+
+def build_sequence_store(audio_dir, store_dir=SEQUENCE_STORE_DIR, n_mfcc=13, sr=22050, workers=None):
+    """
+    Appends the MFCC frames of every clip under `audio_dir` that is not in
+    the store yet. Each worker chunk is committed as it finishes.
+
+    Clips whose size or modification time changed since their frames were
+    stored are removed from the store first and extracted again.
+
+    Returns:
+        int: Number of sequences added.
+    """
+    store = SequenceStore(store_dir)
+    versions = {}
+    for file_path in find_audio_files(audio_dir):
+        try:
+            versions[file_path] = source_version(file_path)
+        except OSError as e:
+            print(f"Failed to process {os.path.abspath(file_path)}: {e}")
+    if store.exists():
+        stored_files = store.index()[0]
+        stale = [row for row, (file_path, source) in enumerate(zip(stored_files, store.sources()))
+                 if file_path in versions and versions[file_path] != source]
+        if stale:
+            print(f"Re-extracting {len(stale)} changed file(s).")
+            store.remove(stale)
+        known = set(store.index()[0])
+    else:
+        known = set()
+    # Chunks of files of similar size pad less.
+    files = sorted((file_path for file_path in versions if file_path not in known),
+                   key=lambda file_path: int(versions[file_path].split(":")[0]))
+    chunks = [files[i:i + BATCH_SIZE] for i in range(0, len(files), BATCH_SIZE)]
+    workers = workers or os.cpu_count() or 1
+    added = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_extract_frames, chunks, [n_mfcc] * len(chunks), [sr] * len(chunks)):
+            done = [(file_path, frames) for file_path, frames, error in results if error is None]
+            for file_path, _, error in results:
+                if error is not None:
+                    print(f"Failed to process {os.path.abspath(file_path)}: {error}")
+            if done:
+                store.append([frames for _, frames in done], [file_path for file_path, _ in done],
+                             sources=[versions[file_path] for file_path, _ in done])
+                added += len(done)
+    print(f"Added {added} sequence(s) in {time.perf_counter() - start:.1f}s; {len(store)} in the store.")
+    return added
+
+
+def frame_statistics(store_dir=SEQUENCE_STORE_DIR, rows=None, max_frames=None):
+    """
+    Returns the per-coefficient mean and standard deviation over the frames
+    the model sees of the given sequences, i.e. after the max_frames crop of
+    sequence_dataset().
+
+    Parameters:
+        store_dir (str): SequenceStore directory.
+        rows (array-like): Sequence rows, e.g. the training rows (default: all).
+        max_frames (int): Longer sequences are center-cropped to this length.
+    """
+    store = SequenceStore(store_dir)
+    _, _, offsets, lengths = store.index()
+    frames = store.matrix()
+    rows = np.arange(len(offsets)) if rows is None else np.asarray(rows, dtype=np.int64)
+    total = np.zeros(frames.shape[1])
+    total_sq = np.zeros(frames.shape[1])
+    count = 0
+    for row in rows:
+        length = min(lengths[row], max_frames) if max_frames else lengths[row]
+        start = offsets[row] + (lengths[row] - length) // 2
+        sequence = np.asarray(frames[start:start + length], dtype=np.float64)
+        total += sequence.sum(axis=0)
+        total_sq += (sequence ** 2).sum(axis=0)
+        count += length
+    count = max(count, 1)
+    mean = total / count
+    return mean.astype(np.float32), np.sqrt(np.maximum(total_sq / count - mean ** 2, 1e-12)).astype(np.float32)
+
+
+def bucket_boundaries(lengths, n_buckets=8):
+    """
+    Returns length bucket boundaries at the quantiles of `lengths`, so each
+    bucket holds about the same number of sequences.
+    """
+    if len(lengths) == 0:
+        return []
+    quantiles = np.quantile(lengths, np.linspace(0, 1, n_buckets + 1)[1:-1])
+    return sorted(set(int(q) + 1 for q in quantiles))
+
+
+def sequence_dataset(store_dir=SEQUENCE_STORE_DIR, rows=None, batch_size=32, n_buckets=8, max_frames=None,
+                     shuffle=True, seed=0, normalization=None):
+    """
+    Returns a tf.data.Dataset of (padded frames, label id) batches read
+    from a SequenceStore.
+
+    Parameters:
+        store_dir (str): SequenceStore directory.
+        rows (array-like): Sequence rows to use (default: every labelled row).
+        batch_size (int): Sequences per batch.
+        n_buckets (int): Number of length buckets.
+        max_frames (int): Longer sequences are center-cropped to this length.
+        shuffle (bool): Reshuffle the rows every epoch.
+        seed (int): Shuffle seed.
+        normalization (tuple): Per-coefficient (mean, std) applied to every
+                               frame before padding, e.g. from frame_statistics.
+
+    Returns:
+        tf.data.Dataset: Batches of shape (B, T, n_mfcc) and (B,), where T is
+        the longest sequence of the batch.
+    """
+    import tensorflow as tf
+
+    store = SequenceStore(store_dir)
+    _, labels, offsets, store_lengths = store.index()
+    frames = store.matrix()
+    label_ids = np.array([LABELS.index(label) if label in LABELS else -1 for label in labels], dtype=np.int64)
+    if rows is None:
+        rows = np.flatnonzero(label_ids >= 0)
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = np.minimum(store_lengths, max_frames) if max_frames else store_lengths
+    # Center crops start this many frames into their sequence.
+    offsets = offsets + (store_lengths - lengths) // 2
+    mean, std = normalization if normalization is not None else (0.0, 1.0)
+
+    def read(row):
+        # Runs in tf.data's parallel map threads; the memmap only pages in
+        # the frames of this sequence.
+        start = offsets[row]
+        return ((frames[start:start + lengths[row]] - mean) / std).astype(np.float32)
+
+    def load(row):
+        sequence = tf.numpy_function(read, [row], tf.float32)
+        sequence.set_shape([None, frames.shape[1]])
+        return sequence, tf.gather(label_ids, row)
+
+    dataset = tf.data.Dataset.from_tensor_slices(rows)
+    if shuffle:
+        dataset = dataset.shuffle(len(rows), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE)
+    boundaries = bucket_boundaries(lengths[rows], n_buckets)
+    dataset = dataset.bucket_by_sequence_length(
+        element_length_func=lambda sequence, label: tf.shape(sequence)[0],
+        bucket_boundaries=boundaries,
+        bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
+    )
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def train_example(store_dir=SEQUENCE_STORE_DIR, output_path=SEQUENCE_MODEL_PATH, epochs=20, batch_size=32,
+                  max_frames=None, validation_fraction=0.1, seed=0):
+    """
+    Trains a small masked GRU classifier on the sequence store, as a
+    starting point for sequence models.
+
+    Returns:
+        The trained Keras model.
+    """
+    import tensorflow as tf
+
+    store = SequenceStore(store_dir)
+    _, labels, _, _ = store.index()
+    rows = np.array([row for row, label in enumerate(labels) if label in LABELS])
+    rows = np.random.default_rng(seed).permutation(rows)
+    n_validation = int(len(rows) * validation_fraction)
+    # Validation rows stay out of the statistics.
+    normalization = frame_statistics(store_dir, rows[n_validation:], max_frames)
+    train = sequence_dataset(store_dir, rows[n_validation:], batch_size, max_frames=max_frames, seed=seed,
+                             normalization=normalization)
+    validation = sequence_dataset(store_dir, rows[:n_validation], batch_size, max_frames=max_frames,
+                                  shuffle=False, normalization=normalization) if n_validation else None
+
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(None, store.meta()["n_features"])),
+        # Batches are zero-padded to their longest sequence; skip those frames.
+        tf.keras.layers.Masking(mask_value=0.0),
+        tf.keras.layers.GRU(64),
+        tf.keras.layers.Dropout(0.3),
+        tf.keras.layers.Dense(len(LABELS), activation="softmax"),
+    ])
+    model.compile(optimizer="adam", loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    model.fit(train, validation_data=validation, epochs=epochs)
+    model.save(output_path)
+    print(f"Sequence model saved to: {os.path.abspath(output_path)}")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame MFCC sequences for sequence model training.")
+    parser.add_argument("--store-dir", default=SEQUENCE_STORE_DIR, help="Sequence store directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Extract MFCC frames into the sequence store.")
+    build_parser.add_argument("--audio-dir", default=os.path.join("data", "processed_audio"),
+                              help="Directory of (preprocessed) audio files.")
+    build_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    train_parser = subparsers.add_parser("train", help="Train the example sequence model.")
+    train_parser.add_argument("--epochs", type=int, default=20)
+    train_parser.add_argument("--batch-size", type=int, default=32)
+    train_parser.add_argument("--max-frames", type=int, default=None, help="Center-crop longer sequences.")
+    train_parser.add_argument("--output", default=SEQUENCE_MODEL_PATH, help="Where the model is saved.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_sequence_store(args.audio_dir, args.store_dir, workers=args.workers)
+    else:
+        train_example(args.store_dir, args.output, epochs=args.epochs, batch_size=args.batch_size,
+                      max_frames=args.max_frames)
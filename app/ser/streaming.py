@@ -0,0 +1,140 @@
+from collections import deque
+import numpy as np
+import soxr
+from ser.feature_engine import N_FFT, HOP_LENGTH, mfcc_frames_running
+
+
+class StreamingEmotionRecognizer:
+    """
+    Incremental emotion recognition over an unbounded audio stream.
+
+    Audio is pushed in arbitrary-sized chunks. Only the samples of the last,
+    still incomplete analysis frame are buffered; every complete frame is
+    turned into MFCCs right away and folded into running per-window sums.
+    Every `emit_every` seconds a prediction is made from the mean MFCC over
+    the last `context_seconds` of audio, so memory and per-prediction cost
+    stay constant however long the session runs.
+
+    The dB floor of the MFCCs follows the loudest frame of the session so
+    far, so the features do not depend on how the audio was split into
+    chunks.
+    """
+
+    def __init__(self, predict_fn, input_sr=22050, sr=22050, n_mfcc=13,
+                 emit_every=2.0, context_seconds=4.0):
+        """
+        Parameters:
+            predict_fn (callable): Maps one averaged MFCC vector to a label.
+            input_sr (int): Sample rate of the pushed audio.
+            sr (int): Sample rate the model was trained at.
+            n_mfcc (int): Number of MFCC coefficients.
+            emit_every (float): Seconds of audio between predictions.
+            context_seconds (float): Seconds of audio each prediction covers.
+        """
+        self.predict_fn = predict_fn
+        self.sr = sr
+        self.n_mfcc = n_mfcc
+        self.frames_per_window = max(1, int(round(emit_every * sr / HOP_LENGTH)))
+        context_windows = max(1, int(round(context_seconds / emit_every)))
+        self._resampler = soxr.ResampleStream(input_sr, sr, 1, dtype="float32") if input_sr != sr else None
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._peak = -np.inf
+        self._window_sum = np.zeros(n_mfcc, dtype=np.float64)
+        self._window_frames = 0
+        self._windows = deque(maxlen=context_windows)
+        self.frames_processed = 0
+
+    def push(self, audio, final=False):
+        """
+        Feeds a chunk of mono float32 audio.
+
+        Parameters:
+            audio (numpy.ndarray): Samples at `input_sr`.
+            final (bool): True for the last chunk of the stream.
+
+        Returns:
+            list: Predictions (dicts) emitted while consuming this chunk.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if self._resampler is not None:
+            audio = self._resampler.resample_chunk(audio, last=final)
+        if audio.size:
+            self._buffer = np.concatenate([self._buffer, audio])
+
+        predictions = []
+        n_frames = 1 + (self._buffer.size - N_FFT) // HOP_LENGTH if self._buffer.size >= N_FFT else 0
+        if n_frames > 0:
+            used = (n_frames - 1) * HOP_LENGTH + N_FFT
+            mfccs, self._peak = mfcc_frames_running(self._buffer[:used], sr=self.sr, n_mfcc=self.n_mfcc,
+                                                    peak=self._peak)
+            # Keep only the overlap the next frame still needs.
+            self._buffer = self._buffer[n_frames * HOP_LENGTH:].copy()
+            predictions.extend(self._accumulate(mfccs))
+
+        if final and self._window_frames:
+            predictions.append(self._emit())
+        return predictions
+
+    def _accumulate(self, mfccs):
+        """
+        Adds MFCC frames to the current window, emitting a prediction each
+        time the window fills up.
+        """
+        predictions = []
+        start = 0
+        total = mfccs.shape[1]
+        while start < total:
+            take = min(self.frames_per_window - self._window_frames, total - start)
+            self._window_sum += mfccs[:, start:start + take].sum(axis=1)
+            self._window_frames += take
+            self.frames_processed += take
+            start += take
+            if self._window_frames == self.frames_per_window:
+                predictions.append(self._emit())
+        return predictions
+
+    def _emit(self):
+        """
+        Closes the current window and predicts over the rolling context.
+        """
+        self._windows.append((self._window_sum, self._window_frames))
+        self._window_sum = np.zeros(self.n_mfcc, dtype=np.float64)
+        self._window_frames = 0
+
+        total = sum(window_sum for window_sum, _ in self._windows)
+        frames = sum(count for _, count in self._windows)
+        features = (total / frames).astype(np.float32)
+        return {
+            "time": self.frames_processed * HOP_LENGTH / self.sr,
+            "emotion": self.predict_fn(features),
+            "frames": int(frames),
+        }
+
+
+def pcm_chunks_to_float(chunks, sample_format="pcm16"):
+    """
+    Converts a stream of raw byte chunks into float32 sample arrays.
+
+    Chunk boundaries do not need to line up with sample boundaries; a split
+    sample is carried over to the next chunk.
+
+    Parameters:
+        chunks (iterable of bytes): Raw little-endian mono samples.
+        sample_format (str): "pcm16" (int16) or "f32" (float32).
+
+    Yields:
+        numpy.ndarray: float32 samples in [-1, 1].
+    """
+    dtype = {"pcm16": np.dtype("<i2"), "f32": np.dtype("<f4")}[sample_format]
+    leftover = b""
+    for chunk in chunks:
+        data = leftover + chunk
+        usable = len(data) - len(data) % dtype.itemsize
+        leftover = data[usable:]
+        if not usable:
+            continue
+        samples = np.frombuffer(data[:usable], dtype=dtype)
+        if sample_format == "pcm16":
+            yield samples.astype(np.float32) / 32768.0
+        else:
+            yield samples.astype(np.float32)
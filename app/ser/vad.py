@@ -0,0 +1,137 @@
+"""
+Energy-based voice activity detection, shared by preprocessing, feature
+extraction and serving.
+
+Frames are the same centred N_FFT / HOP_LENGTH frames the MFCCs are computed
+on, so a speech mask selects MFCC frames directly and the silent ones are
+never transformed. Frame energies come from a running sum of squares, one
+cheap pass over the samples.
+"""
+import os
+import numpy as np
+from ser.feature_engine import N_FFT, HOP_LENGTH, check_audio, mfcc_at_frames
+
+# Frames quieter than this many dB below the clip's loudest frame are silence.
+TOP_DB = float(os.environ.get("SER_VAD_TOP_DB", "40"))
+# Pauses shorter than this are kept as part of the speech around them, and
+# speech shorter than this is dropped as a click or breath.
+MIN_SILENCE_SECONDS = float(os.environ.get("SER_VAD_MIN_SILENCE_S", "0.3"))
+MIN_SPEECH_SECONDS = float(os.environ.get("SER_VAD_MIN_SPEECH_S", "0.1"))
+
+
+def frame_db(audio, frame_length=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Returns the energy of every centred frame in dB relative to the loudest
+    one (which is 0 dB), like librosa.power_to_db(rms ** 2, ref=np.max).
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    n_frames = 1 + len(audio) // hop_length
+    padded = np.pad(audio, frame_length // 2)
+    if frame_length % hop_length == 0:
+        # Each frame spans whole hops: sum the squares per hop once, then add
+        # up the hops of every frame.
+        hops_per_frame = frame_length // hop_length
+        n_hops = n_frames + hops_per_frame - 1
+        blocks = np.zeros(n_hops * hop_length, dtype=np.float32)
+        blocks[:min(len(padded), len(blocks))] = padded[:len(blocks)]
+        block_power = np.einsum("ij,ij->i", *(blocks.reshape(n_hops, hop_length),) * 2).astype(np.float64)
+        cumulative = np.concatenate([[0.0], np.cumsum(block_power)])
+        power = (cumulative[hops_per_frame:] - cumulative[:-hops_per_frame]) / frame_length
+    else:
+        # Sum of squares over each frame as a difference of one running sum.
+        cumulative = np.concatenate([[0.0], np.cumsum(padded.astype(np.float64) ** 2)])
+        starts = np.arange(n_frames) * hop_length
+        power = (cumulative[starts + frame_length] - cumulative[starts]) / frame_length
+    db = 10.0 * np.log10(np.maximum(power, 1e-10))
+    return db - max(db.max(), -100.0)
+
+
+def _runs(mask):
+    """
+    Returns the (start, end) frame indices of the runs of True in `mask`.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+
+def speech_segments(audio, sr=22050, top_db=None, min_silence_seconds=None, min_speech_seconds=None):
+    """
+    Finds the speech segments of a waveform.
+
+    Parameters:
+        audio (numpy.ndarray): 1D waveform.
+        sr (int): Its sample rate.
+        top_db (float): Silence threshold below the loudest frame
+                        (default: SER_VAD_TOP_DB).
+        min_silence_seconds (float): Shorter pauses are bridged.
+        min_speech_seconds (float): Shorter speech runs are dropped.
+
+    Returns:
+        (numpy.ndarray, int): (S, 2) array of [start, end) frame indices of
+        the segments, and the total number of frames.
+    """
+    top_db = TOP_DB if top_db is None else top_db
+    min_silence = MIN_SILENCE_SECONDS if min_silence_seconds is None else min_silence_seconds
+    min_speech = MIN_SPEECH_SECONDS if min_speech_seconds is None else min_speech_seconds
+    db = frame_db(audio)
+    segments = _runs(db > -top_db)
+    if len(segments) > 1:
+        # Bridge pauses shorter than min_silence by merging their neighbours.
+        gaps = segments[1:, 0] - segments[:-1, 1]
+        keep = np.concatenate([[True], gaps * HOP_LENGTH >= min_silence * sr])
+        group = np.cumsum(keep) - 1
+        ends = np.zeros(group[-1] + 1, dtype=segments.dtype)
+        np.maximum.at(ends, group, segments[:, 1])
+        segments = np.stack([segments[keep, 0], ends], axis=1)
+    lengths = segments[:, 1] - segments[:, 0]
+    return segments[lengths * HOP_LENGTH >= min_speech * sr], len(db)
+
+
+def trim(audio, top_db=60, frame_length=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Trims leading and trailing silence; same result as librosa.effects.trim.
+
+    Returns:
+        numpy.ndarray: The trimmed waveform.
+    """
+    non_silent = np.flatnonzero(frame_db(audio, frame_length, hop_length) > -top_db)
+    if non_silent.size == 0:
+        return audio[:0]
+    start = non_silent[0] * hop_length
+    end = min(len(audio), (non_silent[-1] + 1) * hop_length)
+    return audio[start:end]
+
+
+def speech_features(audio, sr=22050, n_mfcc=13):
+    """
+    Computes MFCCs for the speech frames of a waveform only and averages
+    them per segment and over the whole clip.
+
+    A clip without detected speech is treated as one segment, so it is
+    still scored.
+
+    Returns:
+        dict: "segments" (S, 2) [start, end) times in seconds,
+        "segment_features" (S, n_mfcc) mean MFCC per segment,
+        "features" the mean MFCC over all speech frames, "frames" the
+        total frame count and "skipped_frames" the frames left out.
+
+    Raises:
+        ValueError: If `audio` is empty.
+    """
+    check_audio(audio)
+    segments, n_frames = speech_segments(audio, sr=sr)
+    if len(segments) == 0:
+        segments = np.array([[0, n_frames]])
+    lengths = segments[:, 1] - segments[:, 0]
+    frame_indices = np.concatenate([np.arange(start, end) for start, end in segments])
+    mfccs = mfcc_at_frames(audio, frame_indices, sr=sr, n_mfcc=n_mfcc)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    segment_features = np.add.reduceat(mfccs.astype(np.float64), offsets, axis=0) / lengths[:, None]
+    return {
+        "segments": segments * HOP_LENGTH / sr,
+        "segment_features": segment_features.astype(np.float32),
+        "features": mfccs.mean(axis=0),
+        "frames": int(n_frames),
+        "skipped_frames": int(n_frames - lengths.sum()),
+    }
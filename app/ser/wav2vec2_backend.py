@@ -0,0 +1,183 @@
+import os
+import threading
+import numpy as np
+from ser.feature_engine import check_audio
+from utils.metrics import stage_timer
+
+# Fine-tuned Wav2Vec2ForSequenceClassification checkpoint (config.json plus
+# weights), and the rate its feature encoder was trained at.
+MODEL_DIR = os.environ.get("SER_WAV2VEC2_DIR", os.path.join("app", "ser", "models", "fine_tuned_wav2vec2_pt"))
+SAMPLE_RATE = 16000
+
+
+def window_starts(n_samples, window, overlap):
+    """
+    Returns the start offsets of fixed-size windows covering `n_samples`.
+
+    Consecutive windows overlap by `overlap` samples and the last window is
+    aligned to the end of the clip, so no audio is dropped and no window is
+    shorter than `window` (unless the whole clip is).
+    """
+    if n_samples <= window:
+        return [0]
+    hop = max(window - overlap, 1)
+    starts = list(range(0, n_samples - window, hop))
+    starts.append(n_samples - window)
+    return starts
+
+
+def split_windows(audio, window, overlap):
+    """
+    Splits a waveform into overlapping windows of at most `window` samples.
+    """
+    return [audio[start:start + window] for start in window_starts(len(audio), window, overlap)]
+
+
+def length_buckets(lengths, max_batch_size):
+    """
+    Groups items of similar length into batches to keep padding small.
+
+    Parameters:
+        lengths (list): Length of each item.
+        max_batch_size (int): Largest number of items per batch.
+
+    Returns:
+        list: Batches, each a list of item indices sorted by length.
+    """
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    return [order[i:i + max_batch_size].tolist() for i in range(0, len(order), max_batch_size)]
+
+
+def normalize(audio):
+    """
+    Zero-mean, unit-variance normalisation, as done by Wav2Vec2FeatureExtractor.
+    """
+    audio = audio.astype(np.float32)
+    return (audio - audio.mean()) / np.sqrt(audio.var() + 1e-7)
+
+
+class Wav2Vec2Classifier:
+    """
+    CPU inference for the fine-tuned wav2vec2 emotion classifier.
+
+    Long clips are cut into windows of at most `max_window_seconds` that
+    overlap by `overlap_seconds`; the logits of a clip's windows are
+    mean-pooled into one prediction. Windows from all clips in a call are
+    sorted into length buckets and run in padded batches of up to
+    `max_batch_size`, so short and long clips are never padded together.
+
+    torch and transformers are only imported when a classifier is created.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, num_threads=None, quantize=False, max_window_seconds=8.0,
+                 overlap_seconds=1.0, max_batch_size=8):
+        """
+        Parameters:
+            model_dir (str): Directory holding the Hugging Face checkpoint.
+            num_threads (int): torch intra-op threads (default: torch default).
+            quantize (bool): Apply dynamic int8 quantization to the Linear
+                             layers; faster on CPU at a small accuracy cost.
+            max_window_seconds (float): Longest audio window run at once.
+            overlap_seconds (float): Overlap between consecutive windows.
+            max_batch_size (int): Largest number of windows per forward pass.
+        """
+        import torch
+        from transformers import Wav2Vec2ForSequenceClassification
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        model = Wav2Vec2ForSequenceClassification.from_pretrained(model_dir)
+        model.eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._torch = torch
+        self.model = model
+        # Group-norm checkpoints (like wav2vec2-base) are trained without an
+        # attention mask and expect zero padding instead.
+        self.use_attention_mask = model.config.feat_extract_norm == "layer"
+        self.metadata = {str(index): label for index, label in model.config.id2label.items()}
+        self.window = int(max_window_seconds * SAMPLE_RATE)
+        self.overlap = int(overlap_seconds * SAMPLE_RATE)
+        self.max_batch_size = max_batch_size
+        self.quantized = quantize
+
+    def _forward(self, windows):
+        """
+        Runs one padded batch of windows and returns their logits.
+        """
+        torch = self._torch
+        longest = max(len(window) for window in windows)
+        inputs = np.zeros((len(windows), longest), dtype=np.float32)
+        mask = np.zeros((len(windows), longest), dtype=np.int64)
+        for row, window in enumerate(windows):
+            inputs[row, :len(window)] = window
+            mask[row, :len(window)] = 1
+        kwargs = {"attention_mask": torch.from_numpy(mask)} if self.use_attention_mask else {}
+        with torch.inference_mode():
+            logits = self.model(torch.from_numpy(inputs), **kwargs).logits
+        return logits.numpy()
+
+    def predict_proba(self, waveforms):
+        """
+        Returns class probabilities for a list of 16 kHz mono waveforms.
+
+        Returns:
+            numpy.ndarray: Array of shape (N, n_labels).
+
+        Raises:
+            ValueError: If a waveform is empty, like the MFCC path.
+        """
+        # An empty clip would give an empty window, NaNs from normalize and a
+        # failing forward pass.
+        waveforms = [np.asarray(audio, dtype=np.float32) for audio in waveforms]
+        for audio in waveforms:
+            check_audio(audio)
+        windows, owners = [], []
+        for clip, audio in enumerate(waveforms):
+            for window in split_windows(audio, self.window, self.overlap):
+                windows.append(normalize(window))
+                owners.append(clip)
+
+        logits = np.zeros((len(windows), len(self.metadata)), dtype=np.float32)
+        for batch in length_buckets([len(window) for window in windows], self.max_batch_size):
+            logits[batch] = self._forward([windows[i] for i in batch])
+
+        # Mean-pool window logits per clip, then softmax.
+        owners = np.asarray(owners)
+        pooled = np.zeros((len(waveforms), logits.shape[1]), dtype=np.float32)
+        np.add.at(pooled, owners, logits)
+        pooled /= np.bincount(owners, minlength=len(waveforms))[:, None]
+        pooled = np.exp(pooled - pooled.max(axis=1, keepdims=True))
+        return pooled / pooled.sum(axis=1, keepdims=True)
+
+    def predict(self, waveforms):
+        """
+        Returns one emotion label per 16 kHz mono waveform.
+        """
+        with stage_timer("model_predict"):
+            probabilities = self.predict_proba(waveforms)
+        return [self.metadata.get(str(int(index)), "Unknown") for index in probabilities.argmax(axis=1)]
+
+
+_default_classifier = None
+_default_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """
+    Returns the process-wide Wav2Vec2Classifier, configured from the
+    SER_WAV2VEC2_* environment variables and created on first use.
+    """
+    global _default_classifier
+    if _default_classifier is None:
+        with _default_classifier_lock:
+            if _default_classifier is None:
+                threads = os.environ.get("SER_WAV2VEC2_THREADS")
+                _default_classifier = Wav2Vec2Classifier(
+                    num_threads=int(threads) if threads else None,
+                    quantize=os.environ.get("SER_WAV2VEC2_QUANTIZE", "0") == "1",
+                    max_window_seconds=float(os.environ.get("SER_WAV2VEC2_MAX_WINDOW_S", "8")),
+                    overlap_seconds=float(os.environ.get("SER_WAV2VEC2_OVERLAP_S", "1")),
+                    max_batch_size=int(os.environ.get("SER_WAV2VEC2_MAX_BATCH", "8")),
+                )
+    return _default_classifier
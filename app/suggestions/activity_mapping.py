@@ -0,0 +1,42 @@
+# Maps each detected emotion to the catalog moods that suit it, in order of
+# preference, together with a relative weight for each mood. Negative
+# emotions are steered towards moods that help lift or settle them.
+EMOTION_TO_MOODS = {
+    "happy": {"happy": 3.0, "energetic": 2.0, "excited": 2.0, "confident": 1.0},
+    "sad": {"happy": 3.0, "chill": 2.0, "immersive": 1.0},
+    "angry": {"chill": 3.0, "focused": 2.0, "thoughtful": 1.0},
+    "fearful": {"chill": 3.0, "happy": 2.0, "immersive": 1.0},
+    "calm": {"chill": 3.0, "thoughtful": 2.0, "focused": 1.0},
+    "neutral": {"happy": 2.0, "energetic": 2.0, "confident": 1.0, "neutral": 1.0},
+    "disgust": {"chill": 2.0, "immersive": 2.0, "happy": 1.0},
+    "surprised": {"excited": 3.0, "energetic": 2.0, "intense": 1.0},
+}
+
+# Used for emotions missing from the mapping above.
+DEFAULT_MOODS = {"neutral": 1.0, "happy": 1.0}
+
+# Generic suggestions returned when no catalog item matches an emotion.
+FALLBACK_ACTIVITIES = {
+    "happy": ["Share the good mood with a friend", "Go for a walk outside"],
+    "sad": ["Call someone you trust", "Take a short walk in daylight"],
+    "angry": ["Try a few minutes of slow breathing", "Go for a run"],
+    "fearful": ["Try a grounding exercise", "Talk to someone you trust"],
+    "calm": ["Read a book", "Try a short meditation"],
+    "neutral": ["Take a short break", "Stretch for five minutes"],
+    "disgust": ["Step away for a few minutes", "Get some fresh air"],
+    "surprised": ["Write down what happened", "Take a moment to reflect"],
+}
+
+
+def moods_for_emotion(emotion):
+    """
+    Returns the {mood: weight} mapping for an emotion label.
+    """
+    return EMOTION_TO_MOODS.get(str(emotion).lower(), DEFAULT_MOODS)
+
+
+def fallback_activities(emotion):
+    """
+    Returns generic activity suggestions for an emotion label.
+    """
+    return FALLBACK_ACTIVITIES.get(str(emotion).lower(), FALLBACK_ACTIVITIES["neutral"])
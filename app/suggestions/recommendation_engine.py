@@ -0,0 +1,378 @@
+import os
+import csv
+import json
+import bisect
+import threading
+import numpy as np
+from suggestions.activity_mapping import moods_for_emotion, fallback_activities
+from utils.metrics import stage_timer
+
+# Catalogs written by the download scripts; override with SUGGESTIONS_DATA_DIR.
+DATA_DIR = os.environ.get("SUGGESTIONS_DATA_DIR", os.path.join("app", "suggestions", "data"))
+MUSIC_CSV = "music_data.csv"
+GAMES_CSV = "games_data.csv"
+# Catalog versions and deltas published by the download scripts' refresh mode.
+MANIFEST_NAME = "catalog_manifest.json"
+DELTA_DIR = "deltas"
+# For a user with a profile, this many candidates are drawn per suggestion
+# and the ones they scored highest are kept.
+CANDIDATES_PER_SUGGESTION = 3
+
+
+def item_key(catalog, item_id):
+    """
+    Returns the key feedback refers to an item by, e.g. "music:123".
+    """
+    return f"{catalog}:{item_id}"
+
+
+def _music_label(row):
+    artist = row.get("artist")
+    if artist:
+        return f"Listen to '{row.get('title')}' by {artist}"
+    return f"Listen to '{row.get('title')}'"
+
+
+def _game_label(row):
+    return f"Play {row.get('name')}"
+
+
+class CatalogIndex:
+    """
+    Catalog items grouped by mood into contiguous array slices.
+
+    Items are sorted by mood once at load time, so every mood owns a
+    [start, stop) range of the item arrays and a lookup is a dict hit plus a
+    slice. A cumulative weight array over the sorted items lets weighted
+    sampling pick an item inside a mood's range with a binary search,
+    without building per-request candidate lists or copying the catalog.
+    """
+
+    def __init__(self, ids, labels, moods, weights=None):
+        """
+        Parameters:
+            ids (list): Item ids.
+            labels (list): Display text of each item.
+            moods (list): Mood of each item.
+            weights (list): Optional sampling weight of each item (default 1).
+        """
+        moods = np.array([str(mood).lower() for mood in moods], dtype=object)
+        order = np.argsort(moods, kind="stable")
+        self.ids = np.array([str(item_id) for item_id in ids], dtype=object)[order]
+        self.labels = np.array(labels, dtype=object)[order]
+        self.moods = moods[order]
+        weights = np.ones(len(order)) if weights is None else np.asarray(weights, dtype=np.float64)[order]
+        self.weights = np.clip(weights, 0.0, None)
+        self.cumulative = np.cumsum(self.weights)
+        self.positions = {item_id: position for position, item_id in enumerate(self.ids)}
+
+        # mood -> [start, stop) range of the sorted arrays
+        self.slices = {}
+        if len(order):
+            sorted_moods = self.moods
+            boundaries = [int(b) for b in np.flatnonzero(sorted_moods[1:] != sorted_moods[:-1]) + 1]
+            for start, stop in zip([0] + boundaries, boundaries + [len(order)]):
+                self.slices[sorted_moods[start]] = (start, stop)
+
+    @classmethod
+    def from_csv(cls, csv_path, label_fn):
+        """
+        Builds an index from a catalog CSV with at least id and mood columns.
+        """
+        with open(csv_path, "r", newline="", encoding="utf-8") as f:
+            return cls.empty().merged(csv.DictReader(f), label_fn)
+
+    def merged(self, rows, label_fn):
+        """
+        Returns a new index with catalog rows added or, for ids already in
+        the index, replaced. The index itself is left untouched, so it can
+        keep serving while the new one is built.
+        """
+        ids, labels, moods, weights = list(self.ids), list(self.labels), list(self.moods), list(self.weights)
+        positions = dict(self.positions)
+        for row in rows:
+            item_id = str(row.get("id", ""))
+            item = (label_fn(row), row.get("mood") or "neutral", float(row.get("weight") or 1.0))
+            position = positions.get(item_id)
+            if position is None:
+                positions[item_id] = len(ids)
+                ids.append(item_id)
+                labels.append(item[0])
+                moods.append(item[1])
+                weights.append(item[2])
+            else:
+                labels[position], moods[position], weights[position] = item
+        return CatalogIndex(ids, labels, moods, weights)
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], [])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def items(self, mood):
+        """
+        Returns the display labels of every item with the given mood.
+        """
+        start, stop = self.slices.get(mood, (0, 0))
+        return self.labels[start:stop]
+
+    def _mood_weight(self, start, stop):
+        return self.cumulative[stop - 1] - (self.cumulative[start - 1] if start else 0.0)
+
+    def sample(self, mood_weights, k, rng, exclude=None, max_attempts_per_item=8):
+        """
+        Draws up to `k` distinct items, weighted by mood weight times item
+        weight, skipping excluded item ids.
+
+        Parameters:
+            mood_weights (dict): {mood: weight} of acceptable moods.
+            k (int): Number of items to draw.
+            rng (numpy.random.Generator): Random source.
+            exclude (set): Item ids that must not be returned.
+            max_attempts_per_item (int): Random draws per item before
+                                         falling back to a linear scan.
+
+        Returns:
+            list: Positions of the drawn items in the index arrays.
+        """
+        ranges = []
+        probabilities = []
+        for mood, mood_weight in mood_weights.items():
+            if mood in self.slices and mood_weight > 0:
+                start, stop = self.slices[mood]
+                total = self._mood_weight(start, stop)
+                if total > 0:
+                    ranges.append((start, stop))
+                    probabilities.append(mood_weight * total)
+        if not ranges or k <= 0:
+            return []
+        mood_cumulative = np.cumsum(probabilities)
+        mood_cumulative /= mood_cumulative[-1]
+
+        exclude = exclude or ()
+        chosen = []
+        seen = set()
+        # Two uniform numbers per draw: one picks the mood, one the item.
+        uniforms = rng.random((k * max_attempts_per_item, 2))
+        for mood_u, item_u in uniforms:
+            if len(chosen) == k:
+                return chosen
+            start, stop = ranges[min(bisect.bisect_right(mood_cumulative, mood_u), len(ranges) - 1)]
+            low = self.cumulative[start - 1] if start else 0.0
+            target = low + item_u * (self.cumulative[stop - 1] - low)
+            position = min(int(np.searchsorted(self.cumulative, target, side="right")), stop - 1)
+            if position in seen or self.ids[position] in exclude:
+                continue
+            seen.add(position)
+            chosen.append(position)
+
+        # Most of the eligible items are excluded or taken; scan for the rest.
+        for start, stop in ranges:
+            for position in range(start, stop):
+                if len(chosen) == k:
+                    return chosen
+                if position not in seen and self.weights[position] > 0 and self.ids[position] not in exclude:
+                    seen.add(position)
+                    chosen.append(position)
+        return chosen
+
+
+class RecommendationEngine:
+    """
+    Suggests music and games for a detected emotion.
+
+    The catalogs are loaded once into mood-keyed CatalogIndex objects;
+    suggestions are drawn by weighted random sampling over the moods mapped
+    to the emotion in activity_mapping, and re-ranked by the user's
+    feedback when a UserProfile is given. When the download scripts publish
+    a new catalog version, refresh_if_changed() applies its delta files to
+    the loaded index and swaps it in, without re-reading the full catalog.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, music_count=3, game_count=2):
+        """
+        Parameters:
+            data_dir (str): Directory containing music_data.csv and games_data.csv.
+            music_count (int): Number of music suggestions per request.
+            game_count (int): Number of game suggestions per request.
+        """
+        self.data_dir = data_dir
+        self.music_count = music_count
+        self.game_count = game_count
+        self.versions = {}
+        self.music = self._load(MUSIC_CSV, _music_label)
+        self.games = self._load(GAMES_CSV, _game_label)
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._watcher = None
+        self._stop_event = threading.Event()
+
+    def _manifest(self):
+        manifest_path = os.path.join(self.data_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, "r") as f:
+            return json.load(f)
+
+    def _load(self, file_name, label_fn):
+        # Read the version before the catalog: if a newer catalog lands in
+        # between, re-applying its delta later is harmless.
+        self.versions[file_name] = self._manifest().get(file_name, {}).get("version", 0)
+        csv_path = os.path.join(self.data_dir, file_name)
+        if not os.path.exists(csv_path):
+            print(f"Catalog not found, skipping: {os.path.abspath(csv_path)}")
+            return CatalogIndex.empty()
+        return CatalogIndex.from_csv(csv_path, label_fn)
+
+    def _updated(self, index, file_name, label_fn, entry):
+        """
+        Returns `index` brought up to the manifest `entry`, by applying its
+        deltas when they cover every missed version, or by a full reload.
+        """
+        missed = range(self.versions[file_name] + 1, entry["version"] + 1)
+        stem = os.path.splitext(file_name)[0]
+        if set(missed) <= set(entry.get("deltas", [])):
+            for version in missed:
+                delta_path = os.path.join(self.data_dir, DELTA_DIR, f"{stem}.v{version}.csv")
+                with open(delta_path, "r", newline="", encoding="utf-8") as f:
+                    index = index.merged(csv.DictReader(f), label_fn)
+            self.versions[file_name] = entry["version"]
+            return index
+        return self._load(file_name, label_fn)
+
+    def refresh_if_changed(self):
+        """
+        Picks up catalog versions published since the last check.
+
+        Returns:
+            bool: True if a catalog was updated.
+        """
+        with self._refresh_lock:
+            try:
+                manifest = self._manifest()
+                updated = False
+                for attribute, file_name, label_fn in (("music", MUSIC_CSV, _music_label),
+                                                       ("games", GAMES_CSV, _game_label)):
+                    entry = manifest.get(file_name)
+                    if entry and entry["version"] > self.versions.get(file_name, 0):
+                        setattr(self, attribute, self._updated(getattr(self, attribute), file_name, label_fn, entry))
+                        print(f"Catalog {file_name} updated to v{self.versions[file_name]}")
+                        updated = True
+                return updated
+            except (OSError, ValueError, KeyError) as e:
+                # Keep serving the loaded catalogs; try again next tick.
+                print(f"Skipping catalog refresh: {e}")
+                return False
+
+    def start_watcher(self, interval=30.0):
+        """
+        Starts a daemon thread that calls refresh_if_changed() every
+        `interval` seconds.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        def watch():
+            while not self._stop_event.wait(interval):
+                self.refresh_if_changed()
+
+        self._stop_event.clear()
+        self._watcher = threading.Thread(target=watch, name="catalog-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """
+        Stops the background refresh thread, if running.
+        """
+        self._stop_event.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _rng(self):
+        # numpy Generators are not thread-safe, so each thread gets its own.
+        rng = getattr(self._local, "rng", None)
+        if rng is None:
+            rng = self._local.rng = np.random.default_rng()
+        return rng
+
+    def find_mood(self, key):
+        """
+        Returns the mood of the catalog item with the given item_key(), or
+        None if no catalog has it.
+        """
+        catalog, _, item_id = key.partition(":")
+        index = {"music": self.music, "games": self.games}.get(catalog)
+        position = index.positions.get(item_id) if index is not None else None
+        return index.moods[position] if position is not None else None
+
+    def suggest(self, emotion, exclude=None, profile=None):
+        """
+        Returns suggestions for an emotion with the item_key() of each.
+
+        Parameters:
+            emotion (str): Detected emotion label.
+            exclude (set): Item ids the user should not be offered again.
+            profile (UserProfile): The user's feedback. Their mood scores
+                                   shift the mix of moods, items they
+                                   disliked are left out, and the
+                                   candidates they scored highest win.
+
+        Returns:
+            list: (item key, suggestion string) pairs; the key is None for
+            the fallback activities.
+        """
+        with stage_timer("suggestions"):
+            moods = moods_for_emotion(emotion)
+            rng = self._rng()
+            suggestions = []
+            for catalog, index, count in (("music", self.music, self.music_count),
+                                          ("games", self.games, self.game_count)):
+                if profile is None:
+                    positions = index.sample(moods, count, rng, exclude=exclude)
+                else:
+                    hidden = profile.excluded.get(catalog)
+                    excluded = (set(exclude or ()) | hidden) if hidden else exclude
+                    positions = index.sample(profile.mood_weights(moods), count * CANDIDATES_PER_SUGGESTION, rng,
+                                             exclude=excluded)
+                    # The sort is stable, so equally scored candidates keep
+                    # their random draw order and still rotate.
+                    positions = sorted(positions, key=lambda position: -profile.item_score(
+                        item_key(catalog, index.ids[position])))[:count]
+                suggestions.extend((item_key(catalog, index.ids[position]), index.labels[position])
+                                   for position in positions)
+            if not suggestions:
+                return [(None, activity) for activity in fallback_activities(emotion)]
+            return suggestions
+
+    def get_suggestions(self, emotion, exclude=None, profile=None):
+        """
+        Returns suggestions for an emotion.
+
+        Parameters:
+            emotion (str): Detected emotion label.
+            exclude (set): Item ids the user should not be offered again.
+            profile (UserProfile): The user's feedback, see suggest().
+
+        Returns:
+            list: Suggestion strings, e.g. "Listen to 'Song' by Artist".
+        """
+        return [label for _, label in self.suggest(emotion, exclude=exclude, profile=profile)]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns the process-wide RecommendationEngine, loading the catalogs once.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RecommendationEngine()
+    return _engine
@@ -0,0 +1,320 @@
+import os
+import time
+import math
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+from utils.metrics import Counter, Gauge
+
+FEEDBACK_EVENTS_TOTAL = Counter("ser_feedback_events_total", "Suggestion feedback events received.", ["event"])
+PROFILE_CACHE_HITS_TOTAL = Counter("ser_user_profile_cache_hits_total", "User profiles served from memory.")
+PROFILE_CACHE_MISSES_TOTAL = Counter("ser_user_profile_cache_misses_total", "User profiles read from the database.")
+
+# How much one feedback event moves a user's score for the item and its mood.
+EVENT_SCORES = {"like": 1.0, "play": 0.5, "skip": -0.5, "dislike": -1.0}
+# Items at or below this score are no longer suggested to the user.
+EXCLUDE_SCORE = -1.0
+# A mood's sampling weight is scaled by exp(MOOD_SCALE * score), capped at
+# exp(+-MAX_MOOD_BOOST), so taste shifts the mix without overriding the
+# emotion mapping.
+MOOD_SCALE = 0.25
+MAX_MOOD_BOOST = 2.0
+
+
+class UserProfile:
+    """
+    One user's accumulated feedback: a score per catalog item ("music:<id>"
+    or "games:<id>") and per mood, plus the items they no longer want.
+    """
+
+    __slots__ = ("items", "moods", "excluded")
+
+    def __init__(self):
+        self.items = {}
+        self.moods = {}
+        # catalog -> ids of its items scored at or below EXCLUDE_SCORE
+        self.excluded = {}
+
+    def add(self, item_key, mood, score):
+        """
+        Adds a score to an item and, if given, to its mood.
+        """
+        total = self.items.get(item_key, 0.0) + score
+        self.items[item_key] = total
+        if mood:
+            self.moods[mood] = self.moods.get(mood, 0.0) + score
+        catalog, _, item_id = item_key.partition(":")
+        if total <= EXCLUDE_SCORE:
+            self.excluded.setdefault(catalog, set()).add(item_id)
+        elif item_id in self.excluded.get(catalog, ()):
+            self.excluded[catalog].discard(item_id)
+
+    def merge(self, other):
+        """
+        Adds another profile's scores (e.g. feedback not written yet) to this one.
+        """
+        for item_key, score in other.items.items():
+            self.add(item_key, None, score)
+        for mood, score in other.moods.items():
+            self.moods[mood] = self.moods.get(mood, 0.0) + score
+
+    def mood_weights(self, mood_weights):
+        """
+        Returns the {mood: weight} mapping of an emotion scaled by this
+        user's mood scores. Only the emotion's own moods are considered.
+        """
+        if not self.moods:
+            return mood_weights
+        weights = {}
+        for mood, weight in mood_weights.items():
+            boost = max(-MAX_MOOD_BOOST, min(MAX_MOOD_BOOST, MOOD_SCALE * self.moods.get(mood, 0.0)))
+            weights[mood] = weight * math.exp(boost)
+        return weights
+
+    def item_score(self, item_key):
+        return self.items.get(item_key, 0.0)
+
+    def copy(self):
+        """
+        Returns an independent copy of this profile.
+        """
+        profile = UserProfile()
+        profile.items = dict(self.items)
+        profile.moods = dict(self.moods)
+        profile.excluded = {catalog: set(item_ids) for catalog, item_ids in self.excluded.items()}
+        return profile
+
+
+class UserPreferenceStore:
+    """
+    Per-user suggestion feedback in a local SQLite file (WAL mode), with the
+    profiles of recently active users kept in memory.
+
+    Scores are kept in two tables keyed by (user_id, item) and (user_id,
+    mood) without rowids, so a user's rows are stored together and loading a
+    profile is one range scan of the primary key, however many users there
+    are. A profile is read once and then served from an LRU of
+    `cache_size` profiles for `cache_ttl` seconds (after which feedback
+    written by other processes shows up). Cached profiles are never changed
+    in place: feedback replaces a user's entry with an updated copy, so a
+    profile handed out by profile() can be read without a lock.
+
+    record() never touches the database: events are added to the cached
+    profile and to a pending batch, which a background thread writes in one
+    transaction every `flush_interval` seconds, or sooner once `flush_size`
+    users have pending events.
+    """
+
+    def __init__(self, db_path, cache_size=10000, cache_ttl=60.0, flush_interval=1.0, flush_size=1000):
+        """
+        Parameters:
+            db_path (str): SQLite file, created if missing.
+            cache_size (int): Profiles kept in memory.
+            cache_ttl (float): Seconds a cached profile is used before it is
+                               read again.
+            flush_interval (float): Longest time events wait to be written.
+            flush_size (int): Users with pending events that trigger an
+                              early write.
+        """
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._profiles = OrderedDict()
+        # user_id -> UserProfile of the events not written yet
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._writer = None
+        self._local = threading.local()
+        # The schema is created on a throwaway connection: connections must
+        # not be carried into processes forked from this one.
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        connection = sqlite3.connect(db_path, timeout=5.0, isolation_level=None)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS user_items (user_id TEXT NOT NULL, item TEXT NOT NULL, "
+                               "score REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (user_id, item)) "
+                               "WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS user_moods (user_id TEXT NOT NULL, mood TEXT NOT NULL, "
+                               "score REAL NOT NULL, PRIMARY KEY (user_id, mood)) WITHOUT ROWID")
+        finally:
+            connection.close()
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads or processes.
+        cached = getattr(self._local, "connection", None)
+        if cached is None or cached[0] != os.getpid():
+            connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            cached = self._local.connection = (os.getpid(), connection)
+        return cached[1]
+
+    def _load(self, user_id):
+        connection = self._connect()
+        profile = UserProfile()
+        for item_key, score in connection.execute("SELECT item, score FROM user_items WHERE user_id = ?",
+                                                  (user_id,)):
+            profile.add(item_key, None, score)
+        profile.moods = dict(connection.execute("SELECT mood, score FROM user_moods WHERE user_id = ?",
+                                                (user_id,)).fetchall())
+        return profile
+
+    def profile(self, user_id):
+        """
+        Returns the UserProfile of a user (empty for unknown users),
+        including feedback that is not written yet. It is a snapshot that
+        later feedback does not change; do not modify it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._profiles.move_to_end(user_id)
+                PROFILE_CACHE_HITS_TOTAL.inc()
+                return entry[0]
+        PROFILE_CACHE_MISSES_TOTAL.inc()
+        # No batch is half-written while the profile is read, so every
+        # event is either in the database or still pending, never both.
+        with self._flush_lock:
+            profile = self._load(user_id)
+            with self._lock:
+                if user_id in self._pending:
+                    profile.merge(self._pending[user_id])
+                self._profiles[user_id] = (profile, now + self.cache_ttl)
+                self._profiles.move_to_end(user_id)
+                while len(self._profiles) > self.cache_size:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def record(self, user_id, item_key, mood, event):
+        """
+        Records one feedback event; it is written to the database later,
+        in a batch.
+
+        Parameters:
+            user_id (str): The user.
+            item_key (str): "<catalog>:<item id>" of the suggested item.
+            mood (str): The item's mood.
+            event (str): One of EVENT_SCORES.
+
+        Raises:
+            ValueError: For an unknown event.
+        """
+        if event not in EVENT_SCORES:
+            raise ValueError(f"Unknown feedback event {event!r}, expected one of {sorted(EVENT_SCORES)}")
+        score = EVENT_SCORES[event]
+        with self._lock:
+            entry = self._profiles.get(user_id)
+            if entry is not None:
+                # Copy on write: requests may still be reading the old profile.
+                profile = entry[0].copy()
+                profile.add(item_key, mood, score)
+                self._profiles[user_id] = (profile, entry[1])
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = UserProfile()
+            pending.add(item_key, mood, score)
+            pending_users = len(self._pending)
+        FEEDBACK_EVENTS_TOTAL.inc(event=event)
+        if pending_users >= self.flush_size:
+            self._wake.set()
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Writes all pending feedback in one transaction.
+
+        Returns:
+            int: Number of users whose feedback was written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            now = time.time()
+            item_rows = [(user_id, item_key, score, now) for user_id, profile in batch.items()
+                         for item_key, score in profile.items.items()]
+            mood_rows = [(user_id, mood, score) for user_id, profile in batch.items()
+                         for mood, score in profile.moods.items()]
+            connection = self._connect()
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany("INSERT INTO user_items VALUES (?, ?, ?, ?) ON CONFLICT (user_id, item) "
+                                       "DO UPDATE SET score = score + excluded.score, updated = excluded.updated",
+                                       item_rows)
+                connection.executemany("INSERT INTO user_moods VALUES (?, ?, ?) ON CONFLICT (user_id, mood) "
+                                       "DO UPDATE SET score = score + excluded.score", mood_rows)
+                connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                # Put the batch back with the newer events and retry on the next tick.
+                with self._lock:
+                    for user_id, profile in self._pending.items():
+                        batch.setdefault(user_id, UserProfile()).merge(profile)
+                    self._pending = batch
+                print(f"Could not write user feedback, will retry: {e}")
+                return 0
+            return len(batch)
+
+    def start(self):
+        """
+        Starts the background writer thread (idempotent, also after a fork).
+        """
+        if self._writer is not None and self._writer.is_alive():
+            return
+
+        def write():
+            while not self._stop_event.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+
+        if self._writer is None:
+            atexit.register(self.stop)
+        self._stop_event.clear()
+        self._writer = threading.Thread(target=write, name="user-feedback-writer", daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """
+        Stops the writer thread and writes what is still pending.
+        """
+        self._stop_event.set()
+        self._wake.set()
+        if self._writer is not None and self._writer.is_alive():
+            self._writer.join()
+        self.flush()
+
+
+_default_store = None
+
+
+def store_from_env(data_dir):
+    """
+    Returns the user preference store configured by SUGGESTIONS_USER_DB
+    (default: user_preferences.db in `data_dir`; empty disables
+    personalization), SUGGESTIONS_USER_CACHE, SUGGESTIONS_USER_CACHE_TTL
+    and SUGGESTIONS_FEEDBACK_FLUSH_S, or None. The writer thread is not
+    started.
+    """
+    global _default_store
+    db_path = os.environ.get("SUGGESTIONS_USER_DB", os.path.join(data_dir, "user_preferences.db"))
+    if not db_path:
+        return None
+    _default_store = UserPreferenceStore(db_path, cache_size=int(os.environ.get("SUGGESTIONS_USER_CACHE", "10000")),
+                                         cache_ttl=float(os.environ.get("SUGGESTIONS_USER_CACHE_TTL", "60")),
+                                         flush_interval=float(os.environ.get("SUGGESTIONS_FEEDBACK_FLUSH_S", "1")))
+    return _default_store
+
+
+FEEDBACK_PENDING = Gauge("ser_feedback_pending_users", "Users with suggestion feedback not written yet.",
+                         callback=lambda: _default_store.pending() if _default_store is not None else None)
@@ -0,0 +1,258 @@
+"""
+Offline benchmark of the SER + suggestion path.
+
+Everything the benchmark needs is generated in a temporary directory:
+synthetic audio clips at several durations and sample rates, a tiny Keras
+model with the production input/output shape and a small suggestion
+catalog. Each stage is timed on its own and the full /predict route is timed
+through the Flask test client. Results are printed and written as JSON so
+runs can be compared between releases.
+
+Usage (from the project root):
+    python benchmarks/bench_pipeline.py --output bench_output.json
+    python benchmarks/bench_pipeline.py --quick
+"""
+import os
+import io
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+sys.path.insert(0, APP_DIR)
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import numpy as np
+import soundfile as sf
+
+EMOTIONS = ["angry", "calm", "disgust", "fearful", "happy", "neutral", "sad", "surprised"]
+MOODS = ["happy", "energetic", "excited", "chill", "confident", "neutral", "thoughtful", "immersive", "focused"]
+
+
+def summarize(durations):
+    """
+    Returns latency percentiles (ms) and throughput for a list of durations.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    p50, p95, p99 = np.percentile(durations, [50, 95, 99]) * 1000.0
+    return {
+        "iterations": int(durations.size),
+        "mean_ms": float(durations.mean() * 1000.0),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "throughput_per_s": float(durations.size / durations.sum()),
+    }
+
+
+def measure(fn, iterations, warmup=3):
+    """
+    Calls `fn` `warmup` times untimed, then `iterations` times timed.
+    """
+    for _ in range(warmup):
+        fn()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def synthetic_clip(rng, seconds, sr):
+    """
+    Returns a speech-like test signal: a few harmonics with a wobbling pitch,
+    amplitude bursts and a little noise.
+    """
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = 140.0 + 30.0 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3.0 * t)) ** 2
+    audio = 0.2 * voice * envelope + 0.01 * rng.standard_normal(t.size)
+    return audio.astype(np.float32)
+
+
+def wav_bytes(audio, sr):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sr, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def build_fixtures(work_dir, seed):
+    """
+    Writes a tiny model, its metadata and a suggestion catalog to `work_dir`.
+    """
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    model = tf.keras.Sequential([
+        tf.keras.Input(shape=(13,)),
+        tf.keras.layers.Dense(64, activation="relu"),
+        tf.keras.layers.Dense(32, activation="relu"),
+        tf.keras.layers.Dense(len(EMOTIONS), activation="softmax"),
+    ])
+    model_path = os.path.join(work_dir, "model.h5")
+    metadata_path = os.path.join(work_dir, "model_metadata.json")
+    model.save(model_path)
+    with open(metadata_path, "w") as f:
+        json.dump({str(i): label for i, label in enumerate(EMOTIONS)}, f)
+
+    data_dir = os.path.join(work_dir, "suggestions")
+    os.makedirs(data_dir)
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(data_dir, "music_data.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "artist", "genre", "mood"])
+        for i in range(5000):
+            writer.writerow([f"track-{i}", f"Track {i}", f"Artist {i % 200}", "Pop", MOODS[rng.integers(len(MOODS))]])
+    with open(os.path.join(data_dir, "games_data.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "genre", "mood"])
+        for i in range(2000):
+            writer.writerow([i, f"Game {i}", "Action", MOODS[rng.integers(len(MOODS))]])
+    return model_path, metadata_path, data_dir
+
+
+def run(durations, sample_rates, iterations, batch_sizes, seed):
+    rng = np.random.default_rng(seed)
+    results = {"stages": {}, "route": {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        model_path, metadata_path, data_dir = build_fixtures(work_dir, seed)
+        # Point the app at the generated fixtures before it is imported.
+        os.environ["SER_MODEL_PATH"] = model_path
+        os.environ["SER_METADATA_PATH"] = metadata_path
+        os.environ["SUGGESTIONS_DATA_DIR"] = data_dir
+        # Every iteration posts the same clip; with the response cache on,
+        # the route timings would measure cache hits. Those are timed below.
+        os.environ["SER_RESPONSE_CACHE_SIZE"] = "0"
+
+        from ser.audio_io import RESAMPLERS, decode_audio
+        from ser.feature_engine import extract_mfcc_from_array, mean_mfcc_batch
+        from ser.emotion_classifier import load_model_and_metadata, predict_emotions_from_features
+        from ser.response_cache import ResponseCache
+        from suggestions.recommendation_engine import get_engine
+        import librosa
+
+        start = time.perf_counter()
+        load_model_and_metadata()
+        results["model_load_s"] = time.perf_counter() - start
+
+        for seconds in durations:
+            for sr in sample_rates:
+                name = f"{seconds:g}s@{sr}Hz"
+                data = wav_bytes(synthetic_clip(rng, seconds, sr), sr)
+                results["stages"][f"decode/{name}"] = measure(lambda: decode_audio(data, sr=22050), iterations)
+                if sr != 22050:
+                    for resampler in RESAMPLERS:
+                        results["stages"][f"decode/{name}/{resampler}"] = measure(
+                            lambda: decode_audio(data, sr=22050, resampler=resampler), iterations)
+                # The generic decode + resample path that serving used to take.
+                clip_path = os.path.join(work_dir, "clip.wav")
+                with open(clip_path, "wb") as f:
+                    f.write(data)
+                results["stages"][f"librosa_load/{name}"] = measure(
+                    lambda: librosa.load(clip_path, sr=22050), iterations)
+            # MFCCs are always computed at 22.05 kHz, whatever rate the clip came in at.
+            audio = synthetic_clip(rng, seconds, 22050)
+            results["stages"][f"extract_mfcc/{seconds:g}s"] = measure(
+                lambda: extract_mfcc_from_array(audio, sr=22050), iterations)
+
+        for batch_size in batch_sizes:
+            seconds = durations[len(durations) // 2]
+            batch = np.stack([synthetic_clip(rng, seconds, 22050) for _ in range(batch_size)])
+            stats = measure(lambda: mean_mfcc_batch(batch, sr=22050), max(3, iterations // batch_size))
+            stats["clips_per_s"] = stats["throughput_per_s"] * batch_size
+            results["stages"][f"extract_mfcc_batch/{seconds:g}s/b{batch_size}"] = stats
+
+            features = rng.standard_normal((batch_size, 13)).astype(np.float32) * 50
+            stats = measure(lambda: predict_emotions_from_features(features), iterations)
+            stats["clips_per_s"] = stats["throughput_per_s"] * batch_size
+            results["stages"][f"model_predict/b{batch_size}"] = stats
+
+        engine = get_engine()
+        for emotion in ("happy", "sad"):
+            results["stages"][f"get_suggestions/{emotion}"] = measure(
+                lambda: engine.get_suggestions(emotion), iterations * 10)
+
+        import main
+        client = main.app.test_client()
+        for seconds in durations:
+            data = wav_bytes(synthetic_clip(rng, seconds, 44100), 44100)
+
+            def post():
+                response = client.post("/predict", data={"audio": (io.BytesIO(data), "clip.wav")},
+                                       content_type="multipart/form-data")
+                if response.status_code != 200 or "error" in response.get_json():
+                    raise RuntimeError(f"/predict failed: {response.get_data(as_text=True)}")
+
+            results["route"][f"predict/{seconds:g}s@44100Hz"] = measure(post, iterations)
+
+            # A repeated upload, answered from the response cache after the first post.
+            main.response_cache = ResponseCache()
+            post()
+            results["route"][f"predict_cached/{seconds:g}s@44100Hz"] = measure(post, iterations)
+            main.response_cache = None
+        main.batcher.stop()
+        main.model_registry.stop_watcher()
+    return results
+
+
+def environment():
+    import tensorflow as tf
+    import librosa
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "tensorflow": tf.__version__,
+        "librosa": librosa.__version__,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SER + suggestion path offline.")
+    parser.add_argument("--iterations", type=int, default=30, help="Timed iterations per stage.")
+    parser.add_argument("--durations", type=float, nargs="+", default=[1.0, 3.0, 10.0],
+                        help="Clip durations in seconds.")
+    parser.add_argument("--sample-rates", type=int, nargs="+", default=[16000, 22050, 44100, 48000],
+                        help="Sample rates of the encoded test clips.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32], help="Batch sizes to time.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for clips, model and catalog.")
+    parser.add_argument("--quick", action="store_true", help="Few iterations and one sample rate, for smoke runs.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.iterations = 5
+        args.sample_rates = [22050]
+        args.durations = [1.0, 3.0]
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "iterations": args.iterations,
+            "durations": args.durations,
+            "sample_rates": args.sample_rates,
+            "batch_sizes": args.batch_sizes,
+            "seed": args.seed,
+        },
+        "environment": environment(),
+    }
+    report.update(run(args.durations, args.sample_rates, args.iterations, args.batch_sizes, args.seed))
+
+    print(f"{'benchmark':45s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'ops/s':>10s}")
+    for section in ("stages", "route"):
+        for name, stats in report[section].items():
+            print(f"{name:45s} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f} "
+                  f"{stats['p99_ms']:9.3f} {stats['throughput_per_s']:10.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to: {os.path.abspath(args.output)}")
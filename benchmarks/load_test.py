@@ -0,0 +1,187 @@
+"""
+Load test of multi-process serving: how /predict throughput scales with the
+number of gunicorn workers.
+
+For each worker count, a server is started with gunicorn.conf.py on
+generated fixtures (the same tiny model and catalog as bench_pipeline.py,
+served from its NumPy export), hit with concurrent /predict requests for a
+fixed time, and stopped. Throughput, latency percentiles, 503 responses and
+the memory of the whole process tree are reported per worker count, and
+written as JSON so runs can be compared between hosts.
+
+Usage (from the project root; needs gunicorn):
+    python benchmarks/load_test.py --workers 1 2 4 --concurrency 16 --seconds 20
+    python benchmarks/load_test.py --url http://localhost:5000 --seconds 20   # an already running server
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import numpy as np
+import requests
+from bench_pipeline import build_fixtures, synthetic_clip, wav_bytes, summarize
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree_memory(pid):
+    """
+    Returns the summed RSS and PSS (MB) of a process and its children. PSS
+    splits shared pages between the processes mapping them, so it shows what
+    each extra worker really costs. Linux only; None elsewhere.
+    """
+    if not os.path.exists(f"/proc/{pid}"):
+        return None
+    pids = [pid]
+    for child_pid in pids:
+        try:
+            with open(f"/proc/{child_pid}/task/{child_pid}/children") as f:
+                pids.extend(int(p) for p in f.read().split())
+        except OSError:
+            pass
+    totals = {"processes": len(pids), "rss_mb": 0.0, "pss_mb": 0.0}
+    for child_pid in pids:
+        try:
+            with open(f"/proc/{child_pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        totals["rss_mb"] += int(line.split()[1]) / 1024.0
+                    elif line.startswith("Pss:"):
+                        totals["pss_mb"] += int(line.split()[1]) / 1024.0
+        except OSError:
+            pass
+    return totals
+
+
+def start_server(workers, port, env):
+    """
+    Starts gunicorn with `workers` workers and waits until it answers.
+    """
+    env = dict(env, SER_WORKERS=str(workers), SER_BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=PROJECT_DIR,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {server.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/metrics", timeout=1).ok:
+                # Give every worker time to finish its post-fork startup.
+                time.sleep(1.0)
+                return server
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def run_load(url, clip, concurrency, seconds):
+    """
+    Posts `clip` to /predict from `concurrency` threads for `seconds`.
+
+    Returns:
+        dict: Latency summary of the successful requests, plus their rate and
+        the number of 503 and failed responses.
+    """
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                status = session.post(f"{url}/predict", files={"audio": ("clip.wav", clip)}, timeout=60).status_code
+            except requests.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = summarize(latencies) if latencies else {"iterations": 0}
+    result["requests_per_s"] = len(latencies) / wall
+    result["rejected_503"] = statuses.get(503, 0)
+    result["failed"] = sum(count for status, count in statuses.items() if status not in (200, 503))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /predict across gunicorn worker counts.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to test.")
+    parser.add_argument("--feature-workers", type=int, default=0,
+                        help="SER_FEATURE_WORKERS of each server process (0 = decode/MFCC in request threads).")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client threads.")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Load duration per worker count.")
+    parser.add_argument("--clip-seconds", type=float, default=3.0, help="Duration of the posted clip.")
+    parser.add_argument("--url", default=None, help="Test this running server instead of starting gunicorn.")
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this path.")
+    args = parser.parse_args()
+
+    clip = wav_bytes(synthetic_clip(np.random.default_rng(0), args.clip_seconds, 44100), 44100)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": vars(args),
+        "cpu_count": os.cpu_count(),
+        "runs": {},
+    }
+
+    if args.url:
+        report["runs"]["external"] = run_load(args.url.rstrip("/"), clip, args.concurrency, args.seconds)
+    else:
+        from ser.model_export import export_numpy
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            model_path, metadata_path, data_dir = build_fixtures(work_dir, seed=0)
+            export_numpy(model_path, os.path.splitext(model_path)[0] + ".npz")
+            env = dict(os.environ, SER_MODEL_PATH=model_path, SER_METADATA_PATH=metadata_path,
+                       SUGGESTIONS_DATA_DIR=data_dir, SER_BACKEND="numpy",
+                       SER_FEATURE_WORKERS=str(args.feature_workers),
+                       # Every request posts the same clip; measure scoring, not the cache.
+                       SER_RESPONSE_CACHE_SIZE="0")
+            for workers in args.workers:
+                port = free_port()
+                server = start_server(workers, port, env)
+                try:
+                    result = run_load(f"http://127.0.0.1:{port}", clip, args.concurrency, args.seconds)
+                    result["memory"] = process_tree_memory(server.pid)
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+                report["runs"][f"workers={workers}"] = result
+
+    print(f"{'run':15s} {'req/s':>8s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'503':>6s} "
+          f"{'RSS MB':>8s} {'PSS MB':>8s}")
+    for name, result in report["runs"].items():
+        memory = result.get("memory") or {}
+        print(f"{name:15s} {result['requests_per_s']:8.1f} {result.get('p50_ms', float('nan')):9.1f} "
+              f"{result.get('p95_ms', float('nan')):9.1f} {result.get('p99_ms', float('nan')):9.1f} "
+              f"{result['rejected_503']:6d} {memory.get('rss_mb', float('nan')):8.1f} "
+              f"{memory.get('pss_mb', float('nan')):8.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to: {os.path.abspath(args.output)}")
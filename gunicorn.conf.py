@@ -0,0 +1,37 @@
+"""
+Gunicorn settings for production serving with several worker processes:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master, which loads and warms up the model
+before forking the workers, so every worker shares the same weights and each
+extra worker adds little memory. The NumPy export (model.npz) is served by
+default: it is plain arrays, mapped from the file, and safe to use across a
+fork, which TensorFlow is not.
+"""
+import os
+
+# Read by app/main.py, so it must be set before the app is imported.
+os.environ["SER_PREFORK"] = "1"
+os.environ.setdefault("SER_BACKEND", "numpy")
+os.environ.setdefault("SER_STARTUP_MODE", "eager")
+
+pythonpath = "app"
+wsgi_app = "main:app"
+bind = os.environ.get("SER_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("SER_WORKERS", str(os.cpu_count() or 1)))
+if workers > 1:
+    # GET /jobs/<id> may land on another worker than the one running the
+    # job, so job records must be kept where every worker can read them.
+    os.environ.setdefault("SER_JOB_DB", os.path.join("data", "jobs.db"))
+# Threads per worker; they mostly wait on the feature pool and the batcher.
+worker_class = "gthread"
+threads = int(os.environ.get("SER_THREADS", "4"))
+preload_app = True
+timeout = 120
+
+
+def post_fork(server, worker):
+    # Threads and pool processes of the master do not survive the fork.
+    import main
+    main.start_workers()
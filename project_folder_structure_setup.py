@@ -54,7 +54,7 @@ if __name__ == "__main__":
                 "data": {
                     "music_data.csv": None,
                     "games_data.csv": None,
-                    "user_preferences.json": None
+                    "user_preferences.db": None
                 }
             },
             "utils": {
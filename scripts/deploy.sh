@@ -0,0 +1,16 @@
+#!/bin/sh
+# Starts the server from the lightweight TFLite export of the model, creating
+# the export first if it is missing or older than model.h5.
+set -e
+cd "$(dirname "$0")/.."
+
+MODEL_H5=app/ser/models/model.h5
+MODEL_TFLITE=app/ser/models/model.tflite
+
+if [ ! -f "$MODEL_TFLITE" ] || [ "$MODEL_H5" -nt "$MODEL_TFLITE" ]; then
+    PYTHONPATH=app python -m ser.model_export --model "$MODEL_H5" --output "$MODEL_TFLITE"
+fi
+
+export SER_MODEL_PATH="${SER_MODEL_PATH:-$MODEL_TFLITE}"
+export SER_STARTUP_MODE="${SER_STARTUP_MODE:-background}"
+exec python app/main.py
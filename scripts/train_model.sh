@@ -0,0 +1,12 @@
+#!/bin/sh
+# Builds the per-frame MFCC sequence store from the preprocessed audio (only
+# new clips are extracted on a rerun) and trains the example sequence model
+# on it with the streaming tf.data pipeline.
+set -e
+cd "$(dirname "$0")/.."
+
+AUDIO_DIR="${AUDIO_DIR:-data/processed_audio}"
+EPOCHS="${EPOCHS:-20}"
+
+PYTHONPATH=app python -m ser.sequence_pipeline build --audio-dir "$AUDIO_DIR"
+PYTHONPATH=app python -m ser.sequence_pipeline train --epochs "$EPOCHS" --max-frames 400
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# The app modules import each other as `ser`, `suggestions` and `utils`, and
+# the download scripts import `catalog_ingest` from their own directory.
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "Downlaod_required_file"))
@@ -0,0 +1,49 @@
+import io
+import json
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import main
+
+    monkeypatch.setitem(main.app.config, "MAX_CONTENT_LENGTH", 100 * 1024)
+    return main.app.test_client()
+
+
+def test_stream_body_is_not_capped_by_the_upload_limit(client, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main.batcher, "predict", lambda features: "neutral")
+    # 10 s of pcm16 at 22.05 kHz, over four times the 100 KB upload cap.
+    body = (0.1 * np.sin(np.arange(22050 * 10) * 0.05) * 32767).astype("<i2").tobytes()
+    response = client.post("/predict/stream?every=2", input_stream=io.BytesIO(body),
+                           headers={"Transfer-Encoding": "chunked"},
+                           environ_overrides={"wsgi.input_terminated": True})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert response.status_code == 200
+    assert not any("error" in line for line in lines)
+    assert len(lines) >= 5
+    assert lines[-1]["time"] == pytest.approx(10.0, abs=0.2)
+
+
+def test_job_gives_up_on_a_saturated_feature_pool(monkeypatch):
+    import time
+    import main
+    from ser.feature_pool import PoolSaturated
+
+    calls = []
+
+    def saturated(data, user_id=None):
+        calls.append(time.monotonic())
+        raise PoolSaturated("full")
+
+    monkeypatch.setattr(main, "predict_response", saturated)
+    monkeypatch.setattr(main, "JOB_POOL_WAIT_SECONDS", 0.5)
+    with pytest.raises(PoolSaturated):
+        main.run_job((b"", None))
+    assert calls[-1] - calls[0] <= 0.5
+    # Backing off: the gaps between tries grow.
+    assert 2 < len(calls) < 8
+    assert calls[-1] - calls[-2] > calls[1] - calls[0]
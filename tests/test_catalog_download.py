@@ -0,0 +1,248 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+import download_games_data
+import download_music_data
+from catalog_ingest import RateLimiter, make_session, ingest, refresh, state_path_for, load_manifest
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class StubCatalogServer:
+    """
+    Local stand-in for a paginated catalog API.
+
+    `pages` maps a page number to its JSON body. `failures` maps a page to
+    (status, headers) responses returned, in order, before the real one.
+    Every page carries an ETag of its body and a fixed Last-Modified, and is
+    answered 304 when the request's If-None-Match matches.
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.failures = {}
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query)
+                page = int(query.get("page", ["1"])[0])
+                with stub._lock:
+                    stub.requests.append({"page": page, "time": time.monotonic(), "query": query,
+                                          "headers": dict(self.headers)})
+                    failures = stub.failures.get(page)
+                    failure = failures.pop(0) if failures else None
+                if failure is not None:
+                    status, headers = failure
+                    self.send_response(status)
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = stub.body(page)
+                etag = stub.etag(page)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def body(self, page):
+        return json.dumps(self.pages.get(page, {})).encode()
+
+    def etag(self, page):
+        return '"%s"' % hashlib.md5(self.body(page)).hexdigest()
+
+    def requests_for(self, page):
+        return [r for r in self.requests if r["page"] == page]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubCatalogServer()
+    yield server
+    server.close()
+
+
+def music_pages(tracks_per_page, total_pages, start=0):
+    """
+    Returns Last.fm chart.gettoptracks pages with tracks t<start>, t<start+1>, ...
+    """
+    pages = {}
+    for page in range(1, total_pages + 1):
+        first = start + (page - 1) * tracks_per_page
+        tracks = [{"name": f"Track {i}", "mbid": f"t{i}", "artist": {"name": f"Artist {i}"}}
+                  for i in range(first, first + tracks_per_page)]
+        pages[page] = {"tracks": {"track": tracks, "@attr": {"totalPages": str(total_pages)}}}
+    return pages
+
+
+def run_music(stub, csv_path, page_size=5, workers=2, refresh_mode=False, **kwargs):
+    fetch = partial(download_music_data.fetch_page, make_session(workers), RateLimiter(0), stub.url, page_size)
+    parse = partial(download_music_data.parse_page, page_size)
+    if refresh_mode:
+        return refresh(fetch, parse, csv_path, download_music_data.FIELDNAMES, max_pages=50, workers=workers)
+    return ingest(fetch, parse, csv_path, download_music_data.FIELDNAMES, max_pages=50, workers=workers, **kwargs)
+
+
+def read_rows(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def test_ingest_fetches_every_page_once(stub, tmp_path):
+    stub.pages = music_pages(5, 4)
+    csv_path = str(tmp_path / "music_data.csv")
+
+    assert run_music(stub, csv_path) == 20
+    assert sorted(r["page"] for r in stub.requests) == [1, 2, 3, 4]
+    assert {row["id"] for row in read_rows(csv_path)} == {f"t{i}" for i in range(20)}
+    assert load_manifest(str(tmp_path))["music_data.csv"]["version"] == 1
+
+
+def test_games_ingest_pages_by_count(stub, tmp_path):
+    stub.pages = {page: {"count": 12, "results": [{"id": page * 10 + i, "name": f"Game {page}-{i}",
+                                                   "genres": [{"name": "Puzzle"}]} for i in range(5)]}
+                  for page in (1, 2, 3)}
+    csv_path = str(tmp_path / "games_data.csv")
+    written = ingest(partial(download_games_data.fetch_page, make_session(2), RateLimiter(0), stub.url, 5),
+                     partial(download_games_data.parse_page, 5), csv_path, download_games_data.FIELDNAMES,
+                     max_pages=50, workers=2)
+
+    assert written == 15
+    assert sorted(r["page"] for r in stub.requests) == [1, 2, 3]
+    assert {row["mood"] for row in read_rows(csv_path)} == {"thoughtful"}
+
+
+def test_retries_honour_retry_after(stub, tmp_path):
+    stub.pages = music_pages(5, 2)
+    stub.failures[2] = [(429, {"Retry-After": "1"}), (503, {"Retry-After": "1"})]
+    csv_path = str(tmp_path / "music_data.csv")
+
+    assert run_music(stub, csv_path, workers=1) == 10
+    attempts = [r["time"] for r in stub.requests_for(2)]
+    assert len(attempts) == 3
+    assert attempts[1] - attempts[0] >= 0.95
+    assert attempts[2] - attempts[1] >= 0.95
+
+
+def test_resume_after_interrupted_run(stub, tmp_path):
+    stub.pages = music_pages(5, 4)
+    stub.failures[3] = [(404, {})]
+    csv_path = str(tmp_path / "music_data.csv")
+
+    with pytest.raises(Exception, match="HTTP 404"):
+        run_music(stub, csv_path, workers=1)
+    with open(state_path_for(csv_path)) as f:
+        state = json.load(f)
+    assert state["pages_done"] == [1, 2]
+    assert state["total_pages"] == 4
+
+    first_run = len(stub.requests)
+    assert run_music(stub, csv_path, workers=1) == 10
+    assert sorted(r["page"] for r in stub.requests[first_run:]) == [3, 4]
+    ids = [row["id"] for row in read_rows(csv_path)]
+    assert sorted(ids) == sorted(f"t{i}" for i in range(20))
+
+
+def test_duplicate_ids_are_written_once(stub, tmp_path):
+    stub.pages = music_pages(5, 2)
+    # The chart shifted between requests: page 2 repeats a track of page 1.
+    stub.pages[2]["tracks"]["track"][0] = dict(stub.pages[1]["tracks"]["track"][4])
+    csv_path = str(tmp_path / "music_data.csv")
+
+    assert run_music(stub, csv_path) == 9
+    ids = [row["id"] for row in read_rows(csv_path)]
+    assert len(ids) == len(set(ids)) == 9
+    # A restart over the same pages writes nothing new.
+    assert run_music(stub, csv_path, resume=False) == 9
+    assert run_music(stub, csv_path) == 0
+
+
+def test_refresh_sends_validators_and_publishes_delta(stub, tmp_path):
+    stub.pages = music_pages(5, 2)
+    csv_path = str(tmp_path / "music_data.csv")
+    run_music(stub, csv_path)
+
+    # First refresh: nothing changed, but the validators are recorded.
+    assert run_music(stub, csv_path, refresh_mode=True) == (0, 0)
+    assert load_manifest(str(tmp_path))["music_data.csv"]["version"] == 1
+
+    # Page 1 changes (one renamed track, one new track); page 2 does not.
+    stub.pages[1]["tracks"]["track"][0]["name"] = "Track 0 (Remastered)"
+    stub.pages[1]["tracks"]["track"].append({"name": "New", "mbid": "t-new", "artist": {"name": "Someone"}})
+    refreshed = len(stub.requests)
+    assert run_music(stub, csv_path, refresh_mode=True) == (1, 1)
+
+    page_2 = stub.requests[refreshed:]
+    page_2 = [r for r in page_2 if r["page"] == 2][0]
+    # Page 2 was asked for conditionally and answered 304.
+    assert page_2["headers"]["If-None-Match"] == stub.etag(2)
+    assert page_2["headers"]["If-Modified-Since"] == LAST_MODIFIED
+
+    entry = load_manifest(str(tmp_path))["music_data.csv"]
+    assert entry["version"] == 2 and entry["deltas"] == [2]
+    delta = read_rows(os.path.join(str(tmp_path), "deltas", "music_data.v2.csv"))
+    assert {row["id"]: row["title"] for row in delta} == {"t0": "Track 0 (Remastered)", "t-new": "New"}
+    catalog = {row["id"]: row for row in read_rows(csv_path)}
+    assert len(catalog) == 11 and catalog["t0"]["title"] == "Track 0 (Remastered)"
+
+
+def test_tracks_without_mbid_keep_their_id_when_the_chart_moves():
+    track = {"name": "Song", "mbid": "", "artist": {"name": "Band"}}
+    other = {"name": "Other", "mbid": "", "artist": {"name": "Band"}}
+    first, _ = download_music_data.parse_page(2, 1, {"tracks": {"track": [track, other]}})
+    moved, _ = download_music_data.parse_page(2, 3, {"tracks": {"track": [other, track]}})
+    assert first[0]["id"] == moved[1]["id"]
+    assert first[0]["id"] != first[1]["id"]
+
+
+def test_validators_are_only_sent_for_the_same_request_url(stub, tmp_path):
+    stub.pages = {1: {"count": 3, "results": [{"id": i, "name": f"Game {i}", "genres": []} for i in range(3)]}}
+    csv_path = str(tmp_path / "games_data.csv")
+    fetch = partial(download_games_data.fetch_page, make_session(1), RateLimiter(0), stub.url, 5)
+    parse = partial(download_games_data.parse_page, 5)
+
+    def run_refresh():
+        first = len(stub.requests)
+        refresh(fetch, parse, csv_path, download_games_data.FIELDNAMES, max_pages=5, workers=1)
+        return stub.requests[first]
+
+    # The first refresh has no "updated since" range yet; the second adds
+    # one, so the first one's validators belong to another URL.
+    assert "updated" not in run_refresh()["query"]
+    second = run_refresh()
+    assert "updated" in second["query"] and "If-None-Match" not in second["headers"]
+    # Same day, same range: now the validators apply.
+    third = run_refresh()
+    assert third["query"] == second["query"] and third["headers"]["If-None-Match"] == stub.etag(1)
@@ -0,0 +1,369 @@
+import numpy as np
+from ser.streaming import StreamingEmotionRecognizer
+
+
+def _stream_features(audio, chunk_size):
+    features = []
+
+    def predict_fn(mean_mfcc):
+        features.append(mean_mfcc)
+        return "neutral"
+
+    recognizer = StreamingEmotionRecognizer(predict_fn, emit_every=1.0, context_seconds=1.0)
+    for start in range(0, len(audio), chunk_size):
+        recognizer.push(audio[start:start + chunk_size])
+    recognizer.push(np.zeros(0, dtype=np.float32), final=True)
+    return np.stack(features)
+
+
+def test_streaming_features_do_not_depend_on_chunking():
+    # Noise, silence, noise: the dB floor of the silent windows must not
+    # depend on which chunk they arrived in.
+    sr = 22050
+    rng = np.random.default_rng(0)
+    noise = lambda: (0.1 * rng.standard_normal(4 * sr)).astype(np.float32)
+    audio = np.concatenate([noise(), np.zeros(4 * sr, dtype=np.float32), noise()])
+
+    chunked = _stream_features(audio, 8192)
+    one_shot = _stream_features(audio, len(audio))
+    assert chunked.shape == one_shot.shape == (12, 13)
+    np.testing.assert_allclose(chunked, one_shot, rtol=1e-4, atol=1e-2)
+
+
+def test_emotion_labels_keep_unknown_codes_unknown():
+    from ser.manifest import MANIFEST_DTYPE, emotion_labels, parse_ravdess_name
+
+    names = ["03-01-08-01-01-01-01.wav", "03-01-09-01-01-01-01.wav", "03-01-99-01-01-01-01.wav", "notes.wav"]
+    records = np.zeros(len(names), dtype=MANIFEST_DTYPE)
+    for record, name in zip(records, names):
+        fields = parse_ravdess_name(name)
+        if fields is not None:
+            record["emotion"] = fields[2]
+    assert list(emotion_labels(records)) == ["surprised", "unknown", "unknown", "unknown"]
+
+
+def test_grouped_mfccs_match_per_clip_and_cap_padding():
+    from ser.feature_engine import MAX_BATCH_SAMPLES, extract_mfcc_from_array, length_groups, mean_mfcc_list
+
+    rng = np.random.default_rng(0)
+    lengths = [11025] * 6 + [22050 * 10, 4000, 30000]
+    waveforms = [0.1 * rng.standard_normal(length).astype(np.float32) for length in lengths]
+    groups = length_groups(lengths)
+    assert sorted(index for group in groups for index in group) == list(range(len(lengths)))
+    for group in groups:
+        assert len(group) == 1 or len(group) * max(lengths[index] for index in group) <= MAX_BATCH_SAMPLES
+    expected = np.stack([extract_mfcc_from_array(audio) for audio in waveforms])
+    np.testing.assert_allclose(mean_mfcc_list(waveforms), expected, rtol=1e-5, atol=1e-4)
+
+
+def test_feature_store_update_overwrites_rows_in_place(tmp_path):
+    from ser.feature_store import FeatureStore
+
+    store = FeatureStore(str(tmp_path / "store"))
+    store.append(np.zeros((3, 2)), ["a.wav", "b.wav", "c.wav"])
+    store.update([1], np.array([[1.0, 2.0]]))
+    store.append(np.full((1, 2), 3.0), ["d.wav"])
+    np.testing.assert_array_equal(store.matrix(), [[0, 0], [1, 2], [0, 0], [3, 3]])
+    assert store.index()[0] == ["a.wav", "b.wav", "c.wav", "d.wav"]
+
+
+def test_micro_batcher_fails_every_request_of_a_short_batch():
+    import threading
+    import pytest
+    from ser.batching import MicroBatcher
+
+    release = threading.Event()
+
+    def predict_fn(inputs):
+        release.wait(5)
+        return inputs[:1, 0]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=200.0)
+    futures = [batcher.submit(np.full(3, i, dtype=np.float32)) for i in range(3)]
+    release.set()
+    for future in futures:
+        with pytest.raises(ValueError, match="1 result"):
+            future.result(timeout=5)
+    batcher.stop()
+
+
+def test_micro_batcher_stops_with_a_full_queue():
+    import threading
+    from ser.batching import MicroBatcher
+
+    release = threading.Event()
+
+    def predict_fn(inputs):
+        release.wait(5)
+        return inputs[:, 0]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=1, max_wait_ms=0.0, max_queue_size=2)
+    futures = [batcher.submit(np.full(3, 0, dtype=np.float32))]
+    while batcher.stats()["batches"] == 0:
+        threading.Event().wait(0.01)
+    futures += [batcher.submit(np.full(3, i, dtype=np.float32)) for i in (1, 2)]
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    release.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert [future.result(timeout=0) for future in futures] == [0, 1, 2]
+
+
+def test_empty_audio_is_rejected_the_same_way_by_every_classifier():
+    import pytest
+    from ser.feature_engine import extract_mfcc_from_array
+    from ser.vad import speech_features
+    from ser.wav2vec2_backend import Wav2Vec2Classifier
+
+    empty = np.zeros(0, dtype=np.float32)
+    with pytest.raises(ValueError, match="empty") as mfcc_error:
+        extract_mfcc_from_array(empty)
+    with pytest.raises(ValueError, match="empty"):
+        speech_features(empty)
+    # The check runs before any torch code, so no checkpoint is needed.
+    classifier = Wav2Vec2Classifier.__new__(Wav2Vec2Classifier)
+    with pytest.raises(ValueError) as wav2vec2_error:
+        classifier.predict_proba([np.ones(16000, dtype=np.float32), empty])
+    assert str(wav2vec2_error.value) == str(mfcc_error.value)
+
+
+def _soundfile_reference(data):
+    import io
+    import soundfile as sf
+
+    audio, _ = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    return audio.mean(axis=1) if audio.shape[1] > 1 else audio[:, 0]
+
+
+def test_wav_fast_path_matches_soundfile():
+    import io
+    import soundfile as sf
+    from ser.audio_io import _read_wav
+
+    rng = np.random.default_rng(0)
+    clip = rng.uniform(-0.9, 0.9, (1000, 2))
+    for container in ("WAV", "WAVEX"):
+        for subtype in ("PCM_16", "PCM_32", "FLOAT", "DOUBLE"):
+            for channels in (1, 2):
+                buffer = io.BytesIO()
+                sf.write(buffer, clip[:, :channels], 16000, format=container, subtype=subtype)
+                data = buffer.getvalue()
+                # A data chunk cut short, as in a partial upload, is read up to its last whole frame.
+                for encoded in (data, data[:-7]):
+                    audio, sample_rate = _read_wav(memoryview(encoded))
+                    assert sample_rate == 16000
+                    np.testing.assert_array_equal(audio, _soundfile_reference(encoded),
+                                                  err_msg=f"{container} {subtype} x{channels}")
+
+
+def test_wav_fast_path_clamps_a_streamed_data_size():
+    import io
+    import soundfile as sf
+    from ser.audio_io import _read_wav
+
+    buffer = io.BytesIO()
+    sf.write(buffer, np.linspace(-0.5, 0.5, 500), 22050, format="WAV", subtype="PCM_16")
+    data = bytearray(buffer.getvalue())
+    size_at = data.index(b"data") + 4
+    data[size_at:size_at + 4] = b"\xff\xff\xff\xff"
+    audio, _ = _read_wav(memoryview(bytes(data)))
+    np.testing.assert_array_equal(audio, _soundfile_reference(buffer.getvalue()))
+
+
+def test_feature_cache_key_depends_on_the_resampler(tmp_path, monkeypatch):
+    import soundfile as sf
+    import ser.feature_extraction as feature_extraction
+
+    clip = str(tmp_path / "clip.wav")
+    sf.write(clip, 0.1 * np.sin(np.arange(16000) * 0.05), 16000)
+    cache_dir = str(tmp_path / "cache")
+    (_, _, hit, _), = feature_extraction._extract_cached([clip], 13, 22050, cache_dir)
+    assert not hit
+    monkeypatch.setattr(feature_extraction, "RESAMPLER", "poly")
+    (_, _, hit, _), = feature_extraction._extract_cached([clip], 13, 22050, cache_dir)
+    assert not hit
+    (_, _, hit, _), = feature_extraction._extract_cached([clip], 13, 22050, cache_dir)
+    assert hit
+
+
+def test_micro_batcher_passes_unstacked_inputs_as_a_list():
+    from ser.batching import MicroBatcher
+
+    calls = []
+
+    def predict_fn(waveforms):
+        calls.append(len(waveforms))
+        return [len(audio) for audio in waveforms]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=200.0, stack=False)
+    futures = [batcher.submit(np.zeros(length, dtype=np.float32)) for length in (100, 250, 50)]
+    assert [future.result(timeout=5) for future in futures] == [100, 250, 50]
+    assert calls == [3]
+    batcher.stop()
+
+
+def test_sequence_store_remove_rewrites_the_store_without_the_rows(tmp_path):
+    from ser.feature_store import SequenceStore
+
+    store = SequenceStore(str(tmp_path / "sequences"))
+    sequences = [np.full((length, 2), length, dtype=np.float32) for length in (3, 5, 2)]
+    store.append(sequences, ["a.wav", "b.wav", "c.wav"], sources=["1", "2", "3"])
+    store.remove([1])
+    files, _, offsets, lengths = store.index()
+    assert files == ["a.wav", "c.wav"] and store.sources() == ["1", "3"]
+    assert offsets.tolist() == [0, 3] and lengths.tolist() == [3, 2]
+    store.append([np.ones((4, 2))], ["b.wav"], sources=["4"])
+    np.testing.assert_array_equal(store.matrix()[:, 0], [3, 3, 3, 2, 2, 1, 1, 1, 1])
+    assert not (tmp_path / "sequences.compact").exists() and not (tmp_path / "sequences.old").exists()
+
+
+def test_build_sequence_store_re_extracts_changed_audio(tmp_path):
+    import os
+    import soundfile as sf
+    from ser.feature_store import SequenceStore
+    from ser.sequence_pipeline import build_sequence_store
+
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    tone = 0.1 * np.sin(np.arange(22050) * 0.05)
+    for name in ("03-01-01-01-01-01-01.wav", "03-01-05-01-01-01-01.wav"):
+        sf.write(str(audio_dir / name), tone, 22050)
+    store_dir = str(tmp_path / "sequences")
+    assert build_sequence_store(str(audio_dir), store_dir, workers=1) == 2
+    assert build_sequence_store(str(audio_dir), store_dir, workers=1) == 0
+
+    changed = str(audio_dir / "03-01-05-01-01-01-01.wav")
+    sf.write(changed, np.concatenate([tone, tone]), 22050)
+    os.utime(changed, ns=(os.stat(changed).st_atime_ns, os.stat(changed).st_mtime_ns + 10 ** 9))
+    assert build_sequence_store(str(audio_dir), store_dir, workers=1) == 1
+    files, labels, _, lengths = SequenceStore(store_dir).index()
+    assert len(files) == 2
+    assert dict(zip(labels, lengths.tolist()))["angry"] > dict(zip(labels, lengths.tolist()))["neutral"]
+
+
+def test_frame_statistics_cover_only_the_given_rows_after_cropping(tmp_path):
+    from ser.feature_store import SequenceStore
+    from ser.sequence_pipeline import frame_statistics
+
+    store_dir = str(tmp_path / "sequences")
+    long = np.concatenate([np.full((2, 1), 100.0), np.full((4, 1), 1.0), np.full((2, 1), 100.0)])
+    SequenceStore(store_dir).append([long, np.full((3, 1), 50.0)], ["a.wav", "b.wav"])
+    mean, std = frame_statistics(store_dir, rows=[0], max_frames=4)
+    np.testing.assert_allclose(mean, [1.0])
+    assert std[0] < 1e-3
+    mean, _ = frame_statistics(store_dir)
+    np.testing.assert_allclose(mean, [(400 + 4 + 150) / 11])
+
+
+def test_column_store_keeps_one_file_per_column_and_drops_an_uncommitted_tail(tmp_path):
+    from ser.feature_store import ColumnStore
+
+    store = ColumnStore(str(tmp_path / "scores"))
+    store.create(["happy", "sad"])
+    store.append([[0.9, 0.1], [0.2, 0.8]], ["a.wav", "b.wav"], ["happy", "sad"])
+    # An append interrupted before meta.json was rewritten.
+    with open(store.column_path("happy"), "ab") as f:
+        f.write(np.float32(0.5).tobytes())
+    store.append([[0.3, 0.7]], ["c.wav"], ["sad"])
+    assert (tmp_path / "scores" / "sad.f32").stat().st_size == 3 * 4
+    np.testing.assert_allclose(store.column("happy"), [0.9, 0.2, 0.3])
+    np.testing.assert_allclose(store.matrix(), [[0.9, 0.1], [0.2, 0.8], [0.3, 0.7]])
+    assert store.index() == (["a.wav", "b.wav", "c.wav"], ["happy", "sad", "sad"])
+
+
+def test_label_csv_lists_only_readable_ravdess_wav_files(tmp_path):
+    import os
+    import csv
+    import soundfile as sf
+    from ser.manifest import build_manifest, write_label_csv
+
+    audio_dir = tmp_path / "audio"
+    audio_dir.mkdir()
+    tone = np.zeros(1600)
+    sf.write(str(audio_dir / "03-01-04-01-01-01-02.wav"), tone, 16000)
+    sf.write(str(audio_dir / "03-01-04-01-01-02-02.flac"), tone, 16000)
+    sf.write(str(audio_dir / "recording.wav"), tone, 16000)
+    (audio_dir / "03-01-05-01-01-01-02.wav").write_bytes(b"not audio")
+    paths, records = build_manifest(str(audio_dir), str(tmp_path / "manifest"), workers=2)
+    assert len(paths) == 4
+    csv_path = str(tmp_path / "audio_data.csv")
+    assert write_label_csv(paths, records, csv_path) == 1
+    with open(csv_path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(os.path.basename(row["file"]), row["label"]) for row in rows] == [("03-01-04-01-01-01-02.wav", "sad")]
+
+
+def test_feature_pool_stopped_before_submit_raises_a_retryable_error(monkeypatch):
+    import pytest
+    from ser.feature_pool import FeaturePool, PoolSaturated
+
+    pool = FeaturePool(1)
+    # As if stop() ran right after start() returned.
+    monkeypatch.setattr(pool, "start", lambda: None)
+    with pytest.raises(PoolSaturated):
+        pool.extract(b"RIFF")
+    assert pool.pending() == 0
+
+
+def test_job_queue_bounds_are_atomic_and_count_bytes():
+    import threading
+    import pytest
+    from ser.jobs import JobQueue, JobStore, QueueFull
+
+    # No worker threads: submitted jobs stay queued.
+    jobs = JobQueue(lambda payload: payload, JobStore(), workers=0, max_queued=10, max_queued_bytes=10 ** 6)
+    accepted = []
+
+    def submit():
+        try:
+            accepted.append(jobs.submit(b"", size=1))
+        except QueueFull:
+            pass
+
+    threads = [threading.Thread(target=submit) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(accepted) == jobs.queued() == 10
+
+    jobs = JobQueue(lambda payload: payload, JobStore(), workers=0, max_queued_bytes=100)
+    jobs.submit(b"", size=150)  # An empty queue takes any job.
+    with pytest.raises(QueueFull):
+        jobs.submit(b"", size=1)
+
+
+def test_job_queue_releases_bytes_and_stops_after_running_its_jobs():
+    from ser.jobs import JobQueue, JobStore
+
+    store = JobStore()
+    jobs = JobQueue(lambda payload: payload * 2, store, workers=1, max_queued_bytes=100)
+    records = [jobs.submit(3, size=60), jobs.submit(4, size=40)]
+    jobs.stop()
+    assert [store.get(record["job_id"])["result"] for record in records] == [6, 8]
+    assert jobs.queued() == 0 and jobs.queued_bytes() == 0
+    # Submitting again restarts the workers.
+    record = jobs.submit(5, size=100)
+    jobs.stop()
+    assert store.get(record["job_id"])["result"] == 10
+
+
+def test_preprocessing_reports_files_that_cannot_be_stat_ed(tmp_path):
+    import os
+    import csv
+    import soundfile as sf
+    from ser.audio_preprocessing import ERROR_REPORT_NAME, preprocess_directory
+
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    sf.write(str(raw_dir / "good.wav"), 0.1 * np.sin(np.arange(16000) * 0.05), 16000)
+    # A dangling symlink is listed by the walk, but stat() fails.
+    os.symlink(str(tmp_path / "missing.wav"), str(raw_dir / "gone.wav"))
+    out_dir = tmp_path / "processed"
+    counts = preprocess_directory(str(raw_dir), str(out_dir), workers=1)
+    assert counts["processed"] == 1 and counts["failed"] == 1
+    with open(out_dir / ERROR_REPORT_NAME, newline="") as f:
+        rows = list(csv.reader(f))
+    assert [os.path.basename(row[0]) for row in rows[1:]] == ["gone.wav"]
+    assert rows[1][1] == "FileNotFoundError"
@@ -0,0 +1,94 @@
+import csv
+import sqlite3
+import numpy as np
+from suggestions.recommendation_engine import RecommendationEngine
+from suggestions.user_preferences import UserPreferenceStore
+
+
+def make_store(tmp_path, **kwargs):
+    return UserPreferenceStore(str(tmp_path / "users.db"), **kwargs)
+
+
+def test_flushed_feedback_is_read_back_by_another_store(tmp_path):
+    store = make_store(tmp_path)
+    store.record("u1", "music:a", "happy", "like")
+    store.record("u1", "music:a", "happy", "play")
+    store.record("u1", "music:b", "sad", "dislike")
+    assert store.flush() == 1
+    assert store.pending() == 0
+
+    profile = make_store(tmp_path).profile("u1")
+    assert profile.items == {"music:a": 1.5, "music:b": -1.0}
+    assert profile.moods == {"happy": 1.5, "sad": -1.0}
+    assert profile.excluded == {"music": {"b"}}
+
+
+def test_failed_flush_keeps_the_batch_and_merges_newer_feedback(tmp_path):
+    store = make_store(tmp_path)
+    store.record("u1", "music:a", "happy", "like")
+    with sqlite3.connect(store.db_path) as connection:
+        connection.execute("ALTER TABLE user_moods RENAME TO user_moods_away")
+    assert store.flush() == 0
+    store.record("u1", "music:a", "happy", "like")
+    store.record("u2", "games:1", "calm", "skip")
+    assert store.pending() == 2
+
+    with sqlite3.connect(store.db_path) as connection:
+        connection.execute("ALTER TABLE user_moods_away RENAME TO user_moods")
+    assert store.flush() == 2
+    fresh = make_store(tmp_path)
+    # The rolled back transaction wrote nothing, so nothing is counted twice.
+    assert fresh.profile("u1").items == {"music:a": 2.0}
+    assert fresh.profile("u1").moods == {"happy": 2.0}
+    assert fresh.profile("u2").items == {"games:1": -0.5}
+
+
+def test_profile_merges_stored_and_pending_feedback(tmp_path):
+    store = make_store(tmp_path)
+    store.record("u1", "music:a", "happy", "like")
+    store.flush()
+    reader = make_store(tmp_path)
+    reader.record("u1", "music:a", "happy", "like")
+    reader.record("u1", "music:c", "happy", "dislike")
+    profile = reader.profile("u1")
+    assert profile.items == {"music:a": 2.0, "music:c": -1.0}
+    assert profile.excluded == {"music": {"c"}}
+
+
+def test_profile_is_a_snapshot(tmp_path):
+    store = make_store(tmp_path)
+    store.record("u1", "music:a", "happy", "like")
+    profile = store.profile("u1")
+    hidden = profile.excluded.get("music", set())
+    store.record("u1", "music:b", "happy", "dislike")
+    assert profile.items == {"music:a": 1.0}
+    assert "b" not in hidden
+    assert store.profile("u1").items == {"music:a": 1.0, "music:b": -1.0}
+
+
+def write_catalogs(data_dir):
+    with open(data_dir / "music_data.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "artist", "genre", "mood"])
+        for i in range(6):
+            writer.writerow([f"m{i}", f"Track {i}", "Artist", "Pop", "happy"])
+    with open(data_dir / "games_data.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "genre", "mood"])
+        for i in range(4):
+            writer.writerow([f"g{i}", f"Game {i}", "Action", "happy"])
+
+
+def test_suggestions_are_reranked_by_feedback(tmp_path):
+    write_catalogs(tmp_path)
+    engine = RecommendationEngine(str(tmp_path), music_count=1, game_count=0)
+    engine._local.rng = np.random.default_rng(0)
+    store = make_store(tmp_path)
+    store.record("u1", "music:m3", "happy", "like")
+    store.record("u1", "music:m0", "happy", "dislike")
+    profile = store.profile("u1")
+
+    keys = [engine.suggest("happy", profile=profile)[0][0] for _ in range(50)]
+    assert "music:m0" not in keys
+    # m3 wins whenever it is among the drawn candidates.
+    assert keys.count("music:m3") > 15